@@ -3,6 +3,8 @@ This file controls the administrative interface for tobacco_analytics' main app
 """
 
 from django.contrib import admin
-from .models import DjangoPerson
+from .models import DjangoPerson, PersonAlias, PersonPosition
 
 admin.site.register(DjangoPerson)
+admin.site.register(PersonAlias)
+admin.site.register(PersonPosition)
@@ -0,0 +1,401 @@
+"""
+Benchmarks for the imports and queries of models.py.
+
+Each benchmark runs on a fresh test database file, compares the optimized code path against
+the implementation it replaced, and prints the timings. Run them from the backend folder, e.g.
+python manage.py benchmark_models document_import
+"""
+import contextlib
+import io
+import json
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import setup_databases, teardown_databases
+
+from apps.main.models import (DOCUMENT_CSV_FIELDS, DjangoPerson, Document, PersonAlias,
+                              create_person_aliases_and_positions, ego_network_of_person,
+                              import_csv_to_document_model, import_peopledb_to_person_model,
+                              match_djangoperson_from_name, people_at_organization)
+from name_disambiguation.clean_org_names import RAW_ORG_TO_CLEAN_ORG_DICT
+from name_disambiguation.benchmarks import (create_test_docs, create_test_people_db,
+                                            load_raw_test_names)
+from name_disambiguation.name_preprocessing import parse_column_person
+from name_disambiguation.config import DATA_PATH
+from name_disambiguation.people_db import PeopleDatabase
+
+TEST_DOCS_CSV_PATH = Path(DATA_PATH, 'django', 'test_import_docs.csv')
+
+
+def create_test_docs_csv(csv_path, n_docs, min_count=3):
+    """
+    Stores n_docs documents with the columns of test_import_docs.csv. The authors and
+    recipients come from create_test_docs (names of tobacco_names_raw_test.json), like in
+    docs_1970s_all.csv.
+    :param csv_path: Path, where to store the csv
+    :param n_docs: int
+    :param min_count: int
+    :return: None
+    """
+    docs = create_test_docs(n_docs, min_count)
+    test_docs = pd.read_csv(TEST_DOCS_CSV_PATH, index_col=0)
+    for column in ['cc', 'cc_org', 'collection', 'date', 'doc_type', 'pages', 'text', 'title']:
+        docs[column] = test_docs[column].iloc[0]
+    docs['tid'] = [f'doc{idx}' for idx in range(n_docs)]
+    docs.to_csv(csv_path)
+
+
+def create_test_people_db_file(file_path, min_count=3):
+    """
+    Stores the people of tobacco_names_raw_test.json (at least min_count occurrences) with one
+    person per full name, plus the people of test_import_docs.csv
+    :param file_path: Path
+    :param min_count: int
+    :return: int, number of people
+    """
+    raw_names = load_raw_test_names(min_count)
+    raw_names.update({"Dunn, WL": 2, "Dunn, William L": 4, "TEAGUE CE JR": 3,
+                      "TEMKO SL, COVINGTON AND BURLING": 5})
+    people_db = create_test_people_db(raw_names)
+    with contextlib.redirect_stdout(io.StringIO()):
+        people_db.merge_duplicates(print_merge_results_for_name=None)
+    # full names of DjangoPerson objects are unique
+    people = {}
+    for person in sorted(people_db.people, key=lambda person: -person.count):
+        people.setdefault(f'{person.first} {person.middle} {person.last}', person)
+    people_db.people = set(people.values())
+    alias_to_person_dict = people_db._alias_to_person_dict     # pylint: disable=W0212
+    people_db._alias_to_person_dict = {     # pylint: disable=W0212
+        alias: person for alias, person in alias_to_person_dict.items()
+        if person in people_db.people}
+    people_db.store_to_disk(file_path)
+    return len(people_db.people)
+
+
+def legacy_import_csv_to_document_model(csv_path):
+    """
+    import_csv_to_document_model before the bulk import: one save per document and one
+    match_djangoperson_from_name and one add query per author and recipient
+    :param csv_path: Path
+    :return: None
+    """
+    docs = pd.read_csv(csv_path).fillna('')
+    for _, row in docs.iterrows():
+        doc = Document(pages=int(row['pages']),
+                       **{field: row[field] for field in DOCUMENT_CSV_FIELDS})
+        doc.save()
+
+        parsed_au = []
+        if row['au_person']:
+            parsed_au = parse_column_person(row['au_person'])
+        elif row['au']:
+            parsed_au = parse_column_person(row['au'])
+        parsed_rc = []
+        if row['rc_person']:
+            parsed_rc = parse_column_person(row['rc_person'])
+        elif row['rc']:
+            parsed_rc = parse_column_person(row['rc'])
+
+        for name in parsed_au:
+            doc.authors.add(match_djangoperson_from_name(name.upper()))
+        for name in parsed_rc:
+            doc.recipients.add(match_djangoperson_from_name(name.upper()))
+
+
+def benchmark_document_import(n_docs=100000, n_legacy_docs=5000, min_count=3):
+    """
+    Times import_csv_to_document_model for n_docs documents (see create_test_docs_csv) with the
+    people of tobacco_names_raw_test.json in the database, and compares it with one save per
+    document for n_legacy_docs documents
+    :param n_docs: int
+    :param n_legacy_docs: int
+    :param min_count: int
+    :return: None
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        people_db_path = Path(tmp_dir, 'people_db.npz')
+        n_people = create_test_people_db_file(people_db_path, min_count)
+        csv_paths = {}
+        for doc_count in [n_docs, n_legacy_docs]:
+            csv_paths[doc_count] = Path(tmp_dir, f'docs_{doc_count}.csv')
+            create_test_docs_csv(csv_paths[doc_count], doc_count)
+
+        results = {}
+        for label, doc_count, import_function in [
+                ('bulk import', n_docs, import_csv_to_document_model),
+                ('bulk import', n_legacy_docs, import_csv_to_document_model),
+                ('one save per doc', n_legacy_docs, legacy_import_csv_to_document_model)]:
+            Document.objects.all().delete()
+            DjangoPerson.objects.all().delete()
+            with contextlib.redirect_stdout(io.StringIO()):
+                import_peopledb_to_person_model(people_db_path)
+
+            start = time.time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                import_function(csv_paths[doc_count])
+            elapsed = time.time() - start
+            print(f"{label:>18}: {elapsed:.1f}s for {doc_count} docs and {n_people} people "
+                  f"({doc_count / elapsed:.0f} docs/sec)")
+            if doc_count == n_legacy_docs:
+                results[label] = [sorted(Document.objects.values_list(
+                    'tid', f'{side}__full_name')) for side in ['authors', 'recipients']]
+        print("Same authors and recipients:", len(set(map(repr, results.values()))) == 1)
+
+
+def legacy_import_peopledb_to_person_model(file_path):
+    """
+    import_peopledb_to_person_model before the bulk import: one save per person and one
+    bulk_create for its aliases and positions, each in its own transaction
+    :param file_path: Path
+    :return: None
+    """
+    peopledb = PeopleDatabase()
+    peopledb.load_from_disk(file_path)
+    for person in peopledb.people:
+        django_person = DjangoPerson(last=person.last,
+                                     first=person.first,
+                                     middle=person.middle,
+                                     full_name=f'{person.first} {person.middle} {person.last}',
+                                     most_likely_org=person.most_likely_position,
+                                     positions=json.dumps(person.positions),
+                                     aliases=json.dumps(person.aliases),
+                                     count=person.count)
+        django_person.save()
+        create_person_aliases_and_positions([(django_person, person.aliases, person.positions)])
+
+
+def benchmark_people_import(min_count=3, batch_sizes=(100, 500, 2000)):
+    """
+    Times import_peopledb_to_person_model for the people of tobacco_names_raw_test.json (at
+    least min_count occurrences) into an empty database, with different batch sizes and with
+    one save per person. Also times importing the same people db again (updating everyone).
+    :param min_count: int
+    :param batch_sizes: tuple of int
+    :return: None
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        people_db_path = Path(tmp_dir, 'people_db.npz')
+        n_people = create_test_people_db_file(people_db_path, min_count)
+
+        rows = {}
+        imports = [(f'batch size {batch_size}', lambda batch_size=batch_size:
+                    import_peopledb_to_person_model(people_db_path, batch_size=batch_size))
+                   for batch_size in batch_sizes]
+        imports.append(('one save per person',
+                        lambda: legacy_import_peopledb_to_person_model(people_db_path)))
+        for label, import_function in imports:
+            DjangoPerson.objects.all().delete()
+            start = time.time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                import_function()
+            elapsed = time.time() - start
+            print(f"{label:>19}: {elapsed:.2f}s for {n_people} people "
+                  f"({n_people / elapsed:.0f} people/sec)")
+            rows[label] = (sorted(DjangoPerson.objects.values_list(
+                'full_name', 'count', 'aliases', 'positions', 'most_likely_org')),
+                           sorted(PersonAlias.objects.values_list(
+                               'person__full_name', 'alias', 'key', 'count')))
+
+        print("Same people and aliases:", len(set(map(repr, rows.values()))) == 1)
+
+        # re-import with nobody changed and with everyone changed
+        for label in ['re-import', 're-import changed']:
+            if label == 're-import changed':
+                DjangoPerson.objects.update(count=0)
+            start = time.time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                import_peopledb_to_person_model(people_db_path)
+            elapsed = time.time() - start
+            same_rows = (sorted(DjangoPerson.objects.values_list(
+                'full_name', 'count', 'aliases', 'positions', 'most_likely_org')),
+                         sorted(PersonAlias.objects.values_list(
+                             'person__full_name', 'alias', 'key', 'count'))) == rows[imports[0][0]]
+            print(f"{label:>19}: {elapsed:.2f}s, same people and aliases: {same_rows}")
+
+
+def legacy_people_at_organization(org, min_count=0):
+    """
+    Finds the people of people_at_organization by parsing the positions json of every person
+    :param org: str
+    :param min_count: int
+    :return: list of DjangoPerson
+    """
+    raw_orgs = {org, org.upper()}
+    raw_orgs.update(raw_org for raw_org, clean_org in RAW_ORG_TO_CLEAN_ORG_DICT.items()
+                    if clean_org == org)
+    people = [person for person in DjangoPerson.objects.all()
+              if person.count >= min_count and (
+                  person.most_likely_org == org or raw_orgs & set(person.positions_counter))]
+    return sorted(people, key=lambda person: (-person.count, person.id))
+
+
+def benchmark_org_query(min_count=3, orgs=('Philip Morris', 'Tobacco Institute',
+                                           'Covington & Burling', 'Lorillard'),
+                        min_docs=(0, 10)):
+    """
+    Times people_at_organization for the people of tobacco_names_raw_test.json (at least
+    min_count occurrences) and compares it with parsing the positions of every person in Python
+    :param min_count: int
+    :param orgs: tuple of str
+    :param min_docs: tuple of int, min_count values of the queries
+    :return: None
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        people_db_path = Path(tmp_dir, 'people_db.npz')
+        n_people = create_test_people_db_file(people_db_path, min_count)
+        with contextlib.redirect_stdout(io.StringIO()):
+            import_peopledb_to_person_model(people_db_path)
+
+    for org in orgs:
+        for org_min_count in min_docs:
+            results = {}
+            for label, query in [('SQL', people_at_organization),
+                                 ('json', legacy_people_at_organization)]:
+                start = time.time()
+                results[label] = list(query(org, org_min_count))
+                results[f'{label} time'] = time.time() - start
+            print(f"{org} (>= {org_min_count} docs): {len(results['SQL'])} of {n_people} people, "
+                  f"SQL {1000 * results['SQL time']:.1f}ms, "
+                  f"json {1000 * results['json time']:.1f}ms, "
+                  f"same people: {results['SQL'] == results['json']}")
+
+
+def legacy_ego_network_of_person(person, degree=1, min_weight=1, max_nodes=100): # pylint: disable=R0914
+    """
+    ego_network_of_person with the edges counted in Python: loads the authors and recipients of
+    all documents and counts every author/recipient pair
+    :param person: DjangoPerson
+    :param degree: int
+    :param min_weight: int
+    :param max_nodes: int
+    :return: dict with name, nodes, links, and center_names
+    """
+    recipients = defaultdict(list)
+    for doc_id, person_id in Document.recipients.through.objects.values_list('document_id',
+                                                                             'djangoperson_id'):
+        recipients[doc_id].append(person_id)
+    weights = Counter()
+    for doc_id, author_id in Document.authors.through.objects.values_list('document_id',
+                                                                          'djangoperson_id'):
+        for recipient_id in recipients[doc_id]:
+            if author_id != recipient_id:
+                weights[min(author_id, recipient_id), max(author_id, recipient_id)] += 1
+    adjacent = defaultdict(dict)
+    for (person1, person2), weight in weights.items():
+        if weight >= min_weight:
+            adjacent[person1][person2] = adjacent[person2][person1] = weight
+
+    node_ids = [person.id]
+    new_ids = [person.id]
+    for _ in range(degree):
+        candidates = Counter()
+        for person_id in new_ids:
+            for other_id, weight in adjacent[person_id].items():
+                if other_id not in node_ids:
+                    candidates[other_id] += weight
+        new_ids = [other_id for other_id, _ in sorted(candidates.items(),
+                                                      key=lambda item: (-item[1], item[0]))]
+        new_ids = new_ids[:max_nodes - len(node_ids)]
+        node_ids += new_ids
+
+    people = DjangoPerson.objects.in_bulk(node_ids)
+    edges = [(person1, person2, weight) for person1 in node_ids
+             for person2, weight in adjacent[person1].items()
+             if person2 in people and person1 < person2]
+    node_docs = Counter({person_id: 0 for person_id in node_ids})
+    for person1, person2, weight in edges:
+        node_docs[person1] += weight
+        node_docs[person2] += weight
+    return {
+        'name': person.full_name,
+        'nodes': [{'pk': person_id, 'name': people[person_id].full_name, 'docs': docs,
+                   'words': 0, 'affiliation': people[person_id].most_likely_org}
+                  for person_id, docs in sorted(node_docs.items(),
+                                                key=lambda item: (-item[1], item[0]))],
+        'links': [{'node1': people[person1].full_name, 'node2': people[person2].full_name,
+                   'docs': weight, 'words': 0}
+                  for person1, person2, weight in sorted(edges,
+                                                         key=lambda edge: (-edge[2], edge))],
+        'center_names': {person.full_name: True}
+    }
+
+
+def benchmark_person_network(n_docs=100000, n_people=3, min_count=3,   # pylint: disable=R0914
+                             queries=((1, 1, 100), (2, 1, 100), (2, 2, 300))):
+    """
+    Times ego_network_of_person for the n_people people with the most documents among n_docs
+    documents (see create_test_docs_csv), and compares it with counting the edges in Python
+    :param n_docs: int
+    :param n_people: int
+    :param min_count: int
+    :param queries: tuple of (degree, min_weight, max_nodes) tuples
+    :return: None
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        people_db_path = Path(tmp_dir, 'people_db.npz')
+        create_test_people_db_file(people_db_path, min_count)
+        csv_path = Path(tmp_dir, 'docs.csv')
+        create_test_docs_csv(csv_path, n_docs)
+        with contextlib.redirect_stdout(io.StringIO()):
+            import_peopledb_to_person_model(people_db_path)
+            import_csv_to_document_model(csv_path)
+
+    center_people = DjangoPerson.objects.annotate(
+        docs=Count('document_by_authors')).order_by('-docs', 'id')[:n_people]
+    for person in center_people:
+        for degree, min_weight, max_nodes in queries:
+            results = {}
+            for label, query in [('SQL', ego_network_of_person),
+                                 ('Python', legacy_ego_network_of_person)]:
+                start = time.time()
+                results[label] = query(person, degree, min_weight, max_nodes)
+                results[f'{label} time'] = time.time() - start
+            print(f"{person.full_name} (degree {degree}, >= {min_weight} docs, <= {max_nodes} "
+                  f"people): {len(results['SQL']['nodes'])} people, "
+                  f"{len(results['SQL']['links'])} links, "
+                  f"SQL {1000 * results['SQL time']:.0f}ms, "
+                  f"Python {1000 * results['Python time']:.0f}ms, "
+                  f"same network: {results['SQL'] == results['Python']}")
+
+
+BENCHMARKS = {
+    'document_import': benchmark_document_import,
+    'people_import': benchmark_people_import,
+    'org_query': benchmark_org_query,
+    'person_network': benchmark_person_network,
+}
+
+
+class Command(BaseCommand):
+    """
+    Runs the model benchmarks on a test database
+    """
+    help = 'Benchmarks the imports and queries of models.py, e.g. benchmark_models org_query'
+
+    def add_arguments(self, parser):
+        parser.add_argument('benchmarks', nargs='*', help=', '.join(BENCHMARKS))
+        parser.add_argument('--n-docs', type=int,
+                            help='number of documents of document_import and person_network')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # a database file instead of sqlite's in-memory test database, so commits have to
+            # be written to disk like in production
+            connection.settings_dict['TEST']['NAME'] = str(Path(tmp_dir, 'benchmark.sqlite3'))
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                for benchmark_name in options['benchmarks'] or BENCHMARKS:
+                    print(f'\n{benchmark_name}')
+                    if (benchmark_name in {'document_import', 'person_network'} and
+                            options['n_docs']):
+                        BENCHMARKS[benchmark_name](n_docs=options['n_docs'])
+                    else:
+                        BENCHMARKS[benchmark_name]()
+            finally:
+                teardown_databases(old_config, verbosity=0)
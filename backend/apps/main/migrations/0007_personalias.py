@@ -0,0 +1,52 @@
+# Generated by Django 3.1.14 on 2026-10-17 18:42
+
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_person_aliases(apps, schema_editor):
+    """
+    Creates the PersonAlias objects of the aliases json strings of existing people, in batches of
+    BACKFILL_BATCH_SIZE, so the aliases of all people don't have to fit in memory
+    """
+    DjangoPerson = apps.get_model('main', 'DjangoPerson')
+    PersonAlias = apps.get_model('main', 'PersonAlias')
+    batch = []
+    for person in DjangoPerson.objects.only('id', 'aliases').iterator():
+        for alias, count in json.loads(person.aliases or '{}').items():
+            batch.append(PersonAlias(alias=alias, key=' '.join(alias.upper().split()),
+                                     person_id=person.id, count=count))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            PersonAlias.objects.bulk_create(batch)
+            batch = []
+    PersonAlias.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_auto_20191121_1535'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonAlias',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=250)),
+                ('key', models.CharField(db_index=True, max_length=250)),
+                ('count', models.IntegerField()),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='person_aliases', to='main.djangoperson')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='personalias',
+            constraint=models.UniqueConstraint(fields=('person', 'alias'), name='unique_person_alias'),
+        ),
+        migrations.RunPython(backfill_person_aliases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.1.14 on 2026-10-17 19:39
+
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_person_positions(apps, schema_editor):
+    """
+    Creates the PersonPosition objects of the positions json strings of existing people, in
+    batches of BACKFILL_BATCH_SIZE, so the positions of all people don't have to fit in memory
+    """
+    DjangoPerson = apps.get_model('main', 'DjangoPerson')
+    PersonPosition = apps.get_model('main', 'PersonPosition')
+    batch = []
+    for person in DjangoPerson.objects.only('id', 'positions').iterator():
+        for org, count in json.loads(person.positions or '{}').items():
+            batch.append(PersonPosition(org=org, person_id=person.id, count=count))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            PersonPosition.objects.bulk_create(batch)
+            batch = []
+    PersonPosition.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_personalias'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='djangoperson',
+            name='most_likely_org',
+            field=models.CharField(db_index=True, max_length=250),
+        ),
+        migrations.CreateModel(
+            name='PersonPosition',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('org', models.CharField(db_index=True, max_length=250)),
+                ('count', models.IntegerField()),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='person_positions', to='main.djangoperson')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='personposition',
+            constraint=models.UniqueConstraint(fields=('person', 'org'), name='unique_person_position'),
+        ),
+        migrations.RunPython(backfill_person_positions, migrations.RunPython.noop),
+    ]
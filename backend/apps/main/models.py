@@ -1,16 +1,31 @@
 """
-Models for tobacco networks: DjangoPerson (represent a person & associated information)
+Models for tobacco networks: DjangoPerson (represent a person & associated information),
+PersonAlias (an alias of a DjangoPerson, to look people up by name), PersonPosition (an
+organization of a DjangoPerson, to look people up by organization)
 & Document (represent a document & associated information & its author/recipient DjangoPerson).
+ego_network_of_person computes the network of a DjangoPerson from the authors and recipients
+of the Documents.
 """
 import json
-import pickle
+import time
 from collections import Counter
 import pandas as pd
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Q
+from django.utils.functional import cached_property
+from name_disambiguation.clean_org_names import RAW_ORG_TO_CLEAN_ORG_DICT
+from name_disambiguation.parse_cache import get_parse_cache
+from name_disambiguation.people_db import PeopleDatabase
 from name_disambiguation.person import Person
 from name_disambiguation.name_preprocessing import parse_column_person
 
 MAX_LENGTH = 250
+# fields that import_peopledb_to_person_model sets on people that are already in the database
+PERSON_IMPORT_FIELDS = ['last', 'first', 'middle', 'most_likely_org', 'positions', 'aliases',
+                        'count']
+# csv columns that import_csv_to_document_model stores as they are
+DOCUMENT_CSV_FIELDS = ['au', 'au_org', 'au_person', 'cc', 'cc_org', 'collection', 'date',
+                       'doc_type', 'rc', 'rc_org', 'rc_person', 'text', 'tid', 'title']
 
 
 class DjangoPerson(models.Model):
@@ -20,9 +35,10 @@ class DjangoPerson(models.Model):
         first: CharField, first name
         middle: CharField, middle name
         full_name: CharField, '<first> <middle> <last>', is a unique field
-        most_likely_org: CharField, org that appeared most times for the person
+        most_likely_org: CharField, org that appeared most times for the person, indexed
         positions: TextField, string json representation of positions Counter (all related
-        annotations on the person). Use property positions_counter() to access!!
+        annotations on the person). Use property positions_counter() to access!! To query
+        people by position, use their PersonPosition objects (person_positions)
         aliases: TextField, string json representation of aliases Counter
         (all raw strings used to refer to this person). Use property aliases_counter() to access!!
         count: IntegerField, number of documents the person appeared in
@@ -34,7 +50,7 @@ class DjangoPerson(models.Model):
     first = models.CharField(max_length=MAX_LENGTH)
     middle = models.CharField(max_length=MAX_LENGTH)
     full_name = models.CharField(max_length=MAX_LENGTH, unique=True)
-    most_likely_org = models.CharField(max_length=MAX_LENGTH)
+    most_likely_org = models.CharField(max_length=MAX_LENGTH, db_index=True)
     # positions & aliases are json strings that need to be parsed as Counter every time
     positions = models.TextField()
     aliases = models.TextField()
@@ -44,21 +60,136 @@ class DjangoPerson(models.Model):
         return self.full_name + ", Positions: " + str(self.positions) + ", Aliases: " + \
             str(self.aliases) + ", count: " + str(self.count)
 
-    @property
+    @cached_property
     def positions_counter(self):
         """
-        :return: positions Counter (from string json)
+        :return: positions Counter (from string json, parsed on first access)
         """
         return Counter(json.loads(self.positions))
 
-    @property
+    @cached_property
     def aliases_counter(self):
         """
-        :return: aliases Counter (from string json)
+        :return: aliases Counter (from string json, parsed on first access)
         """
         return Counter(json.loads(self.aliases))
 
 
+def normalize_alias(alias):
+    """
+    Returns the key that PersonAlias looks up an alias by: upper case, with single spaces
+
+    >>> normalize_alias(' Dunn,  WL')
+    'DUNN, WL'
+
+    :param alias: str
+    :return: str
+    """
+    return ' '.join(alias.upper().split())
+
+
+def query_param_chunks(values, n_lookups=1):
+    """
+    Splits the values of an __in lookup into chunks that don't bind more parameters than the
+    database allows (999 on sqlite). bulk_create splits its queries itself, __in lookups don't.
+    :param values: iterable
+    :param n_lookups: int, number of __in lookups with a chunk each in the same query
+    :return: list of lists
+    """
+    values = list(values)
+    max_query_params = connection.features.max_query_params
+    chunk_size = max_query_params // n_lookups if max_query_params else max(len(values), 1)
+    return [values[start:start + chunk_size] for start in range(0, len(values), chunk_size)]
+
+
+class PersonAlias(models.Model):
+    """Django database to represent an alias of a DjangoPerson, with an index on its
+    normalized key, so people can be found by name without parsing every aliases json string
+    Fields:
+        alias: CharField, raw string used to refer to the person
+        key: CharField, normalized alias (see normalize_alias), indexed
+        person: ForeignKey, the DjangoPerson of the alias
+        count: IntegerField, how often the alias was used for the person
+    """
+    alias = models.CharField(max_length=MAX_LENGTH)
+    key = models.CharField(max_length=MAX_LENGTH, db_index=True)
+    person = models.ForeignKey(DjangoPerson, on_delete=models.CASCADE,
+                               related_name='person_aliases')
+    count = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['person', 'alias'], name='unique_person_alias'),
+        ]
+
+    def __str__(self):
+        return f'{self.alias} ({self.person.full_name}), count: {self.count}'
+
+
+class PersonPosition(models.Model):
+    """Django database to represent a position (organization) of a DjangoPerson, with an index
+    on the organization, so people can be queried by organization in SQL
+    Fields:
+        org: CharField, raw position as in the positions Counter of the person, indexed
+        person: ForeignKey, the DjangoPerson of the position
+        count: IntegerField, how often the position was used for the person
+    """
+    org = models.CharField(max_length=MAX_LENGTH, db_index=True)
+    person = models.ForeignKey(DjangoPerson, on_delete=models.CASCADE,
+                               related_name='person_positions')
+    count = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['person', 'org'], name='unique_person_position'),
+        ]
+
+    def __str__(self):
+        return f'{self.org} ({self.person.full_name}), count: {self.count}'
+
+
+def create_person_aliases_and_positions(people, batch_size=None):
+    """
+    Stores the aliases and positions of people as PersonAlias and PersonPosition objects
+    :param people: list of (DjangoPerson, aliases Counter, positions Counter) tuples, the
+                   DjangoPerson objects have to be saved
+    :param batch_size: int, number of rows per bulk query
+    :return: None
+    """
+    PersonAlias.objects.bulk_create([
+        PersonAlias(alias=alias, key=normalize_alias(alias), person_id=django_person.id,
+                    count=count)
+        for django_person, aliases, _ in people
+        for alias, count in aliases.items()
+    ], batch_size=batch_size)
+    PersonPosition.objects.bulk_create([
+        PersonPosition(org=org, person_id=django_person.id, count=count)
+        for django_person, _, positions in people
+        for org, count in positions.items()
+    ], batch_size=batch_size)
+
+
+def people_at_organization(org, min_count=0):
+    """
+    Returns the people that have worked for an organization, i.e. that have it as their
+    most_likely_org or have one of its raw names (see RAW_ORG_TO_CLEAN_ORG_DICT) as a position,
+    and appear in at least min_count documents. Both conditions use indexes.
+
+    >>> people_at_organization('Philip Morris', min_count=10)[:20]      # doctest: +SKIP
+
+    :param org: str, clean or raw organization name, e.g. 'Philip Morris'
+    :param min_count: int
+    :return: QuerySet of DjangoPerson, most documents first
+    """
+    raw_orgs = {org, org.upper()}
+    raw_orgs.update(raw_org for raw_org, clean_org in RAW_ORG_TO_CLEAN_ORG_DICT.items()
+                    if clean_org == org)
+    position_people = PersonPosition.objects.filter(org__in=raw_orgs).values('person_id')
+    return DjangoPerson.objects.filter(
+        Q(most_likely_org=org) | Q(id__in=position_people), count__gte=min_count
+    ).order_by('-count', 'id')
+
+
 class Document(models.Model):
     """Django database to represent Person objects
     Fields:
@@ -105,87 +236,245 @@ class Document(models.Model):
         return f'tid: {self.tid}, title: {self.title}, date: {self.date}'
 
 
-def import_csv_to_document_model(csv_path):
+def count_person_edges(person_ids, min_weight=1, both_ends=False):
+    """
+    Counts the edges of people with aggregate queries over the authors and recipients of the
+    Documents. The weight of the edge between two people is the number of times that one of
+    them is an author and the other one a recipient of a document (in both directions, as in
+    DocumentNetwork.edge_matrix). People writing to themselves don't make an edge.
+    The edges with one of the people as author and the ones with one of them as recipient get
+    counted separately, so both queries can use the index on the person of the through table.
+    Long lists of people get queried in chunks (see query_param_chunks).
+    :param person_ids: list of int, DjangoPerson ids
+    :param min_weight: int, only edges with at least this weight
+    :param both_ends: bool, only edges between two of the people instead of all edges that
+                      have at least one of them
+    :return: list of (int, int, int) tuples, the smaller and the larger person id and the weight
+             of every edge
+    """
+    edges = Document.authors.through.objects.annotate(
+        author=F('djangoperson_id'), recipient=F('document__recipients')
+    ).exclude(author=F('recipient'))
+    # queries and the authors whose rows they skip
+    if both_ends:
+        chunks = query_param_chunks(person_ids, n_lookups=2)
+        queries = [(edges.filter(author__in=authors, recipient__in=recipients), set())
+                   for authors in chunks for recipients in chunks]
+    else:
+        # the rows with one of the people as author get counted by the author queries
+        queries = [(edges.filter(author__in=authors), set())
+                   for authors in query_param_chunks(person_ids)]
+        queries += [(edges.filter(recipient__in=recipients), set(person_ids))
+                    for recipients in query_param_chunks(person_ids)]
+
+    weights = Counter()
+    for query, skipped_authors in queries:
+        for author, recipient, weight in (query.values('author', 'recipient')
+                                          .annotate(weight=Count('document_id'))
+                                          .values_list('author', 'recipient', 'weight')):
+            if author not in skipped_authors:
+                weights[min(author, recipient), max(author, recipient)] += weight
+    return [(person1, person2, weight) for (person1, person2), weight in weights.items()
+            if weight >= min_weight]
+
+
+def ego_network_of_person(person, degree=1, min_weight=1, max_nodes=100):  # pylint: disable=R0914
+    """
+    Computes the network around a person with one count_person_edges query per degree and one
+    for the edges between the people of the network. The people one step further out get added
+    with the most documents with the people already in the network first, until there are
+    max_nodes people.
+    The network has the format of store_network_for_visualization in network_generation.py,
+    with the DjangoPerson id of every node as pk.
+
+    :param person: DjangoPerson, center of the network
+    :param degree: int, 1 (people connected to the person) or 2 (and their connections)
+    :param min_weight: int, minimum number of documents of an edge
+    :param max_nodes: int, maximum number of people in the network, including the person
+    :return: dict with name, nodes, links, and center_names
+    """
+    node_ids = [person.id]
+    new_ids = [person.id]
+    for _ in range(degree):
+        node_set = set(node_ids)
+        candidates = Counter()
+        for person1, person2, weight in count_person_edges(new_ids, min_weight):
+            if person1 not in node_set:
+                candidates[person1] += weight
+            if person2 not in node_set:
+                candidates[person2] += weight
+        new_ids = [person_id for person_id, _ in sorted(candidates.items(),
+                                                        key=lambda item: (-item[1], item[0]))]
+        new_ids = new_ids[:max_nodes - len(node_ids)]
+        node_ids += new_ids
+
+    edges = count_person_edges(node_ids, min_weight, both_ends=True) if len(node_ids) > 1 else []
+    people = DjangoPerson.objects.in_bulk(node_ids)
+    node_docs = Counter({person_id: 0 for person_id in node_ids})
+    for person1, person2, weight in edges:
+        node_docs[person1] += weight
+        node_docs[person2] += weight
+
+    nodes = [{'pk': person_id, 'name': people[person_id].full_name, 'docs': docs, 'words': 0,
+              'affiliation': people[person_id].most_likely_org}
+             for person_id, docs in sorted(node_docs.items(),
+                                           key=lambda item: (-item[1], item[0]))]
+    links = [{'node1': people[person1].full_name, 'node2': people[person2].full_name,
+              'docs': weight, 'words': 0}
+             for person1, person2, weight in sorted(edges, key=lambda edge: (-edge[2], edge))]
+    return {
+        'name': person.full_name,
+        'nodes': nodes,
+        'links': links,
+        'center_names': {person.full_name: True}
+    }
+
+
+def import_csv_to_document_model(csv_path, batch_size=1000):     # pylint: disable=R0914
     """
     Reads csv of docs and create Document model
+    All documents get imported in one transaction: the authors and recipients of all documents
+    get matched to DjangoPerson objects at once (see match_djangopeople_from_names), then
+    batch_size documents and their authors and recipients get inserted at a time.
     :param csv_path: Path to csv file
+    :param batch_size: int, number of documents per bulk query
     :return: None
     """
     # Read csv into dataframe
-    docs = pd.read_csv(csv_path).fillna('')
-    # For each row, create & save the appropriate Document object
-    for _, row in docs.iterrows():
-        doc = Document(au=row['au'],
-                       au_org=row['au_org'],
-                       au_person=row['au_person'],
-                       cc=row['cc'],
-                       cc_org=row['cc_org'],
-                       collection=row['collection'],
-                       date=row['date'],
-                       doc_type=row['doc_type'],
-                       pages=int(row['pages']),
-                       rc=row['rc'],
-                       rc_org=row['rc_org'],
-                       rc_person=row['rc_person'],
-                       text=row['text'],
-                       tid=row['tid'],
-                       title=row['title'])
-        doc.save()
-
-        # for au/au_person, and rc/rc_person, parse it into list of individual raw names
-        # assumes that names are either in 'au_person'/'rc_person or 'au'/'rc', but not both (
-        # this is mostly true)
-        # (if 'au_person' is not empty, then it only parses info from 'au_person'; otherwise,
-        # parses 'au'; usually 'au_person' has more reliable information, 'au' may have erroneous
-        # info. Same for rc)
-        parsed_au = []
-        if row['au_person']:
-            parsed_au = parse_column_person(row['au_person'])
-        elif row['au']:
-            parsed_au = parse_column_person(row['au'])
-
-        parsed_rc = []
-        if row['rc_person']:
-            parsed_rc = parse_column_person(row['rc_person'])
-        elif row['rc']:
-            parsed_rc = parse_column_person(row['rc'])
-
-        # for each raw author name, get the corresponding DjangoPerson object & add to the
-        # Document model's authors (ManyToManyField)
-        for name in parsed_au:
-            # Currently this throws exception if it does not find exactly 1 matching object
-            matched_person = match_djangoperson_from_name(name.upper())
-            doc.authors.add(matched_person)
-
-        # for each raw recipient name, get the corresponding DjangoPerson object & add to the
-        # Document model's recipients (ManyToManyField)
-        for name in parsed_rc:
-            matched_person = match_djangoperson_from_name(name.upper())
-            doc.recipients.add(matched_person)
+    docs = pd.read_csv(csv_path).fillna('').to_dict('records')
+
+    # for au/au_person, and rc/rc_person, parse it into list of individual raw names
+    # assumes that names are either in 'au_person'/'rc_person or 'au'/'rc', but not both (
+    # this is mostly true)
+    # (if 'au_person' is not empty, then it only parses info from 'au_person'; otherwise,
+    # parses 'au'; usually 'au_person' has more reliable information, 'au' may have erroneous
+    # info. Same for rc)
+    doc_people = {'authors': [], 'recipients': []}
+    for row in docs:
+        for side, person_column, raw_column in [('authors', 'au_person', 'au'),
+                                                 ('recipients', 'rc_person', 'rc')]:
+            parsed_names = []
+            if row[person_column]:
+                parsed_names = parse_column_person(row[person_column])
+            elif row[raw_column]:
+                parsed_names = parse_column_person(row[raw_column])
+            doc_people[side].append([name.upper() for name in parsed_names])
+
+    start = time.time()
+    with transaction.atomic():
+        # names in the order of the documents, so new people get created like they would be
+        # by calling match_djangoperson_from_name for every author and recipient
+        names = dict.fromkeys(name for doc_idx in range(len(docs))
+                              for side in ['authors', 'recipients']
+                              for name in doc_people[side][doc_idx])
+        person_ids = match_djangopeople_from_names(names, batch_size)
+
+        for batch_start in range(0, len(docs), batch_size):
+            batch = docs[batch_start:batch_start + batch_size]
+            Document.objects.bulk_create([
+                Document(**{field: row[field] for field in DOCUMENT_CSV_FIELDS},
+                         pages=int(row['pages']))
+                for row in batch
+            ], batch_size=batch_size)
+            # bulk_create doesn't set the ids on sqlite
+            doc_ids = {}
+            for tids in query_param_chunks(row['tid'] for row in batch):
+                doc_ids.update(Document.objects.filter(tid__in=tids).values_list('tid', 'id'))
+
+            for side in ['authors', 'recipients']:
+                through_model = getattr(Document, side).through
+                through_model.objects.bulk_create([
+                    through_model(document_id=doc_ids[row['tid']], djangoperson_id=person_id)
+                    for row, names in zip(batch, doc_people[side][batch_start:])
+                    # the same person can only be added once per document
+                    for person_id in dict.fromkeys(person_ids[name] for name in names)
+                ], batch_size=batch_size)
+
+            imported = batch_start + len(batch)
+            print(f"imported {imported}/{len(docs)} documents "
+                  f"({imported / max(time.time() - start, 1e-9):.0f} documents/sec)")
+
+
+def match_djangopeople_from_names(parsed_names, batch_size=500):    # pylint: disable=R0914
+    """
+    Returns the ids of the DjangoPerson objects of parsed names, like calling
+    match_djangoperson_from_name for every name, but with the aliases and full names of all
+    people in memory and with the new people created in bulk
+    :param parsed_names: iterable of str, parsed aliases
+    :param batch_size: int, number of new people per bulk query
+    :return: dict, maps parsed names to DjangoPerson ids
+    """
+    # the most common person of every alias key
+    alias_ids = {}
+    for key, person_id in PersonAlias.objects.order_by('key', '-count', 'id').values_list(
+            'key', 'person_id').iterator():
+        alias_ids.setdefault(key, person_id)
+    full_name_ids = dict(DjangoPerson.objects.values_list('full_name', 'id'))
+
+    person_ids = {}
+    # full name -> Person for the people that don't exist yet, and the names that refer to them
+    new_people = {}
+    new_names = {}
+    new_alias_full_names = {}
+    for parsed_name in parsed_names:
+        key = normalize_alias(parsed_name)
+        if key in alias_ids:
+            person_ids[parsed_name] = alias_ids[key]
+        elif key in new_alias_full_names:
+            new_names[parsed_name] = new_alias_full_names[key]
+        else:
+            person = Person(name_raw=parsed_name,
+                            parsed_name=get_parse_cache().parse(parsed_name))
+            full_name = f'{person.first} {person.middle} {person.last}'
+            if full_name in full_name_ids:
+                person_ids[parsed_name] = full_name_ids[full_name]
+            else:
+                if full_name not in new_people:
+                    new_people[full_name] = person
+                    new_alias_full_names[key] = full_name
+                new_names[parsed_name] = full_name
+
+    people = group_people_by_full_name(new_people.values())
+    for batch_start in range(0, len(people), batch_size):
+        store_people_batch(people[batch_start:batch_start + batch_size], batch_size)
+    new_ids = {django_person.full_name: django_person.id for django_person, _, _ in people}
+    for parsed_name, full_name in new_names.items():
+        person_ids[parsed_name] = new_ids[full_name]
+    return person_ids
+
 
 def match_djangoperson_from_name(parsed_name):
     """
-        Returns DjangoPerson object that contains parsed_name as an alias
+        Returns DjangoPerson object that has parsed_name as an alias
         :param parsed_name: str, a parsed alias
         :return: DjangoPerson object
         """
-    # Searches in database the DjangoPerson object whose aliases contain parsed_name
-    # Searches the name with the left " so the aliases (str of Counter) must have parsed_name
-    # as the start of an alias (so if you search for "Dunn, WL", will not match aliases that contain
-    # "MacDunn, WL" but will match "Dunn, WL, Philip Morris")
-    name_with_quotes = f'\"{parsed_name}'
+    # Looks up the normalized name in the (indexed) PersonAlias table
+    matches = list(PersonAlias.objects.filter(key=normalize_alias(parsed_name))
+                   .select_related('person').order_by('-count', 'id')[:2])
+    # If multiple DjangoPerson objects are matched, return the one that uses the alias most
+    # often and print out message
+    if len(matches) > 1:
+        print("Matched multiple DjangoPerson objects! Currently uses the most common match")
+    if matches:
+        return matches[0].person
+
+    # Names that aren't an alias yet, e.g. 'TEMKO SL' for a person with the alias
+    # 'TEMKO SL, COVINGTON AND BURLING', belong to the person with the same full name (which is
+    # unique)
+    person_original = Person(name_raw=parsed_name,
+                             parsed_name=get_parse_cache().parse(parsed_name))
+    full_name = f'{person_original.first} {person_original.middle} {person_original.last}'
     try:
-        person = DjangoPerson.objects.get(aliases__contains=name_with_quotes)
+        person = DjangoPerson.objects.get(full_name=full_name)
     # If no such DjangoPerson exists, create a new DjangoPerson from the parsed name and
     # store it in the database
     # TODO: currently after creating new DjangoPerson objects, there is no attempt to merge
     except DjangoPerson.DoesNotExist:
-        person_original = Person(name_raw=parsed_name)
         person = DjangoPerson(last=person_original.last,
                               first=person_original.first,
                               middle=person_original.middle,
-                              full_name=f'{person_original.first} '
-                                        f'{person_original.middle} {person_original.last}',
+                              full_name=full_name,
                               most_likely_org=person_original.most_likely_position,
                               # convert Counter object into json string
                               positions=json.dumps(person_original.positions),
@@ -193,34 +482,108 @@ def match_djangoperson_from_name(parsed_name):
                               count=person_original.count
                               )
         person.save()
-    # If multiple DjangoPerson objects are matched, return the first match and print out
-    # message
-    except DjangoPerson.MultipleObjectsReturned:
-        person = DjangoPerson.objects.filter(aliases__contains=name_with_quotes)[0]
-        print("Matched multiple DjangoPerson objects! Currently uses the first match")
+        create_person_aliases_and_positions(
+            [(person, person_original.aliases, person_original.positions)])
     return person
 
 
-def import_peopledb_to_person_model(file_path):
+def import_peopledb_to_person_model(file_path, batch_size=500):
     """
-    Import PeopleDatabase object from pickle file & store the corresponding DjangoPerson
-    objects into database
-    :param file_path: Path, file path to pickle file of PeopleDatabase
+    Import PeopleDatabase object from a people db file & store the corresponding DjangoPerson,
+    PersonAlias, and PersonPosition objects into database
+    The import runs in one transaction and writes batch_size people (and their aliases) at a
+    time. People that are already in the database (same full_name) get updated if they have
+    changed, so the import can be re-run.
+    :param file_path: Path, file path to people db file (see PeopleDatabase.store_to_disk)
+    :param batch_size: int, number of people per bulk query
     :return:
     """
-    # Load pickle file
-    with open(str(file_path), 'rb') as infile:
-        peopledb = pickle.load(infile)
-
-    # For each Person in the PeopleDatabase, create the corresponding DjangoPerson & store
-    for person in peopledb.people:
-        person = DjangoPerson(last=person.last,
-                              first=person.first,
-                              middle=person.middle,
-                              full_name=f'{person.first} {person.middle} {person.last}',
-                              most_likely_org=person.most_likely_position,
-                              # convert Counter object into json string
-                              positions=json.dumps(person.positions),
-                              aliases=json.dumps(person.aliases),
-                              count=person.count)
-        person.save()
+    # Load people db file
+    peopledb = PeopleDatabase()
+    peopledb.load_from_disk(file_path)
+    people = group_people_by_full_name(peopledb.people)
+
+    start = time.time()
+    with transaction.atomic():
+        for batch_start in range(0, len(people), batch_size):
+            store_people_batch(people[batch_start:batch_start + batch_size], batch_size)
+            imported = min(batch_start + batch_size, len(people))
+            print(f"imported {imported}/{len(people)} people "
+                  f"({imported / max(time.time() - start, 1e-9):.0f} people/sec)")
+
+
+def group_people_by_full_name(people):
+    """
+    Creates one (unsaved) DjangoPerson per full name. People with the same full name get their
+    counts added up, and the most frequent one determines most_likely_org.
+    :param people: iterable of Person
+    :return: list of (DjangoPerson, aliases Counter, positions Counter) tuples
+    """
+    grouped_people = {}
+    for person in sorted(people, key=lambda person: (-person.count, person.person_id)):
+        full_name = f'{person.first} {person.middle} {person.last}'
+        if full_name in grouped_people:
+            django_person, aliases, positions = grouped_people[full_name]
+            django_person.count += person.count
+            aliases.update(person.aliases)
+            positions.update(person.positions)
+        else:
+            grouped_people[full_name] = (DjangoPerson(last=person.last,
+                                                      first=person.first,
+                                                      middle=person.middle,
+                                                      full_name=full_name,
+                                                      most_likely_org=person.most_likely_position,
+                                                      count=person.count),
+                                         Counter(person.aliases), Counter(person.positions))
+    return list(grouped_people.values())
+
+
+def store_people_batch(people, batch_size):
+    """
+    Inserts the new people of a batch and updates the changed ones, along with their aliases
+    and positions
+    :param people: list of (DjangoPerson, aliases Counter, positions Counter) tuples
+    :param batch_size: int, number of rows per bulk query
+    :return:
+    """
+    # full name -> (id, *PERSON_IMPORT_FIELDS) of the people already in the database
+    existing_rows = {}
+    for full_names in query_param_chunks(django_person.full_name for django_person, _, _ in people):
+        existing_rows.update((row[0], row[1:]) for row in DjangoPerson.objects.filter(
+            full_name__in=full_names).values_list('full_name', 'id', *PERSON_IMPORT_FIELDS))
+
+    new_people = []
+    changed_people = []
+    for django_person, aliases, positions in people:
+        # convert Counter objects into json strings
+        django_person.aliases = json.dumps(aliases)
+        django_person.positions = json.dumps(positions)
+        if django_person.full_name not in existing_rows:
+            new_people.append((django_person, aliases, positions))
+        elif existing_rows[django_person.full_name][1:] != tuple(
+                getattr(django_person, field) for field in PERSON_IMPORT_FIELDS):
+            django_person.id = existing_rows[django_person.full_name][0]
+            changed_people.append((django_person, aliases, positions))
+
+    DjangoPerson.objects.bulk_create([django_person for django_person, _, _ in new_people],
+                                     batch_size=batch_size)
+    # bulk_create doesn't set the ids on sqlite
+    new_ids = {}
+    for full_names in query_param_chunks(django_person.full_name
+                                         for django_person, _, _ in new_people):
+        new_ids.update(DjangoPerson.objects.filter(full_name__in=full_names)
+                       .values_list('full_name', 'id'))
+    for django_person, _, _ in new_people:
+        django_person.id = new_ids[django_person.full_name]
+
+    # one UPDATE per changed person, bulk_update's CASE statements are much slower
+    changed_ids = []
+    for django_person, _, _ in changed_people:
+        DjangoPerson.objects.filter(id=django_person.id).update(**{
+            field: getattr(django_person, field) for field in PERSON_IMPORT_FIELDS})
+        changed_ids.append(django_person.id)
+    for person_ids in query_param_chunks(changed_ids):
+        PersonAlias.objects.filter(person_id__in=person_ids).delete()
+        PersonPosition.objects.filter(person_id__in=person_ids).delete()
+
+    create_person_aliases_and_positions(new_people + changed_people, batch_size)
@@ -8,12 +8,15 @@ from rest_framework import serializers
 
 class PersonSerializer(serializers.Serializer):
     """
-    Serializer for the Person model
+    Serializer for the Person model, i.e. the nodes of a network
     """
     pk = serializers.IntegerField(read_only=True)  # pylint: disable=C0103
     name = serializers.CharField(read_only=True)
     docs = serializers.IntegerField(read_only=True)
     words = serializers.IntegerField(read_only=True)
+    affiliation = serializers.CharField(read_only=True)
+    degree = serializers.IntegerField(read_only=True)
+    cluster = serializers.IntegerField(read_only=True)
 
     def create(self, validated_data):
         """ We will not create new objects using this serializer """
@@ -24,11 +27,15 @@ class PersonSerializer(serializers.Serializer):
 
 class EdgeSerializer(serializers.Serializer):
     """
-    Serializer for the Edge model
+    Serializer for the Edge model, i.e. the links of a network. Links of compact networks
+    (see compact_network in network_visualization.py) have the indexes of their nodes as source
+    and target instead of node1 and node2
     """
     pk = serializers.IntegerField(read_only=True)  # pylint: disable=C0103
     node1 = serializers.CharField(read_only=True)
     node2 = serializers.CharField(read_only=True)
+    source = serializers.IntegerField(read_only=True)
+    target = serializers.IntegerField(read_only=True)
     docs = serializers.IntegerField(read_only=True)
     words = serializers.IntegerField(read_only=True)
 
@@ -2,16 +2,31 @@
 Tests for the main app.
 """
 
+import gzip
 import json
+import os
+import shutil
+import tempfile
 from pathlib import Path
 from collections import Counter
-from django.test import TestCase
+from unittest import mock
+import pandas as pd
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
 from name_disambiguation.people_db import PeopleDatabase
 from name_disambiguation.config import DATA_PATH
 from apps.main.models import DjangoPerson
 from apps.main.models import Document
 from apps.main.models import import_peopledb_to_person_model
 from apps.main.models import import_csv_to_document_model
+from apps.main.models import match_djangoperson_from_name
+from apps.main.models import PersonAlias
+from apps.main.models import PersonPosition
+from apps.main.models import people_at_organization
+from apps.main.models import ego_network_of_person
+from apps.main.views import NETWORK_PAYLOAD_CACHE, read_network_artifact
+from backend.config.settings.base import BACKEND_DIR
 
 
 class ModelsTests(TestCase):
@@ -29,19 +44,21 @@ class ModelsTests(TestCase):
         test_peopledb.add_person_raw("TEMKO SL, COVINGTON BURLING", 3)
         # merge duplicate people
         test_peopledb.merge_duplicates(print_merge_results_for_name=None)
-        # store it as a picke file
-        self.test_peopledb_pickle = Path(DATA_PATH, 'django', 'test_peopledb.pickle')
-        test_peopledb.store_to_disk(self.test_peopledb_pickle)
+        # store it as a people db file in a temporary directory
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.test_peopledb_file = Path(tmp_dir, 'test_peopledb.npz')
+        test_peopledb.store_to_disk(self.test_peopledb_file)
         # file path to test csv file for docs
         self.test_docs_csv = Path(DATA_PATH, "django", "test_import_docs.csv")
 
     def test_import_peopledb_to_person(self):
         """
         Tests import_peopledb_to_person_model() in models.py
-        imports peopledb from test pickle file & create corresponding DjangoPerson database
+        imports peopledb from test people db file & create corresponding DjangoPerson database
         :return:
         """
-        import_peopledb_to_person_model(self.test_peopledb_pickle)
+        import_peopledb_to_person_model(self.test_peopledb_file)
 
         # tests if the correct DjangoPerson objects are stored (by searching for them)
         # TODO: (maybe want to fix this) since aliases is a string, the order matters when you
@@ -64,13 +81,76 @@ class ModelsTests(TestCase):
                                  most_likely_org="Covington & Burling",
                                  positions=json.dumps(Counter({"COVINGTON & BURLING": 11})))
 
+    def test_import_peopledb_twice(self):
+        """
+        Tests that import_peopledb_to_person_model() in models.py updates people that are
+        already in the database instead of adding them again
+        :return:
+        """
+        import_peopledb_to_person_model(self.test_peopledb_file, batch_size=2)
+        DjangoPerson.objects.filter(full_name="WILLIAM L DUNN").update(count=1)
+        PersonAlias.objects.filter(alias="DUNN, WL").delete()
+        import_peopledb_to_person_model(self.test_peopledb_file, batch_size=2)
+
+        self.assertEqual(DjangoPerson.objects.count(), 3)
+        self.assertEqual(PersonAlias.objects.count(), 5)
+        dunn = DjangoPerson.objects.get(full_name="WILLIAM L DUNN")
+        self.assertEqual(dunn.count, 6)
+        self.assertEqual(dict(PersonAlias.objects.filter(person=dunn)
+                              .values_list('alias', 'count')),
+                         {"DUNN, WILLIAM L": 4, "DUNN, WL": 2})
+
+    def test_match_person_from_name(self):
+        """
+        Tests that match_djangoperson_from_name() in models.py finds people by their PersonAlias
+        objects and doesn't match names that only start like an alias
+        :return:
+        """
+        import_peopledb_to_person_model(self.test_peopledb_file)
+        dunn = DjangoPerson.objects.get(full_name="WILLIAM L DUNN")
+        self.assertEqual({(alias.alias, alias.key, alias.count)
+                          for alias in PersonAlias.objects.filter(person=dunn)},
+                         {("DUNN, WILLIAM L", "DUNN, WILLIAM L", 4), ("DUNN, WL", "DUNN, WL", 2)})
+
+        self.assertEqual(match_djangoperson_from_name("Dunn,  wl"), dunn)
+        # not an alias, but the full name of an existing person
+        self.assertEqual(match_djangoperson_from_name("TEMKO SL").full_name, "S L TEMKO")
+        # used to match the alias "DUNN, WL"
+        new_person = match_djangoperson_from_name("DUNN, W")
+        self.assertNotEqual(new_person, dunn)
+        self.assertEqual(match_djangoperson_from_name("DUNN, W"), new_person)
+        self.assertEqual(PersonAlias.objects.get(key="DUNN, W").person, new_person)
+
+    def test_people_at_organization(self):
+        """
+        Tests that import_peopledb_to_person_model() and match_djangoperson_from_name() in
+        models.py store PersonPosition objects, and that people_at_organization() finds people
+        by their clean and raw organization names
+        :return:
+        """
+        import_peopledb_to_person_model(self.test_peopledb_file)
+        self.assertEqual(set(PersonPosition.objects.values_list('person__full_name', 'org',
+                                                                'count')),
+                         {("S L TEMKO", "COVINGTON & BURLING", 11), ("C E TEAGUE", "JR", 3)})
+
+        temko = DjangoPerson.objects.get(full_name="S L TEMKO")
+        self.assertEqual(list(people_at_organization("Covington & Burling")), [temko])
+        self.assertEqual(list(people_at_organization("COVINGTON & BURLING")), [temko])
+        self.assertEqual(list(people_at_organization("Covington & Burling", min_count=12)), [])
+        self.assertEqual(list(people_at_organization("Lorillard")), [])
+
+        new_person = match_djangoperson_from_name("RUPP JC, LORILLARD")
+        self.assertEqual(list(PersonPosition.objects.filter(person=new_person)
+                              .values_list('org', 'count')), [("LORILLARD", 1)])
+        self.assertEqual(list(people_at_organization("Lorillard")), [new_person])
+
     def test_import_csv_to_document(self):
         """
         Tests import_csv_to_document_model() in models.py
         :return:
         """
-        # First create DjangoPerson database from the test pickle file
-        import_peopledb_to_person_model(self.test_peopledb_pickle)
+        # First create DjangoPerson database from the test people db file
+        import_peopledb_to_person_model(self.test_peopledb_file)
         # Then create Document database from the test csv file
         import_csv_to_document_model(self.test_docs_csv)
         # Test if the correct Document objects are stored
@@ -99,6 +179,60 @@ class ModelsTests(TestCase):
         self.assertEqual(len(Document.objects.filter(recipients__last="TEAGUE").all()), 1)
         self.assertEqual(len(Document.objects.filter(recipients__last="TEMKO").all()), 1)
 
+    def test_import_csv_to_document_3(self):
+        """
+        Tests import_csv_to_document_model() in models.py with one document per batch:
+        names that appear twice in a document or refer to the same new person get added once
+        :return:
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            docs_csv = Path(tmp_dir, 'docs.csv')
+            docs = pd.read_csv(self.test_docs_csv, index_col=0)
+            docs.loc[1, 'au'] = "Dunn, WL; DUNN,  WL; Risi, S"
+            docs.loc[1, 'rc_person'] = "RISI S"
+            docs.to_csv(docs_csv)
+            import_csv_to_document_model(docs_csv, batch_size=1)
+
+        self.assertEqual(Document.objects.count(), 2)
+        email = Document.objects.get(title="email1")
+        self.assertEqual(sorted(email.authors.values_list('full_name', flat=True)),
+                         ["S  RISI", "W L DUNN"])
+        self.assertEqual(list(email.recipients.values_list('full_name', flat=True)),
+                         ["S  RISI"])
+        self.assertEqual(list(PersonAlias.objects.filter(person__last="RISI")
+                              .values_list('alias', flat=True)), ["RISI, S"])
+
+    def test_import_csv_query_params(self):
+        """
+        Tests that import_csv_to_document_model() in models.py never binds more query parameters
+        than the database allows, even with more documents and new people per batch than that
+        :return:
+        """
+        # enough for the 15 fields of one document
+        max_query_params = 30
+        query_params = []
+
+        def count_params(execute, sql, params, many, context):
+            if not many:
+                query_params.append(len(params or ()))
+            return execute(sql, params, many, context)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            docs_csv = Path(tmp_dir, 'docs.csv')
+            docs = pd.read_csv(self.test_docs_csv, index_col=0)
+            docs = pd.concat([docs.iloc[[0]]] * 60, ignore_index=True)
+            docs['tid'] = [f'doc{idx}' for idx in range(60)]
+            docs['au_person'] = [f'SMITH{chr(ord("A") + idx // 26)}{chr(ord("A") + idx % 26)}, J'
+                                 for idx in range(60)]
+            docs.to_csv(docs_csv)
+            with mock.patch.object(connection.features, 'max_query_params', max_query_params), \
+                    connection.execute_wrapper(count_params):
+                import_csv_to_document_model(docs_csv, batch_size=60)
+
+        self.assertLessEqual(max(query_params), max_query_params)
+        self.assertEqual(Document.objects.count(), 60)
+        self.assertEqual(Document.objects.get(tid='doc59').authors.get().last, "SMITHCH")
+
     def test_import_csv_to_document_2(self):
         """
         Tests import_csv_to_document_model() in models.py:
@@ -132,3 +266,229 @@ class ModelsTests(TestCase):
                                  aliases=json.dumps(Counter(["TEMKO SL"])),
                                  count=1
                                  )
+
+
+class PersonNetworkTests(TestCase):
+    """
+    Tests ego_network_of_person in models.py and get_person_network in views.py
+    """
+    def setUp(self):
+        cache.clear()
+        self.people = {}
+        for last, org in [("DUNN", "Philip Morris"), ("TEAGUE", "RJ Reynolds"),
+                          ("TEMKO", "Covington & Burling"), ("RISI", "no positions available")]:
+            self.people[last] = DjangoPerson.objects.create(
+                last=last, first="", middle="", full_name=last, most_likely_org=org,
+                positions="{}", aliases="{}", count=1)
+        # authors and recipients of every document
+        for doc_idx, (authors, recipients) in enumerate([
+                (["DUNN", "TEAGUE"], ["TEAGUE"]),
+                (["DUNN"], ["TEMKO"]),
+                (["TEAGUE"], ["DUNN"]),
+                (["RISI"], ["TEAGUE", "RISI"])]):
+            doc = Document.objects.create(tid=f'doc{doc_idx}', pages=1)
+            doc.authors.add(*[self.people[last] for last in authors])
+            doc.recipients.add(*[self.people[last] for last in recipients])
+
+    def test_ego_network_of_person(self):
+        """
+        Networks have the people within degree steps of the person and the links between them,
+        weighted by the number of times that one of them wrote to the other
+        :return:
+        """
+        network = ego_network_of_person(self.people["DUNN"])
+        self.assertEqual(network['center_names'], {"DUNN": True})
+        self.assertEqual([node['name'] for node in network['nodes']], ["DUNN", "TEAGUE", "TEMKO"])
+        self.assertEqual([node['docs'] for node in network['nodes']], [3, 2, 1])
+        self.assertEqual(network['nodes'][0]['affiliation'], "Philip Morris")
+        self.assertEqual([(link['node1'], link['node2'], link['docs'])
+                          for link in network['links']],
+                         [("DUNN", "TEAGUE", 2), ("DUNN", "TEMKO", 1)])
+
+        network = ego_network_of_person(self.people["DUNN"], degree=2)
+        self.assertEqual({node['name'] for node in network['nodes']},
+                         {"DUNN", "TEAGUE", "TEMKO", "RISI"})
+        self.assertIn({'node1': "TEAGUE", 'node2': "RISI", 'docs': 1, 'words': 0},
+                      network['links'])
+
+        for kwargs in [{'min_weight': 2}, {'max_nodes': 2}]:
+            network = ego_network_of_person(self.people["DUNN"], degree=2, **kwargs)
+            self.assertEqual([node['name'] for node in network['nodes']], ["DUNN", "TEAGUE"])
+            self.assertEqual(len(network['links']), 1)
+
+    def test_ego_network_query_params(self):
+        """
+        Networks with more people than the database allows query parameters get queried in
+        chunks and stay the same
+        :return:
+        """
+        networks = [ego_network_of_person(self.people["DUNN"], degree=2)]
+        with mock.patch.object(connection.features, 'max_query_params', 2):
+            networks.append(ego_network_of_person(self.people["DUNN"], degree=2))
+        self.assertEqual(networks[0], networks[1])
+        self.assertEqual(len(networks[0]['nodes']), 4)
+
+    def test_get_person_network(self):
+        """
+        get_person_network streams the compact network of a person and caches it
+        :return:
+        """
+        params = {'person_id': self.people["TEAGUE"].id, 'degree': 2}
+        response = self.client.get('/get_person_network', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual((data['page'], data['num_pages'], data['count']), (1, 1, 3))
+        self.assertEqual(data['center_names'], {"TEAGUE": True})
+        self.assertTrue(all(str(node['cluster']) in data['clusters'] for node in data['nodes']))
+        self.assertEqual({(data['nodes'][link['source']]['name'],
+                           data['nodes'][link['target']]['name'], link['docs'])
+                          for link in data['links']},
+                         {("DUNN", "TEAGUE", 2), ("DUNN", "TEMKO", 1), ("TEAGUE", "RISI", 1)})
+        self.assertEqual({node['name']: node['pk'] for node in data['nodes']},
+                         {last: person.id for last, person in self.people.items()})
+
+        # cached networks only need the person and the latest document
+        with self.assertNumQueries(2):
+            cached = self.client.get('/get_person_network', params)
+            self.assertEqual(json.loads(b''.join(cached.streaming_content)), data)
+
+        # new documents give a new network
+        doc = Document.objects.create(tid='doc4', pages=1)
+        doc.authors.add(self.people["TEMKO"])
+        doc.recipients.add(self.people["RISI"])
+        response = self.client.get('/get_person_network', params)
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['count'], 4)
+
+    @override_settings(NETWORK_QUERY_PAGE_SIZE=2)
+    def test_get_person_network_pages(self):
+        """
+        Every page has all nodes and the next links, strongest links first
+        :return:
+        """
+        params = {'person_id': self.people["DUNN"].id, 'degree': 2}
+        pages = [json.loads(b''.join(self.client.get('/get_person_network',
+                                                     {**params, 'page': page})
+                                     .streaming_content))
+                 for page in [1, 2]]
+        self.assertEqual(pages[0]['nodes'], pages[1]['nodes'])
+        self.assertEqual([page['num_pages'] for page in pages], [2, 2])
+        self.assertEqual([len(page['links']) for page in pages], [2, 1])
+        self.assertEqual(pages[0]['links'][0]['docs'], 2)
+        self.assertEqual(self.client.get('/get_person_network',
+                                         {**params, 'page': 3}).status_code, 404)
+
+    def test_get_person_network_errors(self):
+        """
+        Invalid parameters get a 400 and unknown people a 404
+        :return:
+        """
+        person_id = self.people["DUNN"].id
+        for params in [{}, {'person_id': 'DUNN'}, {'person_id': person_id, 'degree': 3},
+                       {'person_id': person_id, 'min_weight': 0},
+                       {'person_id': person_id, 'max_nodes': 10000}]:
+            self.assertEqual(self.client.get('/get_person_network', params).status_code, 400)
+        self.assertEqual(self.client.get('/get_person_network',
+                                         {'person_id': person_id + 100}).status_code, 404)
+
+
+class NetworkDataViewTests(SimpleTestCase):
+    """
+    Tests get_network_data in views.py and its payload cache
+    """
+    def setUp(self):
+        NETWORK_PAYLOAD_CACHE.clear()
+
+    def test_get_network_data(self):
+        """
+        Repeated requests return the same network from the cache
+        :return:
+        """
+        responses = [self.client.get('/get_network_data', {'dataset': 'lawyers'})
+                     for _ in range(3)]
+        self.assertEqual((NETWORK_PAYLOAD_CACHE.misses, NETWORK_PAYLOAD_CACHE.hits), (1, 2))
+        self.assertEqual(responses[0]['Content-Type'], 'application/json')
+        self.assertEqual(responses[0].content, responses[2].content)
+
+        # the compiled network file gets served as it is
+        json_path = Path(BACKEND_DIR, 'data', 'person_lawyers_including_2nd_degree_edges.json')
+        self.assertEqual(responses[0].content, json_path.read_bytes())
+        data = json.loads(responses[0].content)
+        self.assertTrue(all(link['source'] == link['node1'] and link['target'] == link['node2']
+                            for link in data['links']))
+        self.assertTrue(all(str(node['cluster']) in data['clusters'] for node in data['nodes']))
+
+    def test_conditional_requests(self):
+        """
+        Requests with the current ETag or Last-Modified date get a 304 without the network
+        :return:
+        """
+        response = self.client.get('/get_network_data', {'dataset': 'sterling'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+        for headers in [{'HTTP_IF_NONE_MATCH': response['ETag']},
+                        {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}]:
+            revalidated = self.client.get('/get_network_data', {'dataset': 'sterling'},
+                                          **headers)
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(revalidated.content, b'')
+            self.assertEqual(revalidated['ETag'], response['ETag'])
+
+        changed = self.client.get('/get_network_data', {'dataset': 'sterling'},
+                                  HTTP_IF_NONE_MATCH='"outdated"')
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.content, response.content)
+
+    def test_compact_format(self):
+        """
+        ?format=compact serves the compact network, compressed as the Accept-Encoding header
+        allows
+        :return:
+        """
+        compact_path = Path(BACKEND_DIR, 'data',
+                            'person_research_directors_including_2nd_degree_edges.compact.json')
+        for accept_encoding, content_encoding, file_path in [
+                ('gzip, deflate, br', 'br', Path(f'{compact_path}.br')),
+                ('gzip, br;q=0', 'gzip', Path(f'{compact_path}.gz')),
+                ('', None, compact_path)]:
+            response = self.client.get('/get_network_data',
+                                       {'dataset': 'research_directors', 'format': 'compact'},
+                                       HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertEqual(response.content, file_path.read_bytes())
+            self.assertEqual(response.get('Content-Encoding'), content_encoding)
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+        compact = json.loads(gzip.decompress(Path(f'{compact_path}.gz').read_bytes()))
+        uncompressed = self.client.get('/get_network_data', {'dataset': 'research_directors'})
+        self.assertNotIn('Content-Encoding', uncompressed)
+        data = json.loads(uncompressed.content)
+        self.assertEqual(compact['nodes'], data['nodes'])
+        self.assertEqual([(compact['nodes'][link['source']]['name'],
+                           compact['nodes'][link['target']]['name']) for link in compact['links']],
+                         [(link['source'], link['target']) for link in data['links']])
+
+    def test_cache_size(self):
+        """
+        Changed files get loaded again and the cache keeps at most NETWORK_DATA_CACHE_SIZE
+        payloads
+        :return:
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_paths = [Path(tmp_dir, f'network_{idx}.json') for idx in range(2)]
+            for json_path in json_paths:
+                shutil.copy(Path(BACKEND_DIR, 'data', 'person_sterling.json'), json_path)
+
+            with override_settings(NETWORK_DATA_CACHE_SIZE=1):
+                payload = NETWORK_PAYLOAD_CACHE.get(json_paths[0], read_network_artifact)
+                self.assertIs(NETWORK_PAYLOAD_CACHE.get(json_paths[0], read_network_artifact),
+                              payload)
+
+                stat = json_paths[0].stat()
+                os.utime(json_paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+                NETWORK_PAYLOAD_CACHE.get(json_paths[0], read_network_artifact)
+                NETWORK_PAYLOAD_CACHE.get(json_paths[1], read_network_artifact)
+                self.assertEqual(len(NETWORK_PAYLOAD_CACHE), 1)
+                NETWORK_PAYLOAD_CACHE.get(json_paths[0], read_network_artifact)
+                self.assertEqual((NETWORK_PAYLOAD_CACHE.misses, NETWORK_PAYLOAD_CACHE.hits),
+                                 (4, 1))
@@ -1,151 +1,278 @@
 """
 Views that define API endpoints for the site
 """
+import hashlib
 import json
-import math
-from collections import Counter
+import threading
+from collections import OrderedDict, namedtuple
 from pathlib import Path
 
-from django.http import JsonResponse
-
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Max
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from apps.main.models import DjangoPerson, Document, ego_network_of_person
+from apps.main.serializers import EdgeSerializer, PersonSerializer
 from backend.config.settings.base import BACKEND_DIR
+from name_disambiguation.network_visualization import (COMPRESSED_SUFFIXES, compact_network,
+                                                       compact_network_path,
+                                                       compile_network_for_visualization)
+
+NETWORK_DATASETS = {
+    'lawyers': 'person_lawyers_including_2nd_degree_edges.json',
+    'research_directors': 'person_research_directors_including_2nd_degree_edges.json',
+    'sterling': 'person_sterling_including_2nd_degree_edges.json',
+}
+DEFAULT_NETWORK_DATASET_FILE = 'person_lawyers.json'
+# number of links that get_person_network encodes and sends at a time
+NETWORK_STREAM_CHUNK_SIZE = 100
+
+# content of a network file with the validators of its http responses
+NetworkArtifact = namedtuple('NetworkArtifact', ['payload', 'etag', 'last_modified'])
+
+
+class NetworkPayloadCache:
+    """
+    In-process LRU cache of the network files that get_network_data serves.
+    Entries are keyed by the json file and its modification time, so a regenerated network file
+    gets loaded again on the next request. The size bound is read from the
+    NETWORK_DATA_CACHE_SIZE setting (number of payloads) when an entry gets added.
+    Attributes:
+        hits (int): number of requests served from the cache
+        misses (int): number of requests that had to read a json file
+    """
+
+    def __init__(self):
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def clear(self):
+        """
+        Removes all payloads and resets the hit and miss counts
+        :return:
+        """
+        with self._lock:
+            self._payloads.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get(self, json_path, build_payload):
+        """
+        Returns the cached payload of a json file or builds and caches it
+        :param json_path: Path
+        :param build_payload: function json_path -> payload (e.g. read_network_artifact)
+        :return: payload
+        """
+        key = (str(json_path), Path(json_path).stat().st_mtime_ns)
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.misses += 1
+
+        payload = build_payload(json_path)
+        with self._lock:
+            # older versions of the same file can't be requested anymore
+            for other_key in [other_key for other_key in self._payloads
+                              if other_key[0] == key[0]]:
+                del self._payloads[other_key]
+            self._payloads[key] = payload
+            while len(self._payloads) > max(settings.NETWORK_DATA_CACHE_SIZE, 0):
+                self._payloads.popitem(last=False)
+        return payload
+
+
+NETWORK_PAYLOAD_CACHE = NetworkPayloadCache()
 
 
 def get_network_data(request):
     """
     Temporary view to get network test data json
+    The network files are compiled when they get generated (see
+    name_disambiguation/network_visualization.py) and get served as they are, from an
+    in-process cache (see NetworkPayloadCache). Responses have an ETag and a Last-Modified
+    header, so browsers can revalidate their copy and get a 304 if it is still current.
+    With ?format=compact, the compact version of the network gets served (links reference
+    nodes by index), brotli or gzip compressed if the browser accepts it.
     """
 
-    datasets = {
-        'lawyers': 'person_lawyers_including_2nd_degree_edges.json',
-        'research_directors': 'person_research_directors_including_2nd_degree_edges.json',
-        'sterling': 'person_sterling_including_2nd_degree_edges.json',
-    }
-
     if request.GET and 'dataset' in request.GET:
-        json_filename = datasets[request.GET['dataset']]
+        json_filename = NETWORK_DATASETS[request.GET['dataset']]
     else:
-        json_filename = 'person_lawyers.json'
-
-    print("loading", json_filename)
+        json_filename = DEFAULT_NETWORK_DATASET_FILE
 
     json_path = Path(BACKEND_DIR, 'data', json_filename)
-    with open(json_path) as json_file:
-        data = json.load(json_file)
-    nodes = data['nodes']
-    for node in nodes:
-        node['degree'] = -1
-
-    links = data['links']
-    adjacent_nodes = {}
-    for link in links:
-        link['source'] = link['node1']
-        link['target'] = link['node2']
-
-    data["adjacent_nodes"] = adjacent_nodes
-
-    clusters, nodes = get_clusters_data(nodes)
-    data['clusters'] = clusters
-    data['nodes'] = nodes
-
-    return JsonResponse(data)
-
-
-def get_clusters_data(nodes): # pylint: disable=R0914
-    """
-    Forms and organizes clusters based on node data. Assigns each nodes to a cluster
-
-    idea: each group takes up space proportionally on a 360 degree unit circle
-    the goal is to calculate where the center of each node cluster is on the unit circle
-
-    Each cluster consists of:
-    id: int
-    name: cluster name, eg. Lorillard
-    count: number of nodes in cluster
-    x_pos: relative position on x-axis, between 0 and 1
-    y_pos: relative position on y-axis, between 0 and 1
-    color: RGB color, array of 3 values between 0 and 255
-
-    returns: tuple(dict, list)
-    """
-
-    affiliations = Counter()
-    for node in nodes:
-        affiliations[node['affiliation']] += 1
-
-    no_pos_available_count = 0
-    if 'No Positions Available' in affiliations:
-        no_pos_available_count = affiliations['No Positions Available']
-        del affiliations['No Positions Available']
-
-    most_common_affiliations = affiliations.most_common()[:9]
-
-    # if more than 9 affiliations, put the ones outside the top 9 into an "others" group
-    others_group = set()
-    if len(affiliations) > 9:
-        others_group_count = 0
-        for affiliation, aff_count in affiliations.most_common()[9:]:
-            others_group.add(affiliation)
-            others_group_count += aff_count
-
-        most_common_affiliations += [('Others', others_group_count)]
-
-    # put "No Positions Available" at the end of the list, after "Others"
-    if no_pos_available_count > 0:
-        most_common_affiliations += [('No Positions Available', no_pos_available_count)]
-
-
-    # colormap
-    bmap = [
-        (53, 132, 187),
-        (255, 140, 38),
-        (65, 169, 65),
-        (218, 61, 61),
-        (158, 118, 195),
-        (151, 103, 93),
-        (229, 132, 200),
-        (140, 140, 140),
-        (194, 195, 56),
-        (46, 196, 211)
-    ][:len(most_common_affiliations)]
-
-
-    # Place clusters on unit circle
-    clusters = {}
-    cur_unit_circle_pos_in_degrees = 0
-    for affiliation_id, affiliation in enumerate(most_common_affiliations):
-        affilation_name, affiliation_count = affiliation
-
-        degrees_taken_by_affiliation = (affiliation_count / len(nodes) * 360 / 2)
-        degrees_taken_by_affiliation += 360 / len(most_common_affiliations) / 2
-        affiliation_center = cur_unit_circle_pos_in_degrees + degrees_taken_by_affiliation / 2
-        cur_unit_circle_pos_in_degrees += degrees_taken_by_affiliation
-
-        x_unit_circle = math.sin(affiliation_center * math.pi/180)
-        y_unit_circle = math.cos(affiliation_center * math.pi/180)
-        x_display_window = 0.5 - 0.5 * x_unit_circle
-        y_display_window = 0.5 - 0.5 * y_unit_circle
-
-        clusters[affiliation_id] = {
-            'id': affiliation_id,
-            'name': affilation_name,
-            'count': affiliation_count,
-            'x_pos': x_display_window,
-            'y_pos': y_display_window,
-            'color': f'rgb({",".join([str(i) for i in bmap[affiliation_id]])})'
-        }
-
-    # assign each node to a cluster.
-    # first create a map from affiliation to cluster
-    affiliation_to_cluster_dict = {
-        'No Positions Available': len(clusters) -1
-    }
-    for cluster in clusters.values():
-        affiliation_to_cluster_dict[cluster['name']] = cluster['id']
-    for affiliation in others_group:
-        affiliation_to_cluster_dict[affiliation] = affiliation_to_cluster_dict['Others']
-
-    for node in nodes:
-        node['cluster'] = affiliation_to_cluster_dict[node['affiliation']]
-
-    return clusters, nodes
+    content_encoding = None
+    if request.GET.get('format') == 'compact':
+        json_path = compact_network_path(json_path)
+        content_encoding = get_content_encoding(request, json_path)
+        if content_encoding:
+            json_path = Path(f'{json_path}{COMPRESSED_SUFFIXES[content_encoding]}')
+    artifact = NETWORK_PAYLOAD_CACHE.get(json_path, read_network_artifact)
+
+    response = get_conditional_response(request, etag=artifact.etag,
+                                        last_modified=artifact.last_modified)
+    if response is None:
+        response = HttpResponse(artifact.payload, content_type='application/json')
+    response['ETag'] = artifact.etag
+    response['Last-Modified'] = http_date(artifact.last_modified)
+    # browsers may keep the network but have to check with us before using it
+    response['Cache-Control'] = 'no-cache'
+    if request.GET.get('format') == 'compact':
+        patch_vary_headers(response, ['Accept-Encoding'])
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+    return response
+
+
+def get_content_encoding(request, json_path):
+    """
+    Returns the preferred content encoding ('br' over 'gzip') that the Accept-Encoding header
+    of a request allows and that json_path has a compressed copy for
+    :param request: HttpRequest
+    :param json_path: Path, compact network file
+    :return: str or None if the file should be served uncompressed
+    """
+    accepted_encodings = set()
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = coding.partition(';')
+        try:
+            quality = float(params.strip()[2:]) if params.strip().startswith('q=') else 1
+        except ValueError:
+            quality = 0
+        if quality > 0:
+            accepted_encodings.add(name.strip().lower())
+
+    for content_encoding, suffix in COMPRESSED_SUFFIXES.items():
+        if (content_encoding in accepted_encodings and
+                Path(f'{json_path}{suffix}').exists()):
+            return content_encoding
+    return None
+
+
+def read_network_artifact(json_path):
+    """
+    Reads a compiled network file
+    :param json_path: Path
+    :return: NetworkArtifact
+    """
+
+    print("loading", Path(json_path).name)
+
+    with open(json_path, 'rb') as json_file:
+        payload = json_file.read()
+    return NetworkArtifact(payload=payload,
+                           etag=quote_etag(hashlib.sha256(payload).hexdigest()[:32]),
+                           last_modified=int(Path(json_path).stat().st_mtime))
+
+
+def get_person_network(request):
+    """
+    Computes the network of a person from the documents in the database (see
+    ego_network_of_person) and streams one page of its links. The network is compiled and
+    compact like the network files that get_network_data serves with ?format=compact, so links
+    reference nodes by index, and every page has all nodes.
+    Query parameters: person_id (DjangoPerson id), degree (1 or 2), min_weight (minimum number
+    of documents of a link), max_nodes, and page (links per page: NETWORK_QUERY_PAGE_SIZE).
+    Networks get cached, see get_person_network_payload.
+    """
+    try:
+        person_id = get_int_parameter(request, 'person_id')
+        degree = get_int_parameter(request, 'degree', default=1, max_value=2)
+        min_weight = get_int_parameter(request, 'min_weight', default=1)
+        max_nodes = get_int_parameter(request, 'max_nodes', default=100,
+                                      max_value=settings.NETWORK_QUERY_MAX_NODES)
+        page_number = get_int_parameter(request, 'page', default=1)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    person = get_object_or_404(DjangoPerson, id=person_id)
+    network = get_person_network_payload(person, degree, min_weight, max_nodes)
+    try:
+        page = Paginator(network['links'], settings.NETWORK_QUERY_PAGE_SIZE).page(page_number)
+    except InvalidPage as error:
+        raise Http404(str(error)) from error
+    return StreamingHttpResponse(stream_network_page(network, page),
+                                 content_type='application/json')
+
+
+def get_int_parameter(request, name, default=None, min_value=1, max_value=None):
+    """
+    Returns an integer query parameter of a request
+    :param request: HttpRequest
+    :param name: str
+    :param default: int or None if the parameter is required
+    :param min_value: int
+    :param max_value: int or None
+    :return: int
+    """
+    value = request.GET.get(name)
+    if value is None:
+        if default is None:
+            raise ValueError(f'{name} is required')
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f'{name} has to be an integer') from None
+    if value < min_value or (max_value is not None and value > max_value):
+        raise ValueError(f'{name} has to be between {min_value} and {max_value}'
+                         if max_value is not None else f'{name} has to be at least {min_value}')
+    return value
+
+
+def get_person_network_payload(person, degree, min_weight, max_nodes):
+    """
+    Returns the compiled and compact network of a person with serialized nodes and links from
+    the django cache, or computes and caches it. The cache key has the id of the latest
+    document, so imported documents give new networks; people that changed get updated when
+    the network expires (NETWORK_QUERY_CACHE_TIMEOUT).
+    :param person: DjangoPerson
+    :param degree: int
+    :param min_weight: int
+    :param max_nodes: int
+    :return: dict
+    """
+    latest_document_id = Document.objects.aggregate(Max('id'))['id__max']
+    key = f'person_network:{person.id}:{degree}:{min_weight}:{max_nodes}:{latest_document_id}'
+    network = cache.get(key)
+    if network is None:
+        network = compact_network(compile_network_for_visualization(
+            ego_network_of_person(person, degree, min_weight, max_nodes)))
+        network['nodes'] = PersonSerializer(network['nodes'], many=True).data
+        network['links'] = EdgeSerializer(network['links'], many=True).data
+        cache.set(key, network, settings.NETWORK_QUERY_CACHE_TIMEOUT)
+    return network
+
+
+def stream_network_page(network, page):
+    """
+    Yields the json of one page of a network: everything but the links, the page number, the
+    number of pages and links, and then the links of the page in chunks
+    :param network: dict, see get_person_network_payload
+    :param page: django.core.paginator.Page of the links of the network
+    :return: generator of str
+    """
+    head = {key: value for key, value in network.items() if key != 'links'}
+    head.update(page=page.number, num_pages=page.paginator.num_pages,
+                count=page.paginator.count)
+    # the json of head without its closing brace
+    yield json.dumps(head, separators=(',', ':'))[:-1] + ',"links":['
+    links = page.object_list
+    for start in range(0, len(links), NETWORK_STREAM_CHUNK_SIZE):
+        chunk = ','.join(json.dumps(link, separators=(',', ':'))
+                         for link in links[start:start + NETWORK_STREAM_CHUNK_SIZE])
+        yield f',{chunk}' if start else chunk
+    yield ']}'
@@ -152,6 +152,14 @@ CORS_ORIGIN_WHITELIST = [
 ]
 
 
+# number of post-processed network json payloads that get_network_data keeps in memory
+NETWORK_DATA_CACHE_SIZE = 16
+# limits of the networks that get_person_network computes from the database, the number of
+# links per page, and how long (in seconds) they stay in the cache
+NETWORK_QUERY_MAX_NODES = 500
+NETWORK_QUERY_PAGE_SIZE = 1000
+NETWORK_QUERY_CACHE_TIMEOUT = 60 * 60
+
 # Django webpack loader settings
 WEBPACK_LOADER = {
     'DEFAULT': {
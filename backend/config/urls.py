@@ -28,6 +28,8 @@ urlpatterns = [
 
     # temporary json endpoint for network data
     url('get_network_data', main_views.get_network_data),
+    # json endpoint for the network of any person in the database
+    url('get_person_network', main_views.get_person_network),
     url('landing', render_react_view, {"component_name": "LandingView"}),
     url('about', render_react_view, {"component_name": "AboutView"}),
 
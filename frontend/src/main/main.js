@@ -446,11 +446,17 @@ class MainView extends React.Component {
 
     async load_dataset(dataset_name) {
         const dataset = encodeURIComponent(dataset_name);
-        fetch(`get_network_data?dataset=${dataset}`)
+        fetch(`get_network_data?dataset=${dataset}&format=compact`)
             .then((response) => {
                 response
                     .json()
                     .then((data) => {
+                        // compact networks reference nodes by index. the force simulation
+                        // identifies nodes by name (see initialize_force_sim)
+                        data.links.forEach((link) => {
+                            link.source = data.nodes[link.source].name;
+                            link.target = data.nodes[link.target].name;
+                        });
                         // create a copy of the center names so we can restore them on unfocus.
                         data.center_names_backup = {... data.center_names};
                         this.setState({data:data});
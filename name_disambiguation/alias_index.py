@@ -0,0 +1,230 @@
+"""
+Read-only, memory-mapped alias -> person index of a stored people db.
+
+PeopleDatabase.store_to_disk writes the index next to the people db (see alias_index_path).
+Looking up an alias only needs the index file: no people get loaded, and any number of
+processes can share the memory-mapped file.
+
+File layout (all integers little endian):
+- header: magic (8 bytes), format version (uint32), padding (uint32), number of aliases n (uint64)
+- alias offsets: n + 1 uint64, byte offsets of the aliases in the alias table
+- person rows: n uint64, index of the person in the people db file
+- person ids: 2 * n uint64, high and low 64 bits of the person_id
+- alias table: the utf-8 encoded aliases, sorted by their bytes
+Big endian machines swap the integers when writing, and copy and swap them when reading.
+
+Only uses the standard library, so importing it is fast.
+"""
+
+import mmap
+import struct
+import sys
+import tempfile
+import unittest
+from array import array
+from pathlib import Path
+from unittest import mock
+
+ALIAS_INDEX_MAGIC = b'PDBALIAS'
+ALIAS_INDEX_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<8sIIQ')
+
+
+def alias_index_path(people_db_path):
+    """
+    Returns the path of the alias index that belongs to a people db file
+    :param people_db_path: Path
+    :return: Path
+    """
+    return Path(people_db_path).with_suffix('.alias_index')
+
+
+def write_alias_index(file_path, alias_to_person):
+    """
+    Writes an alias index
+
+    :param file_path: Path
+    :param alias_to_person: dict, maps (lower case) aliases to (person row, person_id)
+    :return:
+    """
+    encoded = sorted((alias.encode('utf-8'), row, person_id)
+                     for alias, (row, person_id) in alias_to_person.items())
+
+    offsets = array('Q', [0])
+    rows = array('Q')
+    person_ids = array('Q')
+    for alias, row, person_id in encoded:
+        offsets.append(offsets[-1] + len(alias))
+        rows.append(row)
+        person_ids.extend(divmod(person_id, 2 ** 64))
+
+    with open(str(file_path), 'wb') as outfile:
+        outfile.write(_HEADER.pack(ALIAS_INDEX_MAGIC, ALIAS_INDEX_FORMAT_VERSION, 0, len(encoded)))
+        for integers in [offsets, rows, person_ids]:
+            if sys.byteorder != 'little':
+                integers.byteswap()
+            outfile.write(integers.tobytes())
+        outfile.write(b''.join(alias for alias, _, _ in encoded))
+
+
+def _read_integers(memory, start, count):
+    """
+    Returns count little endian uint64 starting at byte start of memory. On little endian
+    machines, this is a view of the memory map, otherwise a byteswapped copy.
+    :param memory: memoryview
+    :param start: int
+    :param count: int
+    :return: memoryview or array
+    """
+    view = memory[start:start + 8 * count].cast('Q')
+    if sys.byteorder == 'little':
+        return view
+    integers = array('Q', view)
+    view.release()
+    integers.byteswap()
+    return integers
+
+
+class AliasIndex:
+    """
+    Memory-mapped alias index written by write_alias_index.
+    Aliases get looked up with a binary search over the sorted alias table.
+
+    >>> with AliasIndex(path) as alias_index:       # doctest: +SKIP
+    ...     alias_index.get_person_id('dunn, wl')
+    """
+
+    def __init__(self, file_path):
+        """
+        Opens and memory-maps an alias index
+        :param file_path: Path
+        """
+        with open(str(file_path), 'rb') as infile:
+            self._mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, self._length = _HEADER.unpack_from(self._mmap)
+        if magic != ALIAS_INDEX_MAGIC:
+            raise ValueError(f"{file_path} is not an alias index.")
+        if version != ALIAS_INDEX_FORMAT_VERSION:
+            raise ValueError(f"{file_path} uses alias index format version {version}, expected "
+                             f"version {ALIAS_INDEX_FORMAT_VERSION}.")
+
+        memory = memoryview(self._mmap)
+        start = _HEADER.size
+        self._offsets = _read_integers(memory, start, self._length + 1)
+        start += 8 * (self._length + 1)
+        self._rows = _read_integers(memory, start, self._length)
+        start += 8 * self._length
+        self._person_ids = _read_integers(memory, start, 2 * self._length)
+        self._aliases_start = start + 16 * self._length
+        memory.release()
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, alias):
+        return self._find(alias) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Releases the memory map
+        :return:
+        """
+        for integers in [self._offsets, self._rows, self._person_ids]:
+            if isinstance(integers, memoryview):
+                integers.release()
+        self._mmap.close()
+
+    def alias(self, idx):
+        """
+        Returns the alias at position idx of the sorted alias table
+        :param idx: int
+        :return: str
+        """
+        return self._alias_bytes(idx).decode('utf-8')
+
+    def _alias_bytes(self, idx):
+        start = self._aliases_start + self._offsets[idx]
+        end = self._aliases_start + self._offsets[idx + 1]
+        return self._mmap[start:end]
+
+    def _find(self, alias):
+        """
+        Returns the position of alias in the sorted alias table or None if it isn't in there.
+        Aliases are case insensitive, like in PeopleDatabase.get_person_from_alias
+        :param alias: str
+        :return: int or None
+        """
+        key = alias.lower().encode('utf-8')
+        low, high = 0, self._length
+        while low < high:
+            mid = (low + high) // 2
+            if self._alias_bytes(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._length and self._alias_bytes(low) == key:
+            return low
+        return None
+
+    def get_person_row(self, alias):
+        """
+        Returns the index of the person with the alias in the people db file or None
+        :param alias: str
+        :return: int or None
+        """
+        idx = self._find(alias)
+        return None if idx is None else self._rows[idx]
+
+    def get_person_id(self, alias):
+        """
+        Returns the person_id of the person with the alias or None
+        :param alias: str
+        :return: int or None
+        """
+        idx = self._find(alias)
+        if idx is None:
+            return None
+        return (self._person_ids[2 * idx] << 64) | self._person_ids[2 * idx + 1]
+
+
+class TestAliasIndex(unittest.TestCase):
+    """
+    Tests writing and reading alias indexes
+    """
+
+    def test_lookup(self):
+        """
+        Every alias can be found, other strings can't
+        """
+        alias_to_person = {
+            'dunn, wl': (0, 2 ** 100 + 5),
+            'dunn, william l': (0, 2 ** 100 + 5),
+            'teague ce jr': (1, 7),
+            'müller, k': (2, 2 ** 64),
+            '': (3, 0),
+        }
+        for byteorder in [sys.byteorder, 'big']:
+            # with 'big', writing and reading both swap the integers
+            with self.subTest(byteorder=byteorder), \
+                    mock.patch.object(sys, 'byteorder', byteorder), \
+                    tempfile.TemporaryDirectory() as tmp_dir:
+                file_path = Path(tmp_dir, 'test.alias_index')
+                write_alias_index(file_path, alias_to_person)
+                with AliasIndex(file_path) as alias_index:
+                    self.assertEqual(len(alias_index), len(alias_to_person))
+                    for alias, (row, person_id) in alias_to_person.items():
+                        self.assertEqual(alias_index.get_person_row(alias.upper()), row)
+                        self.assertEqual(alias_index.get_person_id(alias), person_id)
+                    for alias in ['dunn', 'dunn, wl ', 'zz', 'a']:
+                        self.assertNotIn(alias, alias_index)
+                        self.assertIsNone(alias_index.get_person_id(alias))
+
+if __name__ == '__main__':
+    unittest.main()
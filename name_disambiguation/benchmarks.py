@@ -0,0 +1,772 @@
+"""
+Benchmarks for the name disambiguation pipeline.
+
+Each benchmark compares an optimized code path against the implementation it replaced and
+prints the timings. Run them from the name_disambiguation folder, e.g.
+python benchmarks.py org_matcher
+"""
+import contextlib
+import gzip
+import io
+import json
+import os
+import pickle
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+import brotli
+import pandas as pd
+from nameparser import HumanName
+
+from name_disambiguation.candidate_search import CandidateSearch, name_trigrams, normalize_name
+from name_disambiguation.clean_org_names import RAW_ORG_TO_CLEAN_ORG_DICT
+from name_disambiguation.config import DATA_PATH
+from name_disambiguation import network_generation
+from name_disambiguation.doc_ingestion import ingest_docs_in_chunks
+from name_disambiguation.network_generation import create_people_db_from_docs
+from name_disambiguation.network_cache import NetworkCache
+from name_disambiguation.network_visualization import (BACKEND_DATA_PATH, COMPACT_SUFFIX,
+                                                       compact_network_path)
+from name_disambiguation.parse_cache import ParseCache
+from name_disambiguation.people_db import PeopleDatabase, convert_people_db_pickle
+from name_disambiguation.person import Person
+from name_disambiguation.sparse_network import DocumentNetwork
+
+NAMES_RAW_TEST_PATH = Path(DATA_PATH, 'name_disambiguation', 'tobacco_names_raw_test.json')
+D_NAMES_DB_PATH = Path(DATA_PATH, 'name_disambiguation', 'd_names_db.pickle')
+
+
+def load_raw_test_names(min_count=1):
+    """
+    Loads the raw names of tobacco_names_raw_test.json
+    :param min_count: int, only return names that appear at least min_count times
+    :return: dict, maps raw names to counts
+    """
+    with open(NAMES_RAW_TEST_PATH, 'r') as infile:
+        name_dict = json.load(infile)
+    return {name: count for name, count in name_dict.items() if count >= min_count}
+
+
+def legacy_extract_dictionary_org_names(name_raw):       # pylint: disable=C0103
+    """
+    The dictionary part of Person.extract_raw_org_names_from_name before RAW_ORG_MATCHER:
+    one regex per RAW_ORG_TO_CLEAN_ORG_DICT entry for every name.
+    Kept as the reference for benchmark_org_matcher.
+
+    :param name_raw: str
+    :return: str (name_raw without the raw org names), list of str (clean organization names)
+    """
+    extracted_positions = []
+
+    for raw_org, clean_org in RAW_ORG_TO_CLEAN_ORG_DICT.items():
+        while True:
+            # the last hit of the raw org gets removed first
+            hits = list(re.finditer(r'\b' + raw_org + r'\b', name_raw))
+            if not hits:
+                break
+            name_without_org = name_raw[:hits[-1].start()] + name_raw[hits[-1].end():]
+
+            if len(raw_org) == 2:
+                # two letters could also be initials: keep them if the name needs them
+                name = HumanName(name_without_org)
+                if not (name.first or name.middle) or not name.last:
+                    break
+                extracted_positions.append(clean_org)
+            elif clean_org != "@skip@":
+                extracted_positions.append(clean_org)
+            name_raw = name_without_org
+
+    return name_raw.strip(', '), extracted_positions
+
+
+def benchmark_org_matcher():
+    """
+    Compares the per-entry regex loop with RAW_ORG_MATCHER on all names of
+    tobacco_names_raw_test.json and checks that both find the same orgs.
+    :return: None
+    """
+    names = list(load_raw_test_names())
+    print(f"Extracting dictionary orgs from {len(names)} names.")
+
+    start = time.time()
+    legacy_results = [legacy_extract_dictionary_org_names(name) for name in names]
+    legacy_time = time.time() - start
+    print(f"regex loop:  {legacy_time:.2f}s ({len(names) / legacy_time:.0f} names/sec)")
+
+    start = time.time()
+    matcher_results = [Person._extract_dictionary_org_names(name)   # pylint: disable=W0212
+                       for name in names]
+    matcher_time = time.time() - start
+    print(f"org matcher: {matcher_time:.2f}s ({len(names) / matcher_time:.0f} names/sec)")
+
+    mismatches = [name for name, legacy, new in zip(names, legacy_results, matcher_results)
+                  if legacy != new]
+    print(f"Speedup: {legacy_time / matcher_time:.1f}x. Mismatches: {len(mismatches)}")
+    for name in mismatches[:10]:
+        print("mismatch:", name)
+
+
+def create_test_people_db(name_dict):
+    """
+    Creates an unmerged people db from a dict of raw names and counts
+    :param name_dict: dict
+    :return: PeopleDatabase
+    """
+    people_db = PeopleDatabase()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, count in name_dict.items():
+            people_db.add_person_raw(name_raw=name, count=count)
+    return people_db
+
+
+def benchmark_merge_engines(min_count=3):
+    """
+    Merges the names of tobacco_names_raw_test.json that appear at least min_count times
+    (like merge_names_from_json_file) with both merge engines and compares the results.
+    :param min_count: int
+    :return: None
+    """
+    name_dict = load_raw_test_names(min_count)
+    results = {}
+    for engine in ['iterative', 'union_find']:
+        people_db = create_test_people_db(name_dict)
+        start = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            people_db.merge_duplicates(print_merge_results_for_name=None, engine=engine)
+        print(f"{engine:>10}: merged {len(name_dict)} names into {len(people_db)} people in "
+              f"{time.time() - start:.2f}s")
+        results[engine] = {(person.stemmed(), tuple(sorted(person.aliases)))
+                           for person in people_db.people}
+
+    print(f"People only found by one of the engines: "
+          f"{len(results['iterative'] ^ results['union_find'])}")
+
+
+def benchmark_parallel_merge(min_count=3, worker_counts=(1, 2, 4)):
+    """
+    Merges the names of tobacco_names_raw_test.json that appear at least min_count times in one
+    process and in process pools of different sizes and compares the results.
+    Speedups are bounded by the number of cores (os.cpu_count()).
+    :param min_count: int
+    :param worker_counts: tuple of ints, pool sizes to benchmark
+    :return: None
+    """
+    name_dict = load_raw_test_names(min_count)
+    print(f"Merging {len(name_dict)} names on {os.cpu_count()} cores.")
+    results = {}
+    for max_workers in (None,) + tuple(worker_counts):
+        people_db = create_test_people_db(name_dict)
+        start = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            people_db.merge_duplicates(print_merge_results_for_name=None,
+                                       parallel=max_workers is not None,
+                                       max_workers=max_workers)
+        label = 'sequential' if max_workers is None else f'{max_workers} workers'
+        print(f"{label:>10}: {len(people_db)} people in {time.time() - start:.2f}s")
+        results[label] = {(person.stemmed(), tuple(sorted(person.aliases)))
+                          for person in people_db.people}
+
+    print(f"Results identical to sequential merge: "
+          f"{all(result == results['sequential'] for result in results.values())}")
+
+
+class LegacyHashedPerson(Person):
+    """
+    Person with the hashing and equality of Person before person_id: a hash of an f-string of
+    the names, positions, and aliases, computed on every call.
+    Kept as the reference for benchmark_person_hashing.
+    """
+
+    def __eq__(self, other):
+        return hash(self) == hash(other)
+
+    def __hash__(self):
+        return hash(f'{self.last} {self.first} {self.middle} {self.positions} {self.aliases}')
+
+
+def benchmark_person_hashing(n_people=20000, repeats=5):
+    """
+    Compares set and dict operations on people (people db membership, network nodes and edges)
+    with the legacy f-string hash and with person_id hashing.
+    :param n_people: int, number of raw test names to use
+    :param repeats: int
+    :return: None
+    """
+    names = list(load_raw_test_names())[:n_people]
+    print(f"Set and dict operations on the people of {len(names)} names, {repeats} repeats.")
+
+    timings = {}
+    for label, person_class in [('f-string hash', LegacyHashedPerson),
+                                ('person_id', Person)]:
+        people = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name in names:
+                try:
+                    people.append(person_class(name_raw=name))
+                except IndexError:      # names that add_person_raw would skip as well
+                    pass
+        pairs = list(zip(people, people[1:]))
+
+        start = time.time()
+        for _ in range(repeats):
+            people_set = set(people)
+            for person in people:
+                assert person in people_set
+            nodes = {person: 0 for person in people}
+            for person in people:
+                nodes[person] += 1
+            edges = {tuple(sorted(pair)): 0 for pair in pairs}
+            for pair in pairs:
+                edges[tuple(sorted(pair))] += 1
+            for person in people:
+                people_set.discard(person)
+        timings[label] = time.time() - start
+        print(f"{label:>14}: {timings[label]:.2f}s")
+
+    print(f"Speedup: {timings['f-string hash'] / timings['person_id']:.1f}x")
+
+
+class LegacyDictPerson:
+    """
+    Person before __slots__: every attribute lives in a per-instance __dict__ and the names are
+    not interned.
+    Kept as the reference for benchmark_person_memory.
+    """
+
+    def __setstate__(self, state):
+        # old pickles store aliases as lists
+        self.__dict__.update(state, aliases=Counter(state['aliases']))
+
+
+class PeopleUnpickler(pickle.Unpickler):
+    """
+    Unpickles a people db (also one pickled from __main__) with person_class as the Person class
+    """
+    person_class = Person
+
+    def find_class(self, module, name):
+        if name == 'Person':
+            return self.person_class
+        if name == 'PeopleDatabase':
+            return PeopleDatabase
+        return super().find_class(module, name)
+
+
+class LegacyPeopleUnpickler(PeopleUnpickler):
+    """
+    Unpickles a people db with LegacyDictPerson instead of Person
+    """
+    person_class = LegacyDictPerson
+
+
+def traced_memory(function):
+    """
+    Calls function and returns its result and how much memory (bytes) it still holds
+    :param function: function without arguments
+    :return: result of function, int
+    """
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = function()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, after - before
+
+
+def benchmark_person_memory(file_path=D_NAMES_DB_PATH):
+    """
+    Compares the memory of the people of a pickled people db (by default d_names_db.pickle)
+    as LegacyDictPerson and as Person, and reports the memory of load_from_disk.
+    :param file_path: Path
+    :return: None
+    """
+
+    def unpickle(unpickler_class):
+        with open(file_path, 'rb') as infile:
+            return unpickler_class(infile).load().people
+
+    legacy_people, legacy_memory = traced_memory(lambda: unpickle(LegacyPeopleUnpickler))
+    people, memory = traced_memory(lambda: unpickle(PeopleUnpickler))
+    print(f"Unpickling {len(people)} people from {Path(file_path).name}")
+    for label, n_bytes in [('__dict__', legacy_memory), ('__slots__', memory)]:
+        print(f"{label:>10}: {n_bytes / 1024:.0f} KB ({n_bytes / len(people):.0f} bytes/person)")
+    print(f"Memory saved: {1 - memory / legacy_memory:.0%}")
+    del legacy_people
+
+    def load_people_db():
+        people_db = PeopleDatabase()
+        with contextlib.redirect_stdout(io.StringIO()):
+            people_db.load_from_disk(file_path)
+        return people_db
+
+    people_db, memory = traced_memory(load_people_db)
+    print(f"load_from_disk: {len(people_db)} people in {memory / 1024:.0f} KB, including the alias "
+          f"and last name indexes")
+
+
+def benchmark_people_db_format(min_count=3):
+    """
+    Compares load_from_disk of a pickled people db (with its post-processing) with the columnar
+    format for d_names_db.pickle and a merged db of the names of tobacco_names_raw_test.json
+    that appear at least min_count times.
+    :param min_count: int
+    :return: None
+    """
+
+    people_db = create_test_people_db(load_raw_test_names(min_count))
+    with contextlib.redirect_stdout(io.StringIO()):
+        people_db.merge_duplicates(print_merge_results_for_name=None, engine='union_find')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_names_pickle = Path(tmp_dir, 'test_names_db.pickle')
+        with open(test_names_pickle, 'wb') as outfile:
+            pickle.dump(people_db, outfile)
+
+        for pickle_path in [D_NAMES_DB_PATH, test_names_pickle]:
+            columnar_path = convert_people_db_pickle(pickle_path,
+                                                     Path(tmp_dir, f'{pickle_path.stem}.npz'))
+            timings = {}
+            for label, file_path in [('pickle', pickle_path), ('columnar', columnar_path)]:
+                loaded_db = PeopleDatabase()
+                start = time.time()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    loaded_db.load_from_disk(file_path)
+                timings[label] = time.time() - start
+            print(f"{pickle_path.name} ({len(loaded_db)} people): pickle {timings['pickle']:.3f}s, "
+                  f"columnar {timings['columnar']:.3f}s, "
+                  f"speedup {timings['pickle'] / timings['columnar']:.1f}x")
+
+
+def benchmark_alias_lookup(min_count=3, alias='Dunn, WL'):
+    """
+    Compares the cold-start time of looking up one alias in a fresh python process: loading the
+    people db and calling get_person_from_alias vs. the memory-mapped alias index.
+    Uses a merged db of the names of tobacco_names_raw_test.json that appear at least min_count
+    times.
+    :param min_count: int
+    :param alias: str
+    :return: None
+    """
+
+    people_db = create_test_people_db(load_raw_test_names(min_count))
+    with contextlib.redirect_stdout(io.StringIO()):
+        people_db.merge_duplicates(print_merge_results_for_name=None, engine='union_find')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir, 'test_names_db.npz')
+        people_db.store_to_disk(file_path)
+        scripts = {
+            'load_from_disk': (
+                "from name_disambiguation.people_db import PeopleDatabase\n"
+                "people_db = PeopleDatabase()\n"
+                f"people_db.load_from_disk({str(file_path)!r})\n"
+                f"print(people_db.get_person_from_alias({alias!r}).person_id)\n"
+            ),
+            'alias index': (
+                "from name_disambiguation.alias_index import AliasIndex, alias_index_path\n"
+                f"with AliasIndex(alias_index_path({str(file_path)!r})) as alias_index:\n"
+                f"    print(alias_index.get_person_id({alias!r}))\n"
+            ),
+        }
+        print(f"Looking up {alias} among {len(people_db)} people in a new process.")
+        person_ids = set()
+        for label, script in scripts.items():
+            start = time.time()
+            result = subprocess.run([sys.executable, '-c', script], check=True,
+                                    capture_output=True, text=True,
+                                    cwd=Path(__file__).parent.parent)
+            print(f"{label:>14}: {time.time() - start:.3f}s")
+            person_ids.add(result.stdout.strip())
+        print(f"Same person found: {len(person_ids) == 1}")
+
+
+def create_test_docs(n_docs, min_count=3, seed=0):
+    """
+    Creates a DataFrame of documents with the columns of docs_1970s_all.csv. The people are
+    drawn from the names of tobacco_names_raw_test.json that appear at least min_count times,
+    the organizations from RAW_ORG_TO_CLEAN_ORG_DICT.
+    :param n_docs: int
+    :param min_count: int
+    :param seed: int
+    :return: pd.DataFrame
+    """
+    rng = random.Random(seed)
+    names = sorted(load_raw_test_names(min_count))
+    orgs = sorted(RAW_ORG_TO_CLEAN_ORG_DICT)[:500] + ['US HOUSE COMM ON INTERSTATE', 'US CONGRESS']
+
+    def cell(choices, max_len):
+        return '; '.join(rng.sample(choices, rng.randint(0, max_len)))
+
+    return pd.DataFrame([{
+        'au': cell(names, 2), 'au_person': cell(names, 2), 'au_org': cell(orgs, 1),
+        'rc': cell(names, 3), 'rc_person': cell(names, 1), 'rc_org': cell(orgs, 1),
+    } for _ in range(n_docs)])
+
+
+def benchmark_streaming_memory(doc_counts=(10000, 40000), words_per_doc=300, min_count=30):
+    """
+    Compares the peak memory (max RSS) of creating the people db of
+    create_db_of_1970s_docs_from_csv from a csv read at once with pd.read_csv and from a csv read
+    in chunks with ingest_docs_in_chunks. Every configuration runs in a new python process.
+    The csvs have doc_counts synthetic documents (see create_test_docs) with a text column of
+    words_per_doc words. Their people are the names that appear at least min_count times, so the
+    people db stops growing after the first few thousand documents.
+    :param doc_counts: tuple of int
+    :param words_per_doc: int
+    :param min_count: int
+    :return: None
+    """
+    scripts = {
+        'read_csv': (
+            "import pandas as pd\n"
+            "from name_disambiguation.doc_ingestion import IngestedDocuments\n"
+            "df = pd.read_csv({file_path!r}).fillna('')\n"
+            "ingested_doc_chunks = [IngestedDocuments(df, ParseCache())]\n"
+        ),
+        'chunks': (
+            "from name_disambiguation.doc_ingestion import ingest_docs_in_chunks\n"
+            "ingested_doc_chunks = ingest_docs_in_chunks({file_path!r}, parse_cache=ParseCache())\n"
+        ),
+    }
+    # ru_maxrss would include the memory of this process at the time of the fork -> use the
+    # peak RSS of the new process image (VmHWM, in kB)
+    script_end = (
+        "import re\n"
+        "from name_disambiguation.network_generation import create_people_db_from_docs\n"
+        "people_db, docs_count = create_people_db_from_docs(ingested_doc_chunks)\n"
+        "with open('/proc/self/status') as status:\n"
+        "    print(len(people_db), re.search(r'VmHWM:\\s+(\\d+)', status.read()).group(1))\n"
+    )
+
+    rng = random.Random(0)
+    words = sorted({word for name in load_raw_test_names(10) for word in name.split()})
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for doc_count in doc_counts:
+            df = create_test_docs(doc_count, min_count)        # pylint: disable=C0103
+            df['tid'] = [f'doc{idx}' for idx in range(doc_count)]
+            df['text'] = [' '.join(rng.choices(words, k=words_per_doc)) for _ in range(doc_count)]
+            file_path = str(Path(tmp_dir, f'docs_{doc_count}.csv'))
+            df.to_csv(file_path)
+            del df
+
+            results = {}
+            for label, script in scripts.items():
+                result = subprocess.run(
+                    [sys.executable, '-c',
+                     "from name_disambiguation.parse_cache import ParseCache\n" +
+                     script.format(file_path=file_path) + script_end],
+                    check=True, capture_output=True, text=True, cwd=Path(__file__).parent.parent)
+                results[label] = result.stdout.split()[-2:]
+            print(f"{doc_count} docs ({os.path.getsize(file_path) / 2 ** 20:.0f} MB csv): " +
+                  ", ".join(f"{label} {int(max_rss) / 1024:.0f} MB max RSS"
+                            for label, (_, max_rss) in results.items()) +
+                  f", same number of people: {len({p for p, _ in results.values()}) == 1}")
+
+
+def benchmark_network_cache(n_docs=20000, min_count=3):       # pylint: disable=R0914
+    """
+    Compares loading a cached network of n_docs synthetic documents (see create_test_docs) from
+    the old pickle of its nodes and edges dicts with loading the DocumentNetwork .npz file of the
+    network cache (for a people db that is already loaded). Also times the cache key
+    computation with and without the stored file hashes.
+    :param n_docs: int
+    :param min_count: int
+    :return: None
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        docs_path = Path(tmp_dir, 'docs.csv')
+        create_test_docs(n_docs, min_count).to_csv(docs_path)
+        people_db_path = Path(tmp_dir, 'people_db.npz')
+        with contextlib.redirect_stdout(io.StringIO()):
+            people_db, _ = create_people_db_from_docs(
+                ingest_docs_in_chunks(docs_path, parse_cache=ParseCache()))
+            people_db.store_to_disk(people_db_path)
+            network = DocumentNetwork.from_docs(ingest_docs_in_chunks(docs_path), people_db)
+
+        network_cache = NetworkCache(Path(tmp_dir, 'cache'))
+        for label in ['hashing inputs', 'stored hashes']:
+            start = time.time()
+            network_path = network_cache.artifact_path('network', [docs_path, people_db_path])
+            print(f"{label:>23}: {time.time() - start:.3f}s")
+        network.store_to_disk(network_path)
+        pickle_path = Path(tmp_dir, 'network.pickle')
+        with open(pickle_path, 'wb') as outfile:
+            nodes, edges = network.to_nodes_and_edges()
+            pickle.dump({'nodes': nodes, 'edges': edges}, outfile)
+
+        start = time.time()
+        with open(pickle_path, 'rb') as infile:
+            pickle.load(infile)
+        print(f"{'pickle':>23}: {time.time() - start:.3f}s")
+        start = time.time()
+        loaded_network = DocumentNetwork.load_from_disk(network_path, people_db)
+        print(f"{'npz':>23}: {time.time() - start:.3f}s")
+        start = time.time()
+        loaded_network.to_nodes_and_edges()
+        print(f"{'to_nodes_and_edges':>23}: {time.time() - start:.3f}s")
+        print(f"{len(network)} people, {len(edges)} edges, {len(network.doc_ids)} docs")
+
+
+def benchmark_parse_cache(min_count=1):
+    """
+    Compares adding the names of tobacco_names_raw_test.json that appear at least min_count
+    times to a people db (like merge_names_from_json_file) without a parse cache, with an empty
+    cache, and with a cache stored by a previous run.
+    :param min_count: int
+    :return: None
+    """
+    name_dict = load_raw_test_names(min_count)
+
+    def add_names(parse_cache):
+        people_db = PeopleDatabase()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name, count in name_dict.items():
+                try:
+                    parsed_name = None if parse_cache is None else parse_cache.parse(name, count)
+                    people_db.add_person_raw(name_raw=name, count=count, parsed_name=parsed_name)
+                except IndexError:      # names that can't be parsed
+                    pass
+        return people_db
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir, 'parse_cache.pickle')
+        people_data = []
+        for label in ['no cache', 'empty cache', 'stored cache']:
+            start = time.time()
+            parse_cache = None if label == 'no cache' else ParseCache(file_path)
+            people_db = add_names(parse_cache)
+            message = f"{label:>12}: {time.time() - start:.2f}s for {len(name_dict)} names"
+            if parse_cache is not None:
+                message += f", {parse_cache.report()}"
+                parse_cache.store()
+            print(message)
+            people_data.append(sorted((person.last, person.first, person.middle,
+                                       sorted(person.positions.items()))
+                                      for person in people_db.people))
+        print("Same people:", people_data[0] == people_data[1] == people_data[2])
+
+
+def benchmark_incremental_ingestion(n_docs=20000, n_new_docs=200, min_count=3):
+    """
+    Compares adding n_new_docs synthetic documents (see create_test_docs) to the people db and
+    network of n_docs documents with ingest_documents and rebuilding both from all documents,
+    the way load_network_of_1970s does when the docs csv has changed.
+    The paths of network_generation.py get pointed to a temporary directory.
+    :param n_docs: int
+    :param n_new_docs: int
+    :param min_count: int
+    :return: None
+    """
+    docs = create_test_docs(n_docs + n_new_docs, min_count)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label in ['full rebuild', 'incremental']:
+            label_dir = Path(tmp_dir, label.replace(' ', '_'))
+            label_dir.mkdir()
+            paths = {'DOCS_CSV_PATH': label_dir / 'docs.csv',
+                     'PEOPLE_DB_PATH': label_dir / 'people_db.npz',
+                     'NETWORK_CACHE_DIR': label_dir / 'cache'}
+            with mock.patch.multiple(network_generation, **paths), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                if label == 'full rebuild':
+                    docs.to_csv(paths['DOCS_CSV_PATH'])
+                    start = time.time()
+                    people_db, network = network_generation.load_network_of_1970s()
+                else:
+                    docs[:n_docs].to_csv(paths['DOCS_CSV_PATH'])
+                    network_generation.load_network_of_1970s()
+                    start = time.time()
+                    people_db, network = network_generation.ingest_documents(docs[n_docs:])
+                elapsed = time.time() - start
+                # the next load finds the people db and network in the cache
+                network_generation.load_network_of_1970s()
+                results[label] = (len(people_db), network.edge_matrix.nnz,
+                                  int(network.edge_matrix.sum()))
+            print(f"{label:>12}: {elapsed:.2f}s")
+        print(f"{n_docs} + {n_new_docs} docs. people, edges, total edge weight:")
+        for label, result in results.items():
+            print(f"{label:>12}: {result}")
+
+
+def benchmark_batch_networks(n_docs=20000, n_networks=24, max_workers=4, min_count=3):  # pylint: disable=R0914
+    """
+    Compares generating n_networks ego networks (200 nodes, 2nd degree connections, 3 center
+    people each) of n_docs synthetic documents (see create_test_docs) one by one with
+    generate_people_network and at once with generate_people_networks, with and without a
+    process pool. The people db and network are cached before timing.
+    :param n_docs: int
+    :param n_networks: int
+    :param max_workers: int
+    :param min_count: int
+    :return: None
+    """
+    docs = create_test_docs(n_docs, min_count)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {'DOCS_CSV_PATH': Path(tmp_dir, 'docs.csv'),
+                 'PEOPLE_DB_PATH': Path(tmp_dir, 'people_db.npz'),
+                 'NETWORK_CACHE_DIR': Path(tmp_dir, 'cache')}
+        docs.to_csv(paths['DOCS_CSV_PATH'])
+        stored = {}
+
+        def store_network(nodes, edges, network_name, **_):
+            stored[network_name] = (nodes, edges)
+
+        with mock.patch.multiple(network_generation, store_network_for_visualization=store_network,
+                                 **paths), \
+                contextlib.redirect_stdout(io.StringIO()):
+            people_db, _ = network_generation.load_network_of_1970s()
+            authors = Counter(name.strip() for cell in docs['au'] for name in cell.split(';')
+                              if name.strip())
+            names = [name for name, _ in authors.most_common()
+                     if people_db.get_person_from_alias(name)][:3 * n_networks]
+            specs = [{'names': names[idx::n_networks], 'network_name': f'network_{idx}',
+                      'max_number_of_nodes': 200, 'include_2nd_degree_connections': True,
+                      'manual_merge': False} for idx in range(n_networks)]
+
+            results = {}
+            for label in ['one by one', 'batch', f'batch, {max_workers} workers']:
+                stored.clear()
+                start = time.time()
+                if label == 'one by one':
+                    for spec in specs:
+                        network_generation.generate_people_network(**spec)
+                else:
+                    network_generation.generate_people_networks(
+                        specs, max_workers=None if label == 'batch' else max_workers)
+                results[label] = (time.time() - start, dict(stored))
+
+    for label, (elapsed, _) in results.items():
+        print(f"{label:>18}: {elapsed:.2f}s for {n_networks} networks")
+    print("Same networks:", len({json.dumps(networks, sort_keys=True)
+                                 for _, networks in results.values()}) == 1)
+
+
+def scan_possible_matches(name, people, k=5):
+    """
+    Candidate search without an index: computes the trigram similarity of the name with every
+    alias and full name of every person
+    :param name: str
+    :param people: list of Person
+    :param k: int
+    :return: list of (Person, float) tuples
+    """
+    query = name_trigrams(normalize_name(name))
+    similarities = []
+    for person in people:
+        best = 0.0
+        for alias in list(person.aliases) + [person.full_name]:
+            trigrams = name_trigrams(normalize_name(alias))
+            if trigrams:
+                best = max(best, len(query & trigrams) / len(query | trigrams))
+        if best >= 0.1:
+            similarities.append((person, best))
+    similarities.sort(key=lambda result: (-result[1], -result[0].count))
+    return similarities[:k]
+
+
+def benchmark_candidate_search(n_queries=200, min_count=1, seed=0):     # pylint: disable=R0914
+    """
+    Times the candidate search of search_possible_matches on the people of
+    tobacco_names_raw_test.json (at least min_count occurrences) for n_queries aliases with one
+    deleted character. Compares the trigram index with a scan over all aliases and reports how
+    often the person of the original alias is among the top 5 candidates.
+    :param n_queries: int
+    :param min_count: int
+    :param seed: int
+    :return: None
+    """
+    people_db = create_test_people_db(load_raw_test_names(min_count))
+    people = list(people_db.people)
+    rng = random.Random(seed)
+    queries = []
+    for person in rng.sample(people, n_queries):
+        alias = rng.choice(sorted(person.aliases))
+        idx = rng.randrange(len(alias))
+        queries.append((alias[:idx] + alias[idx + 1:], person))
+
+    start = time.time()
+    candidate_search = CandidateSearch(people)
+    print(f"  index build: {time.time() - start:.2f}s for {len(people)} people, "
+          f"{len(candidate_search.names)} names")
+
+    results = {}
+    for label, search in [('trigram index', lambda name: candidate_search.search(name, k=5)),
+                          ('alias scan', lambda name: scan_possible_matches(name, people))]:
+        label_queries = queries if label == 'trigram index' else queries[:10]
+        start = time.time()
+        results[label] = [search(query) for query, _ in label_queries]
+        elapsed = time.time() - start
+        found = sum(person in [match for match, _ in matches]
+                    for (_, person), matches in zip(label_queries, results[label]))
+        print(f"{label:>13}: {1000 * elapsed / len(label_queries):.1f}ms per query, "
+              f"original person in the top 5 for {found}/{len(label_queries)} queries")
+    print("Same similarities:", all(
+        [round(similarity, 9) for _, similarity in index_matches] ==
+        [round(similarity, 9) for _, similarity in scan_matches]
+        for index_matches, scan_matches in zip(results['trigram index'], results['alias scan'])))
+
+
+def benchmark_network_payloads(repeats=20):
+    """
+    Reports the size and the time to decompress and parse every version of the network files in
+    backend/data: the pretty printed file, its gzip compressed version (what compressing the
+    response on the fly would give), the compact file, and the gzip and brotli compressed copies
+    of the compact file that get_network_data serves with ?format=compact
+    :param repeats: int, the parse times are the minimum of repeats runs
+    :return: None
+    """
+    decompress = {'': lambda payload: payload, '.gz': gzip.decompress,
+                  '.br': brotli.decompress}
+    for json_path in sorted(BACKEND_DATA_PATH.glob('person_*.json')):
+        if json_path.name.endswith(COMPACT_SUFFIX):
+            continue
+        compact_path = compact_network_path(json_path)
+        payloads = {
+            'pretty': (json_path.read_bytes(), ''),
+            'pretty.gz': (gzip.compress(json_path.read_bytes()), '.gz'),
+            'compact': (compact_path.read_bytes(), ''),
+            'compact.gz': (Path(f'{compact_path}.gz').read_bytes(), '.gz'),
+            'compact.br': (Path(f'{compact_path}.br').read_bytes(), '.br'),
+        }
+        print(json_path.name)
+        for label, (payload, suffix) in payloads.items():
+            parse_times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                json.loads(decompress[suffix](payload))
+                parse_times.append(time.perf_counter() - start)
+            print(f"  {label:>10}: {len(payload) / 1024:6.1f} KB, "
+                  f"decompress + parse {1000 * min(parse_times):.2f}ms")
+
+
+BENCHMARKS = {
+    'org_matcher': benchmark_org_matcher,
+    'merge_engines': benchmark_merge_engines,
+    'parallel_merge': benchmark_parallel_merge,
+    'person_hashing': benchmark_person_hashing,
+    'person_memory': benchmark_person_memory,
+    'people_db_format': benchmark_people_db_format,
+    'alias_lookup': benchmark_alias_lookup,
+    'parse_cache': benchmark_parse_cache,
+    'streaming_memory': benchmark_streaming_memory,
+    'network_cache': benchmark_network_cache,
+    'incremental_ingestion': benchmark_incremental_ingestion,
+    'batch_networks': benchmark_batch_networks,
+    'candidate_search': benchmark_candidate_search,
+    'network_payloads': benchmark_network_payloads,
+}
+
+
+if __name__ == '__main__':
+
+    for benchmark_name in sys.argv[1:] or BENCHMARKS:
+        print(f'\n{benchmark_name}')
+        BENCHMARKS[benchmark_name]()
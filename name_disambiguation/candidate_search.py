@@ -0,0 +1,165 @@
+"""
+Fuzzy search for the people of a people db that could be meant by a (misspelled or differently
+formatted) name, e.g. for the "possible candidates" hint of generate_people_network.
+
+CandidateSearch indexes the normalized aliases and full names of all people in a trigram
+inverted index. Names get lower cased, split into words at everything that isn't a letter or
+digit, and the words get sorted, so 'DUNN,WL', 'Dunn, W.L.', and 'WL Dunn' have the same
+trigrams. Every word gets padded with two spaces in front and one at the end (like the pg_trgm
+extension of postgres), so short words like initials still have trigrams.
+The similarity of two names is the Jaccard similarity of their trigram sets.
+
+>>> candidate_search = CandidateSearch(people_db.people)      # doctest: +SKIP
+>>> candidate_search.search('Dun, William', k=5)              # doctest: +SKIP
+[(Person(...), 0.62), ...]
+"""
+
+import re
+import unittest
+from collections import defaultdict
+
+import numpy as np
+
+from name_disambiguation.person import Person
+
+_NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_name(name):
+    """
+    Lower cases a name and sorts its words
+
+    >>> normalize_name('Dunn, W.L. (Philip Morris)')
+    'dunn l morris philip w'
+
+    :param name: str
+    :return: str
+    """
+    return ' '.join(sorted(_NON_ALPHANUMERIC.sub(' ', name.lower()).split()))
+
+
+def name_trigrams(name):
+    """
+    Returns the set of trigrams of the padded words of a normalized name
+
+    >>> sorted(name_trigrams('wl'))
+    ['  w', ' wl', 'wl ']
+
+    :param name: str, normalized name
+    :return: set of str
+    """
+    trigrams = set()
+    for word in name.split():
+        padded = f'  {word} '
+        trigrams.update(padded[idx:idx + 3] for idx in range(len(padded) - 2))
+    return trigrams
+
+
+class CandidateSearch:
+    """
+    Trigram index of the aliases and full names of a group of people
+    Attributes:
+        people (list of Person): index -> person
+        names (list of str): normalized names; name_people[i] is the index of the person of
+                             names[i]
+    """
+
+    def __init__(self, people):
+        """
+        Indexes the normalized aliases and full names of people
+        :param people: iterable of Person
+        """
+        self.people = list(people)
+        # every normalized name once per person
+        entries = dict.fromkeys(
+            (normalize_name(name), person_idx) for person_idx, person in enumerate(self.people)
+            for name in list(person.aliases) + [person.full_name])
+        entries = [(name, person_idx) for name, person_idx in entries if name]
+
+        self.names = [name for name, _ in entries]
+        self.name_people = np.array([person_idx for _, person_idx in entries], dtype=np.int64)
+        self._name_sizes = np.empty(len(self.names), dtype=np.int64)
+        postings = defaultdict(list)
+        for name_idx, name in enumerate(self.names):
+            trigrams = name_trigrams(name)
+            self._name_sizes[name_idx] = len(trigrams)
+            for trigram in trigrams:
+                postings[trigram].append(name_idx)
+        self._postings = {trigram: np.array(name_idxs, dtype=np.int64)
+                          for trigram, name_idxs in postings.items()}
+        self._counts = np.array([person.count for person in self.people], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.people)
+
+    def search(self, name, k=10, min_similarity=0.1):
+        """
+        Returns the k people with the most similar alias or full name, ranked by similarity
+        and, for equally similar people, by count
+
+        :param name: str
+        :param k: int
+        :param min_similarity: float, people below this similarity don't get returned
+        :return: list of (Person, float) tuples (person, similarity)
+        """
+        query = name_trigrams(normalize_name(name))
+        matching_postings = [self._postings[trigram] for trigram in query
+                             if trigram in self._postings]
+        if not matching_postings:
+            return []
+
+        # number of shared trigrams of every name with the query
+        overlaps = np.bincount(np.concatenate(matching_postings), minlength=len(self.names))
+        name_idxs = np.flatnonzero(overlaps)
+        similarities = overlaps[name_idxs] / (len(query) + self._name_sizes[name_idxs] -
+                                              overlaps[name_idxs])
+
+        # best similarity of every person
+        person_similarities = np.zeros(len(self.people))
+        np.maximum.at(person_similarities, self.name_people[name_idxs], similarities)
+        person_idxs = np.flatnonzero(person_similarities >= max(min_similarity, 1e-12))
+        order = np.lexsort((-self._counts[person_idxs], -person_similarities[person_idxs]))
+        return [(self.people[person_idx], float(person_similarities[person_idx]))
+                for person_idx in person_idxs[order[:k]].tolist()]
+
+
+class TestCandidateSearch(unittest.TestCase):
+    """
+    Tests the ranking of the candidate search
+    """
+
+    def setUp(self):
+        self.people = {name: Person(name_raw=name, count=count) for name, count in [
+            ('Dunn, William L', 10), ('DUNN,WL', 3), ('Dunne, Frank', 1), ('Teague, CE', 5),
+            ('Teague, C', 7), ('TEAGUE,C', 2), ('Risi, Stephan', 1)]}
+        self.candidate_search = CandidateSearch(self.people.values())
+
+    def test_search(self):
+        """
+        Misspelled and reordered names find the right people
+        """
+        for query, expected in [('William Dunn', 'Dunn, William L'),
+                                ('Dunn, Wiliam L.', 'Dunn, William L'),
+                                ('WL DUNN', 'DUNN,WL'),
+                                ('Stefan Risi', 'Risi, Stephan')]:
+            person, similarity = self.candidate_search.search(query, k=1)[0]
+            self.assertIs(person, self.people[expected])
+            self.assertTrue(0 < similarity <= 1)
+        self.assertEqual(self.candidate_search.search('DUNN,WL', k=1)[0][1], 1.0)
+        self.assertEqual(self.candidate_search.search('Xyz'), [])
+
+    def test_ranking(self):
+        """
+        Results are sorted by similarity and equally similar people by count
+        """
+        results = self.candidate_search.search('Teague', k=3)
+        self.assertEqual([person for person, _ in results],
+                         [self.people['Teague, C'], self.people['TEAGUE,C'],
+                          self.people['Teague, CE']])
+        similarities = [similarity for _, similarity in results]
+        self.assertEqual(similarities, sorted(similarities, reverse=True))
+        self.assertEqual(len(self.candidate_search.search('Dunn', k=2)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
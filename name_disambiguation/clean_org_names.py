@@ -1,13 +1,20 @@
 """
 Contains helper function to get RAW_ORG_TO_CLEAN_ORG_DICT (convert raw org names to clean names)
+and RAW_ORG_MATCHER (finds the raw org names that occur in a name string in one scan)
 """
 from pathlib import Path
 import json
+import re
+import unittest
+from collections import deque
 from name_disambiguation.config import DATA_PATH
 
 
-def get_clean_org_names(file_name=Path(DATA_PATH, 'name_disambiguation',
-                                       'clean_org_names_to_raw_org_names.json')):
+CLEAN_ORG_NAMES_PATH = Path(DATA_PATH, 'name_disambiguation',
+                            'clean_org_names_to_raw_org_names.json')
+
+
+def get_clean_org_names(file_name=CLEAN_ORG_NAMES_PATH):
     """
     Create dict that maps raw organization names to clean organization names
     by inverting a dict that maps clean names to raw names
@@ -31,4 +38,139 @@ def get_clean_org_names(file_name=Path(DATA_PATH, 'name_disambiguation',
 
     return inv_name_dict
 
+
+class OrgNameMatcher:
+    """
+    Finds the raw org names of a raw org -> clean org dict that occur in a name string.
+
+    Every raw org is used as a regex pattern r'\\b' + raw_org + r'\\b' (the dict contains
+    entries like 'R.J. REYNOLDS' whose periods have always been treated as wildcards).
+    Instead of running one regex per dict entry on every name, the matcher builds an Aho-Corasick
+    automaton over the longest run of word characters of every raw org. Such a run is matched
+    literally by the pattern, so a raw org can only occur in a name if its run does. One scan
+    over the name returns these candidates, which are then verified with their precompiled
+    patterns.
+
+    Attributes:
+        entries (list of tuples): (raw_org, clean_org, compiled pattern), in dict order
+    """
+    # raw orgs containing these characters are not literal enough for the automaton and always
+    # get checked with their pattern
+    _REGEX_METACHARACTERS = re.compile(r'[\\\[\]{}*+?|^$]')
+
+    def __init__(self, raw_org_to_clean_org_dict):
+        """
+        Builds the automaton for all raw orgs of raw_org_to_clean_org_dict
+        :param raw_org_to_clean_org_dict: dict, maps raw organization names to clean names
+        """
+        self.entries = []
+        self._always_check = set()
+
+        # automaton: goto transitions, failure links, and entry indices found at every state
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [set()]
+
+        for entry_idx, (raw_org, clean_org) in enumerate(raw_org_to_clean_org_dict.items()):
+            self.entries.append((raw_org, clean_org, re.compile(r'\b' + raw_org + r'\b')))
+
+            literal_runs = re.findall(r'\w+', raw_org)
+            if not literal_runs or self._REGEX_METACHARACTERS.search(raw_org):
+                self._always_check.add(entry_idx)
+            else:
+                self._add_literal(max(literal_runs, key=len), entry_idx)
+
+        self._build_failure_links()
+
+    def _add_literal(self, literal, entry_idx):
+        """
+        Adds a literal to the trie of the automaton
+        :param literal: str
+        :param entry_idx: int, index of the entry the literal belongs to
+        :return: None
+        """
+        state = 0
+        for char in literal:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._output[state].add(entry_idx)
+
+    def _build_failure_links(self):
+        """
+        Adds the failure links to the trie (breadth first) and merges the outputs of each state
+        with the outputs of its failure state
+        :return: None
+        """
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def find_candidates(self, name_raw):
+        """
+        Returns the indices of all entries that could occur in name_raw, i.e. whose literal
+        occurs in name_raw. Entries whose pattern doesn't occur in name_raw are never dropped
+        but some candidates may not match (e.g. 'PM' occurs in 'PMX'), so verify them with their
+        pattern.
+
+        >>> matcher = OrgNameMatcher({'PM': 'Philip Morris', 'B&W': 'Brown & Williamson'})
+        >>> sorted(matcher.find_candidates('TEMKO PM, B&W'))
+        [0, 1]
+
+        :param name_raw: str
+        :return: set of int (indices into entries)
+        """
+        candidates = set(self._always_check)
+        state = 0
+        for char in name_raw:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._output[state]:
+                candidates |= self._output[state]
+        return candidates
+
+
 RAW_ORG_TO_CLEAN_ORG_DICT = get_clean_org_names()
+RAW_ORG_MATCHER = OrgNameMatcher(RAW_ORG_TO_CLEAN_ORG_DICT)
+
+
+class TestOrgNameMatcher(unittest.TestCase):
+    """
+    Tests that the OrgNameMatcher finds all raw orgs whose pattern occurs in a name
+    """
+
+    def test_candidates_include_matches(self):
+        """
+        Every raw org whose pattern occurs in a name has to be a candidate
+        """
+        for name_raw in ['TEMKO SL, COVINGTON AND BURLING', 'D Cantrell, B&W', 'TEMKO PM, UNK',
+                         'ROEMER HC, R.J. REYNOLDS', 'HOLTZMAN A, PHILIP MORRIS INC']:
+            candidates = RAW_ORG_MATCHER.find_candidates(name_raw)
+            for entry_idx, (_, _, pattern) in enumerate(RAW_ORG_MATCHER.entries):
+                if pattern.search(name_raw):
+                    self.assertIn(entry_idx, candidates)
+
+    def test_overlapping_literals(self):
+        """
+        Literals that overlap or are contained in each other all get found
+        """
+        matcher = OrgNameMatcher({'HOUSE': 'a', 'US HOUSE': 'b', 'HOUSES': 'c', 'USE': 'd',
+                                  'R.J. REYNOLDS': 'e'})
+        self.assertEqual(matcher.find_candidates('US HOUSES'), {0, 1, 2, 3})
+        self.assertEqual(matcher.find_candidates('RJ REYNOLDS'), {4})
+        self.assertEqual(matcher.find_candidates('DUNN WL'), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
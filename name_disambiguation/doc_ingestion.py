@@ -0,0 +1,345 @@
+"""
+Columnar ingestion of document csvs like docs_1970s_all.csv.
+
+Instead of parsing the person and organization columns of every row (and every name in them)
+again and again, IngestedDocuments splits all columns at once with pandas string operations,
+parses every unique raw name exactly once, and then hands out the names and organizations of
+each document by its doc id (the row index of the csv).
+
+The per-document results are the same as those of parse_authors_or_recipients_of_doc and
+parse_au_or_rc_organizations_of_doc in network_generation.py.
+
+Large csvs get read with read_docs_in_chunks, which only loads the columns that the parsing
+needs (DOC_COLUMNS) and yields them in chunks, so memory doesn't grow with the size of the csv.
+"""
+
+import re
+import shutil
+import tempfile
+import unittest
+from collections import defaultdict
+from pathlib import Path
+
+import pandas as pd
+
+from name_disambiguation.clean_org_names import RAW_ORG_TO_CLEAN_ORG_DICT
+from name_disambiguation.parse_cache import ParseCache, get_parse_cache
+
+# general column, person column, and organization column of authors and recipients
+SIDE_COLUMNS = {
+    'authors': ('au', 'au_person', 'au_org'),
+    'recipients': ('rc', 'rc_person', 'rc_org'),
+}
+
+# the columns of a document csv needed to find its people and organizations
+DOC_COLUMNS = ('au', 'au_person', 'au_org', 'rc', 'rc_person', 'rc_org', 'tid')
+
+# names that don't parse into a valid person but look like this are organizations
+# (see check_if_name_looks_like_an_organization in network_generation.py)
+ORGANIZATION_NAME_PATTERN = '^[a-zA-Z]+ [a-zA-Z]+ [a-zA-Z ]+$'
+
+
+def explode_names(column, separators=(';', '|')):
+    """
+    Vectorized parse_column_person: splits every cell of column by the separators and returns
+    one row per name, indexed by the doc id of the cell. Names keep their order within a cell.
+
+    >>> explode_names(pd.Series(['Dunn, WL; Teague CE|X', '', 'Risi, S'])).tolist()
+    ['Dunn, WL', 'Teague CE', 'X', 'Risi, S']
+
+    :param column: pd.Series of str
+    :param separators: tuple of str
+    :return: pd.Series of str
+    """
+    names = column.astype(str)
+    for separator in separators:
+        names = names.str.split(separator, regex=False).explode().str.strip()
+    lengths = names.str.len()
+    return names[(lengths > 0) & (lengths < 100)]
+
+
+def read_docs_in_chunks(file_path, chunk_size=10000, columns=DOC_COLUMNS):
+    """
+    Reads a document csv in chunks of chunk_size documents, loading only the given columns
+    (columns that the csv doesn't have get skipped). Empty cells are ''.
+    The doc ids (index) of the chunks are the row numbers in the whole csv, like for
+    pd.read_csv(file_path).
+
+    :param file_path: Path
+    :param chunk_size: int
+    :param columns: iterable of str
+    :return: generator of pd.DataFrame
+    """
+    columns = set(columns)
+    with pd.read_csv(file_path, usecols=lambda column: column in columns, dtype=str,
+                     chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield chunk.fillna('')
+
+
+def ingest_docs_in_chunks(file_path, chunk_size=10000, parse_cache=None):
+    """
+    Reads a document csv with read_docs_in_chunks and yields the IngestedDocuments of every
+    chunk. All chunks share the parse cache, so every raw name only gets parsed once.
+
+    :param file_path: Path
+    :param chunk_size: int
+    :param parse_cache: ParseCache, defaults to the shared cache of get_parse_cache()
+    :return: generator of IngestedDocuments
+    """
+    if parse_cache is None:
+        parse_cache = get_parse_cache()
+    for chunk in read_docs_in_chunks(file_path, chunk_size):
+        yield IngestedDocuments(chunk, parse_cache)
+
+
+def append_docs_to_csv(file_path, docs):
+    """
+    Appends documents to a document csv. The columns get ordered like the header of the csv
+    (columns that the csv doesn't have get dropped, missing ones stay empty). If the csv starts
+    with an unnamed index column, it gets the index of docs.
+    The doc ids of the appended documents are the row numbers in the csv, so the index of docs
+    should continue the row numbers of the csv.
+
+    :param file_path: Path
+    :param docs: pd.DataFrame
+    :return:
+    """
+    header = pd.read_csv(file_path, nrows=0).columns
+    rows = docs.reindex(columns=header)
+    if header[0].startswith('Unnamed'):
+        rows[header[0]] = docs.index
+
+    with open(file_path, 'rb+') as csv_file:
+        csv_file.seek(-1, 2)
+        if csv_file.read(1) != b'\n':
+            csv_file.write(b'\n')
+    rows.to_csv(file_path, mode='a', header=False, index=False)
+
+
+def parse_name(name, parse_cache):
+    """
+    Parses a raw name from a person column once and classifies it like
+    parse_authors_or_recipients_of_doc:
+    'valid' (a person), 'organization', 'invalid', or 'error' (couldn't be parsed)
+
+    :param name: str
+    :param parse_cache: ParseCache
+    :return: str (category), tuple (Person.parse_raw_name(name, 1) for valid people, else None)
+    """
+    try:
+        if parse_cache.looks_valid(name):
+            return 'valid', parse_cache.parse(name, 1)
+    except:     # pylint: disable=W0702
+        return 'error', None
+    if re.match(ORGANIZATION_NAME_PATTERN, name):
+        return 'organization', None
+    return 'invalid', None
+
+
+class IngestedDocuments:
+    """
+    The authors, recipients, and organizations of a DataFrame of documents
+    Attributes:
+        doc_ids (list): row indexes of the documents, in csv order
+        tids (dict): doc id -> tid of the document ('' if the DataFrame has no tid column)
+        names (dict): side ('authors' or 'recipients') -> doc id -> list of raw names of the
+                      general and the person column
+        organizations (dict): side -> doc id -> list of raw names of the organization column
+                              (empty if it only repeats the general or the person column)
+        parsed_names (dict): raw name -> (category, parsed name), see parse_name
+        organization_looks_valid (dict): raw organization name -> bool
+    """
+
+    def __init__(self, df, parse_cache=None):      # pylint: disable=C0103,R0914
+        """
+        Splits and parses the person and organization columns of all documents
+        :param df: pd.DataFrame with au, au_person, au_org, rc, rc_person, and rc_org columns
+        :param parse_cache: ParseCache, defaults to the shared cache of get_parse_cache()
+        """
+        if parse_cache is None:
+            parse_cache = get_parse_cache()
+        df = df.fillna('')      # pylint: disable=C0103
+
+        def without_spaces(column):
+            return df[column].astype(str).str.replace(' ', '', regex=False)
+
+        self.doc_ids = df.index.tolist()
+        self.tids = dict(zip(self.doc_ids, df['tid'].tolist() if 'tid' in df else
+                             [''] * len(df)))
+        self.names = {}
+        self.organizations = {}
+        organization_names = []
+
+        for side, (general_column, person_column, org_column) in SIDE_COLUMNS.items():
+            names = defaultdict(list)
+            for column in [general_column, person_column]:
+                exploded = explode_names(df[column])
+                for doc_id, name in zip(exploded.index.tolist(), exploded.tolist()):
+                    names[doc_id].append(name)
+            self.names[side] = names
+
+            # many person/org combinations only differ in terms of spaces. those orgs get skipped
+            repeats_people = (
+                (without_spaces(org_column) == without_spaces(general_column)) |
+                (without_spaces(org_column) == without_spaces(person_column))
+            )
+            exploded = explode_names(df.loc[~repeats_people, org_column])
+            organizations = defaultdict(list)
+            for doc_id, org in zip(exploded.index.tolist(), exploded.tolist()):
+                organizations[doc_id].append(org)
+            self.organizations[side] = organizations
+            organization_names.append(exploded)
+
+        unique_orgs = pd.concat(organization_names).drop_duplicates()
+        self.organization_looks_valid = dict(zip(
+            unique_orgs.tolist(), unique_orgs.str.match(ORGANIZATION_NAME_PATTERN).tolist()))
+
+        # names in the org dict or with less than 4 characters never get parsed as people
+        unique_names = {name for side_names in self.names.values()
+                        for doc_names in side_names.values() for name in doc_names
+                        if len(name) >= 4 and name not in RAW_ORG_TO_CLEAN_ORG_DICT}
+        self.parsed_names = {name: parse_name(name, parse_cache) for name in sorted(unique_names)}
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def get_people_and_organizations(self, side, doc_id, counters, people_db):
+        """
+        Returns the people (raw names) and organizations of the general and the person column of
+        one side of a document, like parse_authors_or_recipients_of_doc.
+        people_db.raw_org_to_clean_org_dict grows while people get added, so it is checked here
+        and not during parsing.
+
+        :param side: str, 'authors' or 'recipients'
+        :param doc_id: int
+        :param counters: dict of Counters, see create_people_db_from_docs
+        :param people_db: PeopleDatabase
+        :return: list of str (raw names of people), list of str (organizations)
+        """
+        doc_people = []
+        doc_organizations = []
+        for name in self.names[side].get(doc_id, []):
+            if name in people_db.raw_org_to_clean_org_dict:
+                doc_organizations.append(people_db.raw_org_to_clean_org_dict[name])
+                continue
+            # 4 characters is too short for a name and we have already extracted orgs
+            if len(name) < 4:
+                continue
+
+            category, _ = self.parsed_names[name]
+            if category == 'valid':
+                doc_people.append(name)
+                counters['valid'][name] += 1
+            elif category == 'organization':
+                doc_organizations.append(name)
+                counters['organization_from_person'][name] += 1
+            else:
+                counters[category][name] += 1
+
+        return doc_people, doc_organizations
+
+    def get_organizations(self, side, doc_id, counters, people_db):
+        """
+        Returns the organizations of the organization column of one side of a document, like
+        parse_au_or_rc_organizations_of_doc
+
+        :param side: str, 'authors' or 'recipients'
+        :param doc_id: int
+        :param counters: dict of Counters, see create_people_db_from_docs
+        :param people_db: PeopleDatabase
+        :return: list of str
+        """
+        organizations = []
+        for org in self.organizations[side].get(doc_id, []):
+            if org in people_db.raw_org_to_clean_org_dict:
+                organizations.append(people_db.raw_org_to_clean_org_dict[org])
+            elif self.organization_looks_valid[org]:
+                organizations.append(org)
+                counters['organization_from_org'][org] += 1
+            else:
+                counters['organization_invalid'][org] += 1
+        return organizations
+
+
+class TestIngestedDocuments(unittest.TestCase):
+    """
+    Tests that the columnar ingestion finds the same people and organizations as the
+    row by row parsing of network_generation.py
+    """
+
+    def test_same_as_row_parsing(self):
+        """
+        ibid.
+        """
+        # imported here because network_generation imports this module
+        from name_disambiguation.config import DATA_PATH                      # pylint: disable=C0415
+        from name_disambiguation.network_generation import (                  # pylint: disable=C0415
+            parse_au_or_rc_organizations_of_doc, parse_authors_or_recipients_of_doc)
+        from name_disambiguation.people_db import PeopleDatabase              # pylint: disable=C0415
+
+        df = pd.read_csv(DATA_PATH / 'django' / 'test_import_docs.csv').fillna('')  # pylint: disable=C0103
+        ingested_docs = IngestedDocuments(df, ParseCache())
+        people_db = PeopleDatabase()
+        counters = defaultdict(lambda: defaultdict(int))
+        for doc_id, doc in df.iterrows():
+            for side in SIDE_COLUMNS:
+                self.assertEqual(
+                    ingested_docs.get_people_and_organizations(side, doc_id, counters, people_db),
+                    parse_authors_or_recipients_of_doc(side, doc, counters, people_db))
+                self.assertEqual(
+                    ingested_docs.get_organizations(side, doc_id, counters, people_db),
+                    parse_au_or_rc_organizations_of_doc(side, doc, counters, people_db))
+
+    def test_chunks(self):
+        """
+        Reading a csv in chunks gives the same doc ids, names, and organizations as reading it
+        at once
+        """
+        from name_disambiguation.config import DATA_PATH                      # pylint: disable=C0415
+
+        file_path = DATA_PATH / 'django' / 'test_import_docs.csv'
+        parse_cache = ParseCache()
+        ingested_docs = IngestedDocuments(pd.read_csv(file_path), parse_cache)
+        chunks = list(ingest_docs_in_chunks(file_path, chunk_size=1, parse_cache=parse_cache))
+        self.assertEqual(len(chunks), len(ingested_docs))
+        self.assertEqual([doc_id for chunk in chunks for doc_id in chunk.doc_ids],
+                         ingested_docs.doc_ids)
+        for chunk in chunks:
+            self.assertEqual(list(chunk.tids.values()),
+                             [ingested_docs.tids[doc_id] for doc_id in chunk.doc_ids])
+            for side in SIDE_COLUMNS:
+                self.assertEqual(dict(chunk.names[side]),
+                                 {doc_id: ingested_docs.names[side][doc_id]
+                                  for doc_id in chunk.doc_ids
+                                  if doc_id in ingested_docs.names[side]})
+                self.assertEqual(dict(chunk.organizations[side]),
+                                 {doc_id: ingested_docs.organizations[side][doc_id]
+                                  for doc_id in chunk.doc_ids
+                                  if doc_id in ingested_docs.organizations[side]})
+
+    def test_append_docs_to_csv(self):
+        """
+        Appended documents get read back with the next row numbers as doc ids
+        """
+        from name_disambiguation.config import DATA_PATH                      # pylint: disable=C0415
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = Path(tmp_dir, 'docs.csv')
+            shutil.copy(DATA_PATH / 'django' / 'test_import_docs.csv', file_path)
+            docs_count = len(pd.read_csv(file_path))
+            new_docs = pd.DataFrame([{'rc': 'Dunn, WL', 'au': 'Risi, S', 'tid': 'new1',
+                                      'not_a_column': 'x'}], index=[docs_count])
+            append_docs_to_csv(file_path, new_docs)
+
+            df = pd.read_csv(file_path).fillna('')      # pylint: disable=C0103
+            self.assertEqual(len(df), docs_count + 1)
+            new_row = df.loc[docs_count, ['Unnamed: 0', 'au', 'rc', 'tid', 'au_org']]
+            self.assertEqual(new_row.tolist(), [docs_count, 'Risi, S', 'Dunn, WL', 'new1', ''])
+            last_chunk = list(ingest_docs_in_chunks(file_path, parse_cache=ParseCache()))[-1]
+            self.assertEqual(last_chunk.doc_ids[-1], docs_count)
+            self.assertEqual(last_chunk.names['authors'][docs_count], ['Risi, S'])
+
+
+if __name__ == '__main__':
+    unittest.main()
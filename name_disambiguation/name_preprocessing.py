@@ -1,6 +1,6 @@
 """
 Contains helper functions:
-Create and pickles a People Database from CSV
+Create and store a People Database from CSV
 Extract author and recipient aliases from CSV with documents info
 Involve taking the documents (originally from CSV) and extract authors, organizations,
 and recipients
@@ -12,15 +12,16 @@ import unittest
 
 import pandas as pd
 
+from name_disambiguation.parse_cache import get_parse_cache
 from name_disambiguation.people_db import PeopleDatabase
 
 
-def merge_names_from_json_file(json_name_file, people_db_pickle_file):
+def merge_names_from_json_file(json_name_file, people_db_file):
     """
     Creates a people db from reading json file (dict of raw names and counts) and merges people
-    in it. Stores people db in a pickle file
+    in it. Stores people db with store_to_disk
     :param json_name_file: Path to json file
-    :param people_db_pickle_file: Path for output pickle file of the created PeopleDB
+    :param people_db_file: Path for output file (.npz) of the created PeopleDB
     :return:
     """
 
@@ -30,18 +31,22 @@ def merge_names_from_json_file(json_name_file, people_db_pickle_file):
     initial_time = time.time()
 
     # add everyone to a PeopleDatabase
+    parse_cache = get_parse_cache()
     people_db = PeopleDatabase()
     for name in name_dict:
         if name_dict[name] >= 3:
-            people_db.add_person_raw(name_raw=name, count=name_dict[name])
+            people_db.add_person_raw(name_raw=name, count=name_dict[name],
+                                     parsed_name=parse_cache.parse(name, name_dict[name]))
 
     print("Length: ", len(people_db))
+    print(parse_cache.report())
+    parse_cache.store()
 
     # then merge the duplicate / similar names
     people_db.create_positions_csv()
     people_db.merge_duplicates()
 
-    people_db.store_to_disk(people_db_pickle_file)
+    people_db.store_to_disk(people_db_file)
     print("Merging names took", time.time() - initial_time)
 
 
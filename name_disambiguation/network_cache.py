@@ -0,0 +1,191 @@
+"""
+Content-addressed cache for the artifacts of network_generation.py (the people db and the
+document network).
+
+Every artifact is keyed by the sha256 hashes of the files it gets built from (e.g. the document
+csv, the people db, and the org dictionary). When one of them changes, the key changes and only
+the artifacts that depend on that file get rebuilt.
+Hashing large csvs is slow, so the hashes are stored in the manifest of the cache together with
+the size and modification time of the file and only get recomputed when those change.
+"""
+
+import hashlib
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+
+def file_content_hash(file_path):
+    """
+    Returns the sha256 hash of the content of a file
+    :param file_path: Path
+    :return: str
+    """
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as infile:
+        for block in iter(lambda: infile.read(2 ** 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class NetworkCache:
+    """
+    Cache directory with a manifest.json that records
+    - file_hashes: path -> [size, modification time (ns), sha256 hash]
+    - artifacts: artifact name -> key of the inputs the artifact was last built from
+    The manifest gets read again for every lookup and update, so multiple NetworkCache objects
+    of the same directory don't overwrite each other's entries.
+    """
+
+    def __init__(self, cache_dir):
+        """
+        Opens (or creates) a cache directory
+        :param cache_dir: Path
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.cache_dir / 'manifest.json'
+
+    def _load_manifest(self):
+        """
+        Returns the content of manifest.json
+        :return: dict
+        """
+        try:
+            with open(self.manifest_path, 'r') as infile:
+                return json.load(infile)
+        except FileNotFoundError:
+            return {'file_hashes': {}, 'artifacts': {}}
+
+    def _update_manifest(self, section, key, value):
+        """
+        Sets manifest[section][key] = value in manifest.json
+        :param section: str, 'file_hashes' or 'artifacts'
+        :param key: str
+        :param value: json serializable value
+        :return:
+        """
+        manifest = self._load_manifest()
+        manifest[section][key] = value
+        with open(self.manifest_path, 'w') as outfile:
+            json.dump(manifest, outfile, sort_keys=True, indent=4)
+
+    def file_hash(self, file_path):
+        """
+        Returns the sha256 hash of a file, reusing the stored hash if the size and modification
+        time of the file haven't changed
+        :param file_path: Path
+        :return: str
+        """
+        file_path = Path(file_path).resolve()
+        stat = file_path.stat()
+        stored = self._load_manifest()['file_hashes'].get(str(file_path))
+        if stored and stored[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return stored[2]
+
+        content_hash = file_content_hash(file_path)
+        self._update_manifest('file_hashes', str(file_path),
+                              [stat.st_size, stat.st_mtime_ns, content_hash])
+        return content_hash
+
+    def inputs_key(self, input_paths):
+        """
+        Returns the key of a list of input files: the sha256 hash of their names and hashes
+        :param input_paths: list of Path
+        :return: str
+        """
+        sha = hashlib.sha256()
+        for input_path in input_paths:
+            sha.update(f'{Path(input_path).name}:{self.file_hash(input_path)}\n'.encode('utf-8'))
+        return sha.hexdigest()
+
+    def artifact_path(self, name, input_paths, suffix='.npz'):
+        """
+        Returns the content-addressed path of an artifact built from input_paths. The file
+        exists if the artifact has already been built from the current input files.
+        :param name: str
+        :param input_paths: list of Path
+        :param suffix: str
+        :return: Path
+        """
+        return self.cache_dir / f'{name}_{self.inputs_key(input_paths)[:16]}{suffix}'
+
+    def remove_other_versions(self, name, artifact_path):
+        """
+        Deletes the artifacts called name that were built from other input files
+        :param name: str
+        :param artifact_path: Path, the current version of the artifact
+        :return:
+        """
+        for other_path in self.cache_dir.glob(f'{name}_*{artifact_path.suffix}'):
+            if other_path != artifact_path:
+                other_path.unlink()
+
+    def is_up_to_date(self, name, input_paths):
+        """
+        Returns False if an artifact with a fixed path (e.g. the people db) was built from input
+        files that have changed since, or was never recorded (e.g. it was built before the
+        cache existed), so its inputs are unknown
+        :param name: str
+        :param input_paths: list of Path
+        :return: bool
+        """
+        recorded_key = self._load_manifest()['artifacts'].get(name)
+        return recorded_key is not None and recorded_key == self.inputs_key(input_paths)
+
+    def record(self, name, input_paths):
+        """
+        Records that an artifact was built from the current versions of input_paths
+        :param name: str
+        :param input_paths: list of Path
+        :return:
+        """
+        self._update_manifest('artifacts', name, self.inputs_key(input_paths))
+
+
+class TestNetworkCache(unittest.TestCase):
+    """
+    Tests the keys and invalidation of the network cache
+    """
+
+    def test_invalidation(self):
+        """
+        Artifact paths and records change when (and only when) an input file changes
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            docs_path = Path(tmp_dir, 'docs.csv')
+            org_dict_path = Path(tmp_dir, 'orgs.json')
+            docs_path.write_text('au,rc\nDunn WL,Teague CE\n')
+            org_dict_path.write_text('{}')
+            inputs = [docs_path, org_dict_path]
+
+            network_cache = NetworkCache(Path(tmp_dir, 'cache'))
+            # unrecorded artifacts might have been built from other input files
+            self.assertFalse(network_cache.is_up_to_date('people_db', inputs))
+            network_cache.record('people_db', inputs)
+            network_path = network_cache.artifact_path('network', inputs)
+            network_path.write_bytes(b'network')
+
+            # another cache object of the same directory sees the record and the file hashes
+            other_cache = NetworkCache(Path(tmp_dir, 'cache'))
+            self.assertTrue(other_cache.is_up_to_date('people_db', inputs))
+            self.assertEqual(other_cache.artifact_path('network', inputs), network_path)
+            other_cache.record('people_db', [docs_path])
+            self.assertFalse(network_cache.is_up_to_date('people_db', inputs))
+            network_cache.record('people_db', inputs)
+            self.assertEqual(network_cache.artifact_path('network', inputs), network_path)
+
+            docs_path.write_text('au,rc\nDunn WL,Risi S\n')
+            self.assertFalse(network_cache.is_up_to_date('people_db', inputs))
+            new_network_path = network_cache.artifact_path('network', inputs)
+            self.assertNotEqual(new_network_path, network_path)
+
+            new_network_path.write_bytes(b'new network')
+            network_cache.remove_other_versions('network', new_network_path)
+            self.assertFalse(network_path.exists())
+            self.assertTrue(new_network_path.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,41 +2,171 @@
 This file contains the code to generate networks that can then be rendered through react/D3
 """
 
-import json
-import pickle
 import re
+import time
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import pandas as pd
-from IPython import embed
 
+from name_disambiguation.candidate_search import CandidateSearch
+from name_disambiguation.clean_org_names import CLEAN_ORG_NAMES_PATH
+from name_disambiguation.doc_ingestion import (ORGANIZATION_NAME_PATTERN, IngestedDocuments,
+                                                append_docs_to_csv, ingest_docs_in_chunks)
 from name_disambiguation.name_preprocessing import parse_column_person
-from name_disambiguation.people_db import PeopleDatabase
+from name_disambiguation.network_cache import NetworkCache
+from name_disambiguation.network_visualization import store_network_file
+from name_disambiguation.parse_cache import get_parse_cache
+from name_disambiguation.people_db import PeopleDatabase, convert_people_db_pickle
 from name_disambiguation.person import Person
+from name_disambiguation.sparse_network import DocumentNetwork
 
 DOCS_CSV_PATH = Path('..', 'data', 'documents', 'docs_1970s_all.csv')
-NETWORK_PATH = Path('..', 'data', 'network_generation', 'network_1970s.pickle')
-PEOPLE_DB_PATH = Path('..', 'data', 'network_generation', '1970s_from_csv.pickle')
+NETWORK_CACHE_DIR = Path('..', 'data', 'network_generation', 'cache')
+PEOPLE_DB_PATH = Path('..', 'data', 'network_generation', '1970s_from_csv.npz')
 NAMES_TO_SKIP = {
     'American Brands Inc',
     'Hardy Shook',
     'Shook Hardy',
 }
 
-def create_db_of_1970s_docs_from_csv():             # pylint: disable=C0103
+# the industry's general counsels, ca. 1972
+LAWYER_NAMES = [
+    'Thomas F. Ahrensfeld',    # y     Philip Morris
+    'Alexander Holtzman',      # y     Philip Morris
+    'H. Debaun Bryant',        # y     Brown & Williamson
+    'Frederick P. Haas',       # y     Liggett & Myers
+    'Cyril F. Hetsko',         # y     American Tobacco
+    'Henry C. Roemer',         # y     R.J. Reynolds
+    'Arthur Joseph Stevens',   # y     Lorillard
+    'Addison Y. Yeaman',       # y     Brown & Williamson ??possibly also CTR??
+    'William W. Shinn',        # y     Shook, Hardy & Bacon (CTR law firm)
+    'David Ross Hardy'         # y     Shook, Hardy & Bacon (CTR law firm)
+]
+
+# industry research directors, ca. 1970
+RESEARCH_DIRECTOR_NAMES = [
+    'Ivor Wallace Hughes',          # Brown & Williamson
+    'Preston Hildebrand Leake',     # American Tobacco
+    'Murray Senkus',                # R. J. Reynolds
+    'Alexander White Spears',       # Lorillard
+    'Helmut R. Wakeham',            # Philip Morris
+    'Henry H. Ramm',                # Council for Tobacco Research
+    'Robert Casad Hockett'          # Council for Tobacco Research
+]
+
+# the network specs of generate_people_networks for the networks shown in the backend
+CURATED_NETWORK_SPECS = [
+    {'names': ['Theodor D. Sterling'], 'network_name': 'sterling', 'max_number_of_nodes': 100,
+     'include_2nd_degree_connections': True},
+    {'names': LAWYER_NAMES, 'network_name': 'lawyers', 'max_number_of_nodes': 200,
+     'include_2nd_degree_connections': True},
+    {'names': RESEARCH_DIRECTOR_NAMES, 'network_name': 'research_directors',
+     'max_number_of_nodes': 300, 'include_2nd_degree_connections': True},
+]
+
+def create_db_of_1970s_docs_from_csv(network_cache=None):     # pylint: disable=C0103
     """
     We have this strange 1970s db from November 2019 but I don't know how it was created.
     This script simply uses the docs_1970s_all.csv to create a people_db using the info found in
     those documents.
 
+    :param network_cache: NetworkCache that records the people db, defaults to the cache in
+                          NETWORK_CACHE_DIR
     :return:
     """
 
     print("Generating new 1970s People DB")
 
-    df = pd.read_csv(DOCS_CSV_PATH).fillna('')      # pylint: disable=C0103
+    start = time.time()
+    people_db, docs_count = create_people_db_from_docs(ingest_docs_in_chunks(DOCS_CSV_PATH))
+    ingestion_time = time.time() - start
+    print(f"Ingested {docs_count} documents in {ingestion_time:.1f}s "
+          f"({docs_count / ingestion_time:.0f} docs/sec)")
+    print(get_parse_cache().report())
+    get_parse_cache().store()
+
+    len_before_merge = len(people_db)
+    people_db.merge_duplicates()
+    print("before", len_before_merge, ". after", len(people_db))
+
+    people_db.store_to_disk(PEOPLE_DB_PATH)
+    if network_cache is None:
+        network_cache = NetworkCache(NETWORK_CACHE_DIR)
+    network_cache.record('people_db_1970s', [DOCS_CSV_PATH, CLEAN_ORG_NAMES_PATH])
+
+
+def load_people_db_of_1970s(network_cache=None):
+    """
+    Loads the 1970s people db. (Re)creates it with create_db_of_1970s_docs_from_csv if it doesn't
+    exist yet, if the docs csv or the org dictionary have changed since it was created, or if it
+    was never recorded in the network cache.
+    A people db that only exists in the old pickle format (1970s_from_csv.pickle) gets converted
+    once with convert_people_db_pickle and recorded as built from the current docs csv and org
+    dictionary.
+
+    :param network_cache: NetworkCache, defaults to the cache in NETWORK_CACHE_DIR
+    :return: PeopleDatabase
+    """
+    if network_cache is None:
+        network_cache = NetworkCache(NETWORK_CACHE_DIR)
+
+    legacy_pickle_path = Path(PEOPLE_DB_PATH).with_suffix('.pickle')
+    if not Path(PEOPLE_DB_PATH).exists() and legacy_pickle_path.exists():
+        print(f"Converting {legacy_pickle_path} to {PEOPLE_DB_PATH}.")
+        convert_people_db_pickle(legacy_pickle_path, PEOPLE_DB_PATH)
+        network_cache.record('people_db_1970s', [DOCS_CSV_PATH, CLEAN_ORG_NAMES_PATH])
+
+    if not Path(PEOPLE_DB_PATH).exists():
+        print(f"People db cache miss: {PEOPLE_DB_PATH} doesn't exist.")
+    elif not network_cache.is_up_to_date('people_db_1970s', [DOCS_CSV_PATH, CLEAN_ORG_NAMES_PATH]):
+        print(f"People db cache miss: the docs csv or the org dictionary have changed since "
+              f"{PEOPLE_DB_PATH} was created, or it wasn't recorded in the network cache.")
+    else:
+        return _timed_load_people_db()
+
+    start = time.time()
+    create_db_of_1970s_docs_from_csv(network_cache)
+    print(f"Rebuilt the people db in {time.time() - start:.1f}s")
+    return _timed_load_people_db()
+
+
+def _timed_load_people_db():
+    """
+    Loads PEOPLE_DB_PATH and prints how long that took
+    :return: PeopleDatabase
+    """
+    start = time.time()
+    people_db = PeopleDatabase()
+    people_db.load_from_disk(PEOPLE_DB_PATH)
+    print(f"Loaded the people db ({len(people_db)} people) in {time.time() - start:.2f}s")
+    return people_db
+
+
+def create_people_db_from_docs(ingested_doc_chunks):
+    """
+    Adds the authors and recipients of all documents to a new (unmerged) people db. Each person
+    gets the organizations of their side of the document as positions.
+
+    :param ingested_doc_chunks: iterable of IngestedDocuments, e.g. ingest_docs_in_chunks()
+    :return: PeopleDatabase, int (number of documents)
+    """
+
     people_db = PeopleDatabase()
+    docs_count, _ = add_docs_to_people_db(people_db, ingested_doc_chunks)
+    return people_db, docs_count
+
+
+def add_docs_to_people_db(people_db, ingested_doc_chunks):
+    """
+    Adds the authors and recipients of documents to a people db with add_person_raw (without
+    merging them).
+
+    :param people_db: PeopleDatabase
+    :param ingested_doc_chunks: iterable of IngestedDocuments
+    :return: int (number of documents), set of str (raw names of the added people)
+    """
 
     counters = {
         'valid': Counter(),         # valid person
@@ -47,124 +177,141 @@ def create_db_of_1970s_docs_from_csv():             # pylint: disable=C0103
         'error': Counter(),         # threw an error
     }
 
-    for idx, doc in df.iterrows():  # iterate over all documentsf
-        if idx % 1000 == 0:
-            print(idx)
+    docs_count = 0
+    added_names = set()
+    for ingested_docs in ingested_doc_chunks:
+        docs_count += len(ingested_docs)
+        for doc_id in ingested_docs.doc_ids:
+            doc_authors, doc_author_orgs = ingested_docs.get_people_and_organizations(
+                'authors', doc_id, counters, people_db)
+            doc_recipients, doc_recipient_orgs = ingested_docs.get_people_and_organizations(
+                'recipients', doc_id, counters, people_db)
+
+            doc_author_orgs += ingested_docs.get_organizations('authors', doc_id, counters,
+                                                               people_db)
+            doc_recipient_orgs += ingested_docs.get_organizations('recipients', doc_id, counters,
+                                                                  people_db)
 
-        doc_authors, doc_author_orgs = parse_authors_or_recipients_of_doc('authors', doc,
-                                                                          counters, people_db)
-        doc_recipients, doc_recipient_orgs = parse_authors_or_recipients_of_doc('recipients', doc,
-                                                                                counters, people_db)
+            for person in doc_authors:
+                people_db.add_person_raw(name_raw=person, position=Counter(doc_author_orgs),
+                                         parsed_name=ingested_docs.parsed_names[person][1])
+            for person in doc_recipients:
+                people_db.add_person_raw(name_raw=person, position=Counter(doc_recipient_orgs),
+                                         parsed_name=ingested_docs.parsed_names[person][1])
+            added_names.update(doc_authors)
+            added_names.update(doc_recipients)
 
-        doc_author_orgs += parse_au_or_rc_organizations_of_doc('authors', doc, counters, people_db)
-        doc_recipient_orgs += parse_au_or_rc_organizations_of_doc('recipients', doc, counters,
-                                                                  people_db)
+    return docs_count, added_names
 
-        for person in doc_authors:
-            people_db.add_person_raw(name_raw=person, position=Counter(doc_author_orgs))
-        for person in doc_recipients:
-            people_db.add_person_raw(name_raw=person, position=Counter(doc_recipient_orgs))
 
-    len_before_merge = len(people_db)
-    people_db.merge_duplicates()
-    print("before", len_before_merge, ". after", len(people_db))
+def get_network_of_1970s_nodes_and_edges():             # pylint: disable=C0103
+    """
+    Get or create a network of nodes and edges based on the 1970s people database
 
-    people_db.store_to_disk(PEOPLE_DB_PATH)
+    The network is cached in NETWORK_CACHE_DIR under the hashes of the docs csv, the people db,
+    and the org dictionary, so it only gets rebuilt when one of them changes.
+
+    :return: dict with the nodes and edges dicts of DocumentNetwork.to_nodes_and_edges() and
+             the DocumentNetwork ('network')
+    """
 
+    _, network = load_network_of_1970s()
+    nodes, edges = network.to_nodes_and_edges()
+    return {'nodes': nodes, 'edges': edges, 'network': network}
 
-def get_network_of_1970s_nodes_and_edges():             # pylint: disable=C0103,R0914
+
+def load_network_of_1970s(network_cache=None):
     """
-    Get or create a network of nodes and edges based on the 1970s people database
+    Loads the 1970s people db and the DocumentNetwork of the 1970s docs from the network cache
+    and (re)builds the ones that are out of date.
 
-    :return:
+    :param network_cache: NetworkCache, defaults to the cache in NETWORK_CACHE_DIR
+    :return: PeopleDatabase, DocumentNetwork
     """
+    if network_cache is None:
+        network_cache = NetworkCache(NETWORK_CACHE_DIR)
+    people_db = load_people_db_of_1970s(network_cache)
+
+    network_path = network_cache.artifact_path(
+        'network_1970s', [DOCS_CSV_PATH, PEOPLE_DB_PATH, CLEAN_ORG_NAMES_PATH])
+    start = time.time()
+    if network_path.exists():
+        network = DocumentNetwork.load_from_disk(network_path, people_db)
+        print(f"Network cache hit: loaded {network_path.name} in {time.time() - start:.2f}s")
+    else:
+        print(f"Network cache miss: building {network_path.name}")
+        network = DocumentNetwork.from_docs(ingest_docs_in_chunks(DOCS_CSV_PATH), people_db)
+        network.store_to_disk(network_path)
+        network_cache.remove_other_versions('network_1970s', network_path)
+        print(f"Rebuilt the network in {time.time() - start:.1f}s")
+    return people_db, network
 
-    try:
-        with open(NETWORK_PATH, 'rb') as infile:
-            return pickle.load(infile)
-    except FileNotFoundError:
 
+def ingest_documents(new_docs):
+    """
+    Adds new documents to the 1970s docs csv, people db, and network without rebuilding them:
+    - the authors and recipients of the new documents get added to the stored people db and
+      only the last names of the added people get merged again
+    - the new documents get added to the stored network as new columns of its incidence
+      matrices (DocumentNetwork.with_new_docs), which updates the edge counts
+    - the new documents get appended to the docs csv and the cache records the new people db and
+      network as up to date, so the next load doesn't rebuild them
+
+    Merging the new people into already merged people can give slightly different merges than
+    merging all raw names at once, so run create_db_of_1970s_docs_from_csv from time to time.
+
+    :param new_docs: pd.DataFrame with (at least) the au, au_person, au_org, rc, rc_person, and
+                     rc_org columns of the docs csv
+    :return: PeopleDatabase, DocumentNetwork
+    """
 
-        people_db = PeopleDatabase()
-        try:
-            people_db.load_from_disk(PEOPLE_DB_PATH)
-        except FileNotFoundError:
-            create_db_of_1970s_docs_from_csv()
-            people_db.load_from_disk(PEOPLE_DB_PATH)
-
-
-        df = pd.read_csv(DOCS_CSV_PATH).fillna('')      # pylint: disable=C0103
-
-        nodes = {}
-        edges = {}
-        counters = {
-            'valid': Counter(),         # valid person
-            'organization_from_person': Counter(),  # valid organizations extracted from person col
-            'organization_from_org': Counter(),  # valid organizations extracted from org col
-            'organization_invalid': Counter(), # invalid organizations from org col
-            'invalid': Counter(),       # not a valid person
-            'error': Counter(),         # threw an error
-        }
-
-
-        for idx, doc in df.iterrows():  # iterate over all documentsf
-            if idx % 1000 == 0:
-                print(idx)
-
-            doc_authors, _ = parse_authors_or_recipients_of_doc('authors', doc, counters, people_db)
-            doc_recipients, _ = parse_authors_or_recipients_of_doc('recipients', doc,
-                                                                   counters, people_db)
-
-            d_authors = []
-            for author in doc_authors:
-                author_person = people_db.get_person_from_alias(author)
-                if author_person:
-                    d_authors.append(author_person)
-                else:
-                    print("could not find", author)
-            doc_authors = d_authors
-
-            d_recipients = []
-            for recipient in doc_recipients:
-                recipient_person = people_db.get_person_from_alias(recipient)
-                if recipient_person:
-                    d_recipients.append(recipient_person)
-                else:
-                    print("Could not find", recipient)
-            doc_recipients = d_recipients
-
-            for author in doc_authors:
-                author.docs_authored.append(doc)
-                if author in nodes:
-                    nodes[author]['count_authored'] += 1
-                else:
-                    embed()
-                    nodes[author] = {'person': author, 'docs_authored': {}, 'count_received': 0}
-
-            for recipient in doc_recipients:
-                if recipient in nodes:
-                    nodes[recipient]['count_received'] += 1
-                else:
-                    nodes[recipient] = {'person': recipient, 'count_authored': 0,
-                                        'count_received': 1}
-
-            for author in doc_authors:
-                for recipient in doc_recipients:
-                    edge = tuple(sorted([author, recipient]))
-                    if edge in edges:
-                        edges[edge]['count'] += 1
-                    else:
-                        edges[edge] = {'edge': edge, 'count': 1}
-
-        with open(NETWORK_PATH, 'wb') as out:
-            network = {'nodes': nodes, 'edges': edges}
-            pickle.dump(network, out)
-
-        return get_network_of_1970s_nodes_and_edges()
+    start = time.time()
+    network_cache = NetworkCache(NETWORK_CACHE_DIR)
+    people_db, network = load_network_of_1970s(network_cache)
+    load_time = time.time() - start
+
+    # the new documents continue the row numbers (doc ids) of the csv
+    first_doc_id = int(network.doc_ids.max()) + 1 if len(network.doc_ids) else 0
+    new_docs = new_docs.fillna('').set_axis(
+        pd.RangeIndex(first_doc_id, first_doc_id + len(new_docs)), axis=0)
+    ingested_docs = IngestedDocuments(new_docs)
+
+    # when the people db gets created from the csv, the positions of all people in the earlier
+    # documents are in raw_org_to_clean_org_dict by the time the new documents get parsed
+    for person in people_db.people:
+        for position in person.positions:
+            people_db.raw_org_to_clean_org_dict.setdefault(position, position)
+
+    _, added_names = add_docs_to_people_db(people_db, [ingested_docs])
+    added_last_names = set()
+    for name in added_names:
+        person = people_db.get_person_from_alias(name)
+        if person:
+            added_last_names.add(person.last)
+    len_before_merge = len(people_db)
+    people_db.merge_last_names(print_merge_results_for_name=None, last_names=added_last_names)
+    print(f"Merged {len(added_last_names)} last names. before", len_before_merge, ". after",
+          len(people_db))
+
+    network = network.with_new_docs([ingested_docs], people_db)
+
+    append_docs_to_csv(DOCS_CSV_PATH, new_docs)
+    people_db.store_to_disk(PEOPLE_DB_PATH)
+    network_cache.record('people_db_1970s', [DOCS_CSV_PATH, CLEAN_ORG_NAMES_PATH])
+    network_path = network_cache.artifact_path(
+        'network_1970s', [DOCS_CSV_PATH, PEOPLE_DB_PATH, CLEAN_ORG_NAMES_PATH])
+    network.store_to_disk(network_path)
+    network_cache.remove_other_versions('network_1970s', network_path)
+    get_parse_cache().store()
+
+    print(f"Ingested {len(new_docs)} documents in {time.time() - start - load_time:.1f}s "
+          f"(+{load_time:.1f}s to load the people db and network)")
+    return people_db, network
 
 def store_network_for_visualization(nodes, edges, center_names, network_name, file_name):
     """
-    Stores the data for one backend in backend/data
+    Stores the data for one backend in backend/data, compiled for the frontend (see
+    compile_network_for_visualization), so the backend can serve the file as it is
     :param nodes: dict
     :param edges: dict
     :param center_names: list   The names at the center of the network that should be highlighted.
@@ -179,63 +326,161 @@ def store_network_for_visualization(nodes, edges, center_names, network_name, fi
         'links': edges,
         'center_names': {name:True for name in center_names}    # dict bc set can't be jsoned.
     }
-    out_path = Path('..', 'backend', 'data', file_name)
-    with open(out_path, 'w') as out:
-        json.dump(network, out, sort_keys=True, indent=4)
+    store_network_file(network, Path('..', 'backend', 'data', file_name))
 
 
-def generate_people_network(names, network_name, max_number_of_nodes=100,   # pylint: disable=R0914
-                            include_2nd_degree_connections=False):
+def generate_people_network(names, network_name, max_number_of_nodes=100,   # pylint: disable=R0913
+                            include_2nd_degree_connections=False, manual_merge=True):
 
     """
     Generate the network of one or multiple people. The resulting json is stored in
     backend/data
+    To generate many networks, use generate_people_networks, which loads the people db and the
+    1970s network only once.
     :param names: list
     :param network_name: str
     :param max_number_of_nodes: int
+    :param include_2nd_degree_connections: bool
+    :param manual_merge: bool, ask which nodes of the network should get merged
     :return:
     """
-    if include_2nd_degree_connections:
-        network_name += '_including_2nd_degree_edges'
-
-    # Load people db
-    people_db = PeopleDatabase()
-    people_db.load_from_disk(Path(PEOPLE_DB_PATH))
-
-
-    # initialize the center group of people
-    center_people = set()
-    for name in names:
-        db_person = people_db.get_person_from_alias(name)
-        if db_person:
-            center_people.add(db_person)
-        else:
-            print(f'Could not find {name}. Possible candidates: ')
-            possible_matches = search_possible_matches(name[:5], people_db)
-            for result in possible_matches.most_common(5):
-                print(result)
-            raise KeyError
-
-    # load the whole 1970s network
-    network = get_network_of_1970s_nodes_and_edges()
-    edges = network['edges']
-
-    nodes_temp = Counter()
-    # edges_out = []
-    nodes_out = []
+    failures = generate_people_networks([{
+        'names': names,
+        'network_name': network_name,
+        'max_number_of_nodes': max_number_of_nodes,
+        'include_2nd_degree_connections': include_2nd_degree_connections,
+        'manual_merge': manual_merge,
+    }])
+    if failures:
+        raise ValueError(failures[network_name])
+
+
+def generate_people_networks(network_specs, max_workers=None):     # pylint: disable=R0914
+    """
+    Generate the networks of many groups of people (see generate_people_network). The people
+    db and the 1970s network get loaded once and the edges of all center people get collected
+    in one pass over the edge index of the network, so only the neighborhoods of the center
+    people get touched. The resulting jsons are stored in backend/data.
+    A spec that fails (a name that isn't in the people db or a center person without documents)
+    only stops its own network: the other networks get stored and the failures get reported.
+
+    :param network_specs: list of dicts with the arguments of generate_people_network:
+                          names, network_name, and optionally max_number_of_nodes (100),
+                          include_2nd_degree_connections (False), and manual_merge (True)
+    :param max_workers: int, if given, the networks get finished (merging their nodes and
+                        collecting their edges) in a pool of max_workers processes. Manual
+                        merges need user input, so all specs need manual_merge=False then.
+    :return: dict, network name -> why the network couldn't be generated, for the failed specs
+    """
+    network_specs = [{'max_number_of_nodes': 100, 'include_2nd_degree_connections': False,
+                      'manual_merge': True, **spec} for spec in network_specs]
+    if max_workers and any(spec['manual_merge'] for spec in network_specs):
+        raise ValueError("Manual merges need user input. Use manual_merge=False for all "
+                         "network specs to generate the networks in a process pool.")
+
+    # load the whole 1970s network and the people db that it was built from
+    people_db, network = load_network_of_1970s()
+
+    # initialize the center group of people of every network
+    failures = {}
+    specs_center_people = []
+    for spec in network_specs:
+        center_people = set()
+        for name in spec['names']:
+            db_person = people_db.get_person_from_alias(name)
+            if db_person:
+                center_people.add(db_person)
+            else:
+                print(f'Could not find {name}. Possible candidates: ')
+                for person, similarity in search_possible_matches(name, people_db, k=5):
+                    print(f'{similarity:.2f}', person.full_name, person.count)
+                failures.setdefault(spec['network_name'], f'Could not find {name}.')
+        specs_center_people.append(center_people)
+    found_specs = [(spec, center_people)
+                   for spec, center_people in zip(network_specs, specs_center_people)
+                   if spec['network_name'] not in failures]
+    network_specs = [spec for spec, _ in found_specs]
+    specs_center_people = [center_people for _, center_people in found_specs]
+
+    specs_nodes_temp, specs_people_without_docs = _count_center_edges(network,
+                                                                      specs_center_people)
+
+    jobs = []
+    finished_specs = []
+    for spec, center_people, nodes_temp, people_without_docs in zip(
+            network_specs, specs_center_people, specs_nodes_temp, specs_people_without_docs):
+        if people_without_docs:
+            names_without_docs = sorted(person.full_name for person in people_without_docs)
+            failures[spec['network_name']] = (f"Found 0 documents for "
+                                              f"{', '.join(names_without_docs)} in the 1970s "
+                                              f"network.")
+            continue
+        # store all people in the network to be displayed in their own network
+        nodes = nodes_temp.most_common(spec['max_number_of_nodes'])
+        for node, node_count in nodes:
+            print("\n", node_count, "\n", node)
+
+        # only edges between two nodes can be part of the network
+        node_ids = {network.person_ids[node] for node, _ in nodes}
+        node_edges = []
+        sources, targets, counts = network.edges()
+        for edge_id in network.incident_edges(node_ids).tolist():
+            source, target = int(sources[edge_id]), int(targets[edge_id])
+            if source in node_ids and target in node_ids:
+                node_edges.append((network.canonical_alias(source),
+                                   network.canonical_alias(target), int(counts[edge_id])))
+
+        jobs.append((center_people, nodes, node_edges, spec['include_2nd_degree_connections'],
+                     spec['manual_merge']))
+        finished_specs.append(spec)
+
+    if max_workers and jobs:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_finish_people_network, *zip(*jobs)))
+    else:
+        results = [_finish_people_network(*job) for job in jobs]
 
-    center_person_doc_counter = Counter()
+    for spec, (nodes_out, edges_out) in zip(finished_specs, results):
+        network_name = spec['network_name']
+        if spec['include_2nd_degree_connections']:
+            network_name += '_including_2nd_degree_edges'
+        store_network_for_visualization(nodes_out, edges_out,
+                                        center_names=spec['names'],
+                                        network_name=f'person_{network_name}',
+                                        file_name=f'person_{network_name}.json')
 
-    # first identify all the primary edges including at least one person from center_people
-    for idx, edge in enumerate(edges.values()):
+    for network_name, failure in failures.items():
+        print(f"Could not generate the network {network_name}: {failure}")
+    return failures
 
-        person1 = people_db.get_person_from_alias(edge['edge'][0].aliases.most_common(1)[0][0])
-        person2 = people_db.get_person_from_alias(edge['edge'][1].aliases.most_common(1)[0][0])
 
-        if not person1 or not person2:
-            embed()
-        if (
-                (person1 in center_people or person2 in center_people) and     # pylint: disable=R0916
+def _count_center_edges(network, specs_center_people):   # pylint: disable=R0914
+    """
+    Identifies the primary edges (edges including at least one person from center_people) of
+    every network in one pass over the edges of all center people and counts the documents
+    of the people of these edges.
+
+    :param network: DocumentNetwork
+    :param specs_center_people: list of sets of Person (the center people of every network)
+    :return: list of Counters (person -> number of documents on primary edges), list of lists of
+             Person (the center people without documents of every network)
+    """
+    # network id -> indexes of the networks that have the person at their center
+    center_specs = {}
+    for spec_idx, center_people in enumerate(specs_center_people):
+        for person in center_people:
+            if person in network.person_ids:
+                center_specs.setdefault(network.person_ids[person], []).append(spec_idx)
+
+    specs_nodes_temp = [Counter() for _ in specs_center_people]
+    specs_doc_counter = [Counter() for _ in specs_center_people]
+    sources, targets, counts = (array.tolist() for array in network.edges())
+    for edge_id in network.incident_edges(list(center_specs)).tolist():
+
+        person1 = network.people[sources[edge_id]]
+        person2 = network.people[targets[edge_id]]
+
+        if (       # pylint: disable=R0916
                 (person1.first != '' or person1.most_likely_position != 'no positions available')
                 and
                 (person2.first != '' or person2.most_likely_position != 'no positions available')
@@ -243,40 +488,67 @@ def generate_people_network(names, network_name, max_number_of_nodes=100,   # py
                 (person1.full_name not in NAMES_TO_SKIP) and
                 (person2.full_name not in NAMES_TO_SKIP)
         ):
-            nodes_temp[person1] += edge['count']
-            nodes_temp[person2] += edge['count']
-
-            if person1 in center_people:
-                center_person_doc_counter[person1] += 1
-            if person2 in center_people:
-                center_person_doc_counter[person2] += 1
-
-
-    print("showing number of documents per central person")
-    for person, count in center_person_doc_counter.most_common():
-        print(count, person.full_name)
-    if len(center_person_doc_counter) != len(center_people):
-        raise ValueError("Found 0 documents for at least one person. embed here and investigate!")
-
-    # store all people in the network to be displayed in their own network
+            spec_idxs = set(center_specs.get(sources[edge_id], []) +
+                            center_specs.get(targets[edge_id], []))
+            for spec_idx in sorted(spec_idxs):
+                specs_nodes_temp[spec_idx][person1] += counts[edge_id]
+                specs_nodes_temp[spec_idx][person2] += counts[edge_id]
+
+                if person1 in specs_center_people[spec_idx]:
+                    specs_doc_counter[spec_idx][person1] += 1
+                if person2 in specs_center_people[spec_idx]:
+                    specs_doc_counter[spec_idx][person2] += 1
+
+    specs_people_without_docs = []
+    for center_people, center_person_doc_counter in zip(specs_center_people, specs_doc_counter):
+        print("showing number of documents per central person")
+        for person, count in center_person_doc_counter.most_common():
+            print(count, person.full_name)
+        specs_people_without_docs.append([person for person in center_people
+                                          if person not in center_person_doc_counter])
+
+    return specs_nodes_temp, specs_people_without_docs
+
+
+def _finish_people_network(center_people, nodes, node_edges,     # pylint: disable=R0914
+                           include_2nd_degree_connections, manual_merge):
+    """
+    Merges the nodes of a network and returns the nodes and edges to visualize.
+    Runs in a worker process of generate_people_networks if it uses a process pool.
+
+    The nodes get merged as copies, so the people of the people db (which other networks of
+    the same batch share) don't change.
+
+    :param center_people: set of Person
+    :param nodes: list of (Person, int) tuples, the nodes and their number of documents
+    :param node_edges: list of (str, str, int) tuples, the canonical aliases of the two people
+                       and the weight of every edge between two nodes
+    :param include_2nd_degree_connections: bool
+    :param manual_merge: bool
+    :return: list of dicts (nodes), list of dicts (edges)
+    """
+    nodes_temp = Counter(dict(nodes))
     new_people_db = PeopleDatabase()
-    for node, node_count in nodes_temp.most_common(max_number_of_nodes):
-        print("\n", node_count, "\n", node)
-        node.count = node_count
-        new_people_db.people.add(node)
+    for node, node_count in nodes:
+        # the copy stands in for the node, so it keeps the id (and with it the hash)
+        node_copy = node.copy()
+        node_copy.person_id = node.person_id
+        node_copy.count = node_count
+        new_people_db.people.add(node_copy)
     new_people_db.generate_alias_to_person_dict()
-    new_people_db.merge_duplicates(manual_merge=True)
+    new_people_db.merge_duplicates(manual_merge=manual_merge)
 
+    nodes_out = []
     for node in sorted(new_people_db.people, key=lambda x: x.count)[::-1]:
         nodes_out.append({'name': node.full_name, 'docs': nodes_temp[node], 'words': 0,
                           'affiliation': node.most_likely_position})
 
     edges_out = []
-    for edge in edges.values():
+    for alias1, alias2, count in node_edges:
         # with additional merges, the people in the db have changed -> we need to look them
         # up again via one of their aliases.
-        person1 = new_people_db.get_person_from_alias(edge['edge'][0].aliases.most_common(1)[0][0])
-        person2 = new_people_db.get_person_from_alias(edge['edge'][1].aliases.most_common(1)[0][0])
+        person1 = new_people_db.get_person_from_alias(alias1)
+        person2 = new_people_db.get_person_from_alias(alias2)
 
         if person1 and person2:
             if(
@@ -284,42 +556,33 @@ def generate_people_network(names, network_name, max_number_of_nodes=100,   # py
                     person2 in center_people or
                     (
                         include_2nd_degree_connections and
-                        edge['count'] > 5
+                        count > 5
                     )
             ):
                 edges_out.append({'node1': person1.full_name, 'node2': person2.full_name,
-                                  'docs': edge['count'], 'words': 0})
-                if edge['count'] == 0:
+                                  'docs': count, 'words': 0})
+                if count == 0:
                     raise ValueError("count of edge should not be zero.")
 
-
-    store_network_for_visualization(nodes_out, edges_out,
-                                    center_names=names,
-                                    network_name=f'person_{network_name}',
-                                    file_name=f'person_{network_name}.json')
+    return nodes_out, edges_out
 
 
-def search_possible_matches(name, people_db=None):
+def search_possible_matches(name, people_db=None, k=10):
     """
-    Search for possible alias matches given a name
-    :param name:
-    :param people_db:
-    :return: Counter
+    Search for the people whose aliases or full names are most similar to a (possibly
+    misspelled) name. To search many names, keep a CandidateSearch of the people db instead of
+    indexing it again for every name.
+    :param name: str
+    :param people_db: PeopleDatabase, defaults to the 1970s people db
+    :param k: int, number of people to return
+    :return: list of (Person, float) tuples (person, similarity), most similar first
     """
 
-    if not people_db:
+    if people_db is None:
         people_db = PeopleDatabase()
         people_db.load_from_disk(Path(PEOPLE_DB_PATH))
 
-    possible_matches = Counter()
-
-    for person in people_db._alias_to_person_dict:          # pylint: disable=W0212
-        person_db = people_db.get_person_from_alias(name)
-        if person_db:
-            person_obj = people_db.get[person]
-            possible_matches[person_obj] = person_obj.count
-
-    return possible_matches
+    return CandidateSearch(people_db.people).search(name, k=k)
 
 
 def parse_authors_or_recipients_of_doc(side, doc, counters, people_db):     # pylint: disable=C0103
@@ -430,7 +693,7 @@ def check_if_name_looks_like_an_organization(name):     # pylint: disable=C0103
     :param name:
     :return:
     """
-    if re.match('^[a-zA-Z]+ [a-zA-Z]+ [a-zA-Z ]+$', name):
+    if re.match(ORGANIZATION_NAME_PATTERN, name):
         return True
     return False
 
@@ -483,19 +746,7 @@ def generate_network_lawyers(include_2nd_degree_connections=True):
     :return:
     """
 
-    names = ['Thomas F. Ahrensfeld',    # y     Philip Morris
-             'Alexander Holtzman',      # y     Philip Morris
-             'H. Debaun Bryant',        # y     Brown & Williamson
-             'Frederick P. Haas',       # y     Liggett & Myers
-             'Cyril F. Hetsko',         # y     American Tobacco
-             'Henry C. Roemer',         # y     R.J. Reynolds
-             'Arthur Joseph Stevens',   # y     Lorillard
-             'Addison Y. Yeaman',       # y     Brown & Williamson ??possibly also CTR??
-             'William W. Shinn',        # y     Shook, Hardy & Bacon (CTR law firm)
-             'David Ross Hardy'         # y     Shook, Hardy & Bacon (CTR law firm)
-             ]
-
-    generate_people_network(names=names, network_name='lawyers',
+    generate_people_network(names=LAWYER_NAMES, network_name='lawyers',
                             max_number_of_nodes=200,
                             include_2nd_degree_connections=include_2nd_degree_connections)
 
@@ -504,21 +755,24 @@ def generate_network_research_directors(include_2nd_degree_connections=True):# p
     Generates the network of industry research directors, ca. 1970
     """
 
-    names = [
-        'Ivor Wallace Hughes',          # Brown & Williamson
-        'Preston Hildebrand Leake',     # American Tobacco
-        'Murray Senkus',                # R. J. Reynolds
-        'Alexander White Spears',       # Lorillard
-        'Helmut R. Wakeham',            # Philip Morris
-        'Henry H. Ramm',                # Council for Tobacco Research
-        'Robert Casad Hockett'          # Council for Tobacco Research
-    ]
-
-    generate_people_network(names=names, network_name='research_directors',
+    generate_people_network(names=RESEARCH_DIRECTOR_NAMES, network_name='research_directors',
                             max_number_of_nodes=300,
                             include_2nd_degree_connections=include_2nd_degree_connections)
 
 
+def generate_curated_networks(max_workers=None, manual_merge=True):
+    """
+    Regenerates all networks of CURATED_NETWORK_SPECS (e.g. after the people db has changed),
+    loading the people db and the 1970s network only once
+
+    :param max_workers: int, size of the process pool (see generate_people_networks)
+    :param manual_merge: bool, has to be False to use a process pool
+    :return:
+    """
+    generate_people_networks([{**spec, 'manual_merge': manual_merge}
+                              for spec in CURATED_NETWORK_SPECS], max_workers=max_workers)
+
+
 def generate_network_whole_industry():
     """
     Generate a network where the nodes are not people but companies
@@ -526,12 +780,7 @@ def generate_network_whole_industry():
     :return:
     """
 
-    # Load people db
-    people_db_path = Path('..', 'data', 'network_generation', 'people_db_1970s.pickle')
-    people_db = PeopleDatabase()
-    people_db.load_from_disk(Path(people_db_path))
-
-    # load the whole 1970s network
+    # load the whole 1970s network, with the people db of PEOPLE_DB_PATH
     network = get_network_of_1970s_nodes_and_edges()
     edges = network['edges']
 
@@ -565,9 +814,9 @@ def generate_network_whole_industry():
 
 if __name__ == '__main__':
 
-    for match in search_possible_matches('KHAN').most_common(100):
+    for match in search_possible_matches('KHAN', k=100):
         print()
-        print(match[0].full_name, match[1])
+        print(match[0].full_name, match[1], match[0].count)
         print(match[0].positions)
         print(match[0].aliases)
 
@@ -575,3 +824,4 @@ if __name__ == '__main__':
     # generate_network_lawyers()
     # generate_network_research_directors()
     # generate_network_thedore_sterling()
+    # generate_curated_networks()
@@ -0,0 +1,292 @@
+"""
+Ready-to-serve network files for the frontend.
+
+store_network_for_visualization in network_generation.py compiles every network with
+compile_network_for_visualization before writing it to backend/data. The compiled file has
+everything the frontend needs (link sources and targets, node degrees, and clusters), so
+get_network_data in the backend can serve the file as it is.
+Network files written before that can be compiled in place with precompile_network_files.
+
+Every network file (e.g. person_sterling.json) also gets a compact version
+(person_sterling.compact.json, see compact_network) and gzip and brotli compressed copies of
+the compact version (person_sterling.compact.json.gz and .br), which get_network_data serves
+with ?format=compact.
+"""
+
+import gzip
+import io
+import json
+import math
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+
+import brotli
+
+BACKEND_DATA_PATH = Path(__file__).parent.parent / 'backend' / 'data'
+COMPACT_SUFFIX = '.compact.json'
+# content encoding -> suffix of the compressed copy of a compact network file
+COMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def compile_network_for_visualization(network):
+    """
+    Adds what the frontend needs to a network of store_network_for_visualization:
+    source and target of every link, degree (-1) and cluster of every node, adjacent_nodes,
+    and the clusters (see get_clusters_data). Compiling a compiled network doesn't change it.
+
+    :param network: dict with name, nodes, links, and center_names
+    :return: dict, the compiled network
+    """
+    nodes = network['nodes']
+    for node in nodes:
+        node['degree'] = -1
+
+    for link in network['links']:
+        link['source'] = link['node1']
+        link['target'] = link['node2']
+
+    network['adjacent_nodes'] = {}
+
+    clusters, nodes = get_clusters_data(nodes)
+    # json keys are strings, so compiling a loaded network gives the same clusters
+    network['clusters'] = {str(cluster_id): cluster for cluster_id, cluster in clusters.items()}
+    network['nodes'] = nodes
+    return network
+
+
+def compact_network(network):
+    """
+    Returns a compiled network without pretty printing: links reference their nodes by index
+    in network['nodes'] instead of repeating the names in node1, node2, source, and target
+    :param network: dict, compiled network
+    :return: dict
+    """
+    node_idxs = {node['name']: node_idx for node_idx, node in enumerate(network['nodes'])}
+    links = []
+    for link in network['links']:
+        compact_link = {key: value for key, value in link.items()
+                        if key not in {'node1', 'node2', 'source', 'target'}}
+        compact_link['source'] = node_idxs[link['node1']]
+        compact_link['target'] = node_idxs[link['node2']]
+        links.append(compact_link)
+    return {**network, 'links': links}
+
+
+def compact_network_path(json_path):
+    """
+    Returns the path of the compact version of a network file
+    :param json_path: Path, e.g. backend/data/person_sterling.json
+    :return: Path, e.g. backend/data/person_sterling.compact.json
+    """
+    return Path(json_path).with_suffix(COMPACT_SUFFIX)
+
+
+def compress_payload(payload, content_encoding):
+    """
+    Compresses a payload with the highest compression level. The gzip header has no
+    modification time, so the same payload always gives the same bytes.
+    :param payload: bytes
+    :param content_encoding: str, 'br' or 'gzip'
+    :return: bytes
+    """
+    if content_encoding == 'br':
+        return brotli.compress(payload, quality=11)
+    compressed = io.BytesIO()
+    with gzip.GzipFile(filename='', mode='wb', fileobj=compressed, mtime=0) as gzip_file:
+        gzip_file.write(payload)
+    return compressed.getvalue()
+
+
+def store_network_file(network, out_path):
+    """
+    Compiles a network and stores it as json, along with its compact version and the
+    compressed copies of the compact version
+    :param network: dict with name, nodes, links, and center_names
+    :param out_path: Path
+    :return:
+    """
+    network = compile_network_for_visualization(network)
+    with open(out_path, 'w') as out:
+        json.dump(network, out, sort_keys=True, indent=4)
+
+    compact_path = compact_network_path(out_path)
+    payload = json.dumps(compact_network(network), sort_keys=True,
+                         separators=(',', ':')).encode('utf-8')
+    compact_path.write_bytes(payload)
+    for content_encoding, suffix in COMPRESSED_SUFFIXES.items():
+        Path(f'{compact_path}{suffix}').write_bytes(compress_payload(payload, content_encoding))
+
+
+def precompile_network_files(json_paths=None):
+    """
+    Compiles network files in place
+    :param json_paths: list of Path, defaults to the person networks in backend/data
+    :return:
+    """
+    if json_paths is None:
+        json_paths = sorted(json_path for json_path in BACKEND_DATA_PATH.glob('person_*.json')
+                            if not json_path.name.endswith(COMPACT_SUFFIX))
+    for json_path in json_paths:
+        with open(json_path) as json_file:
+            network = json.load(json_file)
+        store_network_file(network, json_path)
+
+
+def get_clusters_data(nodes): # pylint: disable=R0914
+    """
+    Forms and organizes clusters based on node data. Assigns each nodes to a cluster
+
+    idea: each group takes up space proportionally on a 360 degree unit circle
+    the goal is to calculate where the center of each node cluster is on the unit circle
+
+    Each cluster consists of:
+    id: int
+    name: cluster name, eg. Lorillard
+    count: number of nodes in cluster
+    x_pos: relative position on x-axis, between 0 and 1
+    y_pos: relative position on y-axis, between 0 and 1
+    color: RGB color, array of 3 values between 0 and 255
+
+    returns: tuple(dict, list)
+    """
+
+    affiliations = Counter()
+    for node in nodes:
+        affiliations[node['affiliation']] += 1
+
+    no_pos_available_count = 0
+    if 'No Positions Available' in affiliations:
+        no_pos_available_count = affiliations['No Positions Available']
+        del affiliations['No Positions Available']
+
+    most_common_affiliations = affiliations.most_common()[:9]
+
+    # if more than 9 affiliations, put the ones outside the top 9 into an "others" group
+    others_group = set()
+    if len(affiliations) > 9:
+        others_group_count = 0
+        for affiliation, aff_count in affiliations.most_common()[9:]:
+            others_group.add(affiliation)
+            others_group_count += aff_count
+
+        most_common_affiliations += [('Others', others_group_count)]
+
+    # put "No Positions Available" at the end of the list, after "Others"
+    if no_pos_available_count > 0:
+        most_common_affiliations += [('No Positions Available', no_pos_available_count)]
+
+
+    # colormap. 9 affiliations + "Others" + "No Positions Available" need 11 colors
+    bmap = [
+        (53, 132, 187),
+        (255, 140, 38),
+        (65, 169, 65),
+        (218, 61, 61),
+        (158, 118, 195),
+        (151, 103, 93),
+        (229, 132, 200),
+        (140, 140, 140),
+        (194, 195, 56),
+        (46, 196, 211),
+        (200, 200, 200)
+    ][:len(most_common_affiliations)]
+
+
+    # Place clusters on unit circle
+    clusters = {}
+    cur_unit_circle_pos_in_degrees = 0
+    for affiliation_id, affiliation in enumerate(most_common_affiliations):
+        affilation_name, affiliation_count = affiliation
+
+        degrees_taken_by_affiliation = (affiliation_count / len(nodes) * 360 / 2)
+        degrees_taken_by_affiliation += 360 / len(most_common_affiliations) / 2
+        affiliation_center = cur_unit_circle_pos_in_degrees + degrees_taken_by_affiliation / 2
+        cur_unit_circle_pos_in_degrees += degrees_taken_by_affiliation
+
+        x_unit_circle = math.sin(affiliation_center * math.pi/180)
+        y_unit_circle = math.cos(affiliation_center * math.pi/180)
+        x_display_window = 0.5 - 0.5 * x_unit_circle
+        y_display_window = 0.5 - 0.5 * y_unit_circle
+
+        clusters[affiliation_id] = {
+            'id': affiliation_id,
+            'name': affilation_name,
+            'count': affiliation_count,
+            'x_pos': x_display_window,
+            'y_pos': y_display_window,
+            'color': f'rgb({",".join([str(i) for i in bmap[affiliation_id]])})'
+        }
+
+    # assign each node to a cluster.
+    # first create a map from affiliation to cluster
+    affiliation_to_cluster_dict = {
+        'No Positions Available': len(clusters) -1
+    }
+    for cluster in clusters.values():
+        affiliation_to_cluster_dict[cluster['name']] = cluster['id']
+    for affiliation in others_group:
+        affiliation_to_cluster_dict[affiliation] = affiliation_to_cluster_dict['Others']
+
+    for node in nodes:
+        node['cluster'] = affiliation_to_cluster_dict[node['affiliation']]
+
+    return clusters, nodes
+
+
+class TestNetworkVisualization(unittest.TestCase):
+    """
+    Tests compiling networks for the frontend
+    """
+
+    def test_compile(self):
+        """
+        Compiled networks have sources, targets, degrees, and clusters, and compiling them
+        again doesn't change them
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = Path(tmp_dir, 'person_sterling.json')
+            shutil.copy(BACKEND_DATA_PATH / 'person_sterling.json', json_path)
+            precompile_network_files([json_path])
+            compiled = json_path.read_text()
+            precompile_network_files([json_path])
+            self.assertEqual(json_path.read_text(), compiled)
+
+        network = json.loads(compiled)
+        self.assertTrue(all(link['source'] == link['node1'] and link['target'] == link['node2']
+                            for link in network['links']))
+        self.assertTrue(all(node['degree'] == -1 and str(node['cluster']) in network['clusters']
+                            for node in network['nodes']))
+        self.assertEqual(sum(cluster['count'] for cluster in network['clusters'].values()),
+                         len(network['nodes']))
+
+    def test_compact(self):
+        """
+        Compact networks reference nodes by index, and their compressed copies have the same
+        content
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = Path(tmp_dir, 'person_sterling.json')
+            shutil.copy(BACKEND_DATA_PATH / 'person_sterling.json', json_path)
+            precompile_network_files([json_path])
+            network = json.loads(json_path.read_text())
+            compact_path = compact_network_path(json_path)
+            payload = compact_path.read_bytes()
+            self.assertEqual(gzip.decompress(Path(f'{compact_path}.gz').read_bytes()), payload)
+            self.assertEqual(brotli.decompress(Path(f'{compact_path}.br').read_bytes()), payload)
+            self.assertLess(len(payload), json_path.stat().st_size / 2)
+
+        compact = json.loads(payload)
+        self.assertEqual(compact['nodes'], network['nodes'])
+        self.assertEqual(compact['clusters'], network['clusters'])
+        for link, compact_link in zip(network['links'], compact['links']):
+            self.assertEqual(compact['nodes'][compact_link['source']]['name'], link['source'])
+            self.assertEqual(compact['nodes'][compact_link['target']]['name'], link['target'])
+            self.assertEqual(compact_link['docs'], link['docs'])
+            self.assertNotIn('node1', compact_link)
+
+
+if __name__ == '__main__':
+    unittest.main()
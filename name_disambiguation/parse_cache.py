@@ -0,0 +1,233 @@
+"""
+Bounded, persistent cache of parsed raw names.
+
+The same raw names ('DUNN,WL', 'Hetsko-CF, American Brands Inc') appear thousands of times in
+the document csvs and name files. ParseCache runs Person.parse_raw_name and
+check_if_this_person_looks_valid once per raw name and keeps the result. The cache can be
+stored to disk and reused by the next run. Parsing depends on the org dictionary, so a stored
+cache is discarded when clean_org_names_to_raw_org_names.json has changed since.
+
+>>> parse_cache = get_parse_cache()                # doctest: +SKIP
+>>> first, middle, last, positions = parse_cache.parse('Teague, CE', count=3)   # doctest: +SKIP
+>>> parse_cache.store()                             # doctest: +SKIP
+"""
+
+import hashlib
+import pickle
+import tempfile
+import unittest
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+from name_disambiguation.clean_org_names import CLEAN_ORG_NAMES_PATH
+from name_disambiguation.config import DATA_PATH
+from name_disambiguation.person import Person
+
+PARSE_CACHE_PATH = Path(DATA_PATH, 'name_disambiguation', 'parse_cache.pickle')
+PARSE_CACHE_FORMAT_VERSION = 1
+
+_DEFAULT_PARSE_CACHE = None
+
+
+def get_parse_cache():
+    """
+    Returns the shared parse cache, loaded from PARSE_CACHE_PATH on first use
+    :return: ParseCache
+    """
+    global _DEFAULT_PARSE_CACHE     # pylint: disable=W0603
+    if _DEFAULT_PARSE_CACHE is None:
+        _DEFAULT_PARSE_CACHE = ParseCache(PARSE_CACHE_PATH)
+    return _DEFAULT_PARSE_CACHE
+
+
+def get_org_dict_fingerprint(org_dict_path=CLEAN_ORG_NAMES_PATH):
+    """
+    Returns the sha256 hash of the org dictionary file
+    :param org_dict_path: Path
+    :return: str
+    """
+    with open(org_dict_path, 'rb') as infile:
+        return hashlib.sha256(infile.read()).hexdigest()
+
+
+class ParseCache:
+    """
+    Maps raw names to (first, middle, last, positions, valid). positions are the positions of
+    parse_raw_name(name_raw, count=1) as a tuple of (position, count) pairs. They get scaled by
+    the count of each lookup.
+    When more than max_size names are cached, the least recently used ones get dropped.
+    Names that can't be parsed (parse_raw_name raises) are not cached.
+
+    Attributes:
+        hits (int): number of lookups answered from the cache
+        misses (int): number of lookups that had to parse the name
+    """
+
+    def __init__(self, file_path=None, max_size=500000, org_dict_path=CLEAN_ORG_NAMES_PATH):
+        """
+        Creates a parse cache and loads the stored entries of file_path if it exists and was
+        stored with the current org dictionary
+
+        :param file_path: Path, where the cache gets stored. None for an in-memory cache
+        :param max_size: int, maximum number of cached names
+        :param org_dict_path: Path of the org dictionary that parse_raw_name uses
+        """
+        self.file_path = None if file_path is None else Path(file_path)
+        self.max_size = max_size
+        self.org_dict_fingerprint = get_org_dict_fingerprint(org_dict_path)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+        if self.file_path is not None and self.file_path.exists():
+            with open(self.file_path, 'rb') as infile:
+                stored = pickle.load(infile)
+            if (
+                    stored.get('format_version') == PARSE_CACHE_FORMAT_VERSION and
+                    stored.get('org_dict_fingerprint') == self.org_dict_fingerprint
+            ):
+                self._entries.update(stored['entries'][-max_size:])
+            else:
+                print(f"Discarding parse cache {self.file_path}: the org dictionary has changed.")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name_raw):
+        return name_raw in self._entries
+
+    @property
+    def hit_rate(self):
+        """
+        Fraction of lookups answered from the cache (0 if there were no lookups)
+        :return: float
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        """
+        Returns a summary of the cache usage, e.g.
+        'parse cache: 9000 hits, 1000 misses (90.0% hit rate), 1000 names cached'
+        :return: str
+        """
+        return (f"parse cache: {self.hits} hits, {self.misses} misses "
+                f"({100 * self.hit_rate:.1f}% hit rate), {len(self)} names cached")
+
+    def _lookup(self, name_raw):
+        """
+        Returns the cache entry of name_raw, parsing the name if it isn't cached yet
+        :param name_raw: str
+        :return: tuple (first, middle, last, positions, valid)
+        """
+        entry = self._entries.get(name_raw)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(name_raw)
+            return entry
+
+        self.misses += 1
+        first, middle, last, positions = Person.parse_raw_name(name_raw, 1)
+        valid = Person(last=last, first=first, middle=middle).check_if_this_person_looks_valid()
+        entry = (first, middle, last, tuple(positions.items()), valid)
+        self._entries[name_raw] = entry
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def parse(self, name_raw, count=1):
+        """
+        Cached version of Person.parse_raw_name(name_raw, count)
+        :param name_raw: str
+        :param count: int
+        :return: str, str, str, Counter (first name, middle name, last name, positions Counter)
+        """
+        first, middle, last, positions, _ = self._lookup(name_raw)
+        return first, middle, last, Counter({position: position_count * count
+                                             for position, position_count in positions})
+
+    def looks_valid(self, name_raw):
+        """
+        Cached version of Person(name_raw=name_raw).check_if_this_person_looks_valid()
+        :param name_raw: str
+        :return: bool
+        """
+        return self._lookup(name_raw)[4]
+
+    def store(self, file_path=None):
+        """
+        Stores the cached names, the org dictionary fingerprint, and the format version
+        :param file_path: Path, defaults to the file_path of the cache
+        :return:
+        """
+        file_path = self.file_path if file_path is None else Path(file_path)
+        if file_path is None:
+            raise ValueError("This parse cache has no file path to store it to.")
+        with open(file_path, 'wb') as outfile:
+            pickle.dump({
+                'format_version': PARSE_CACHE_FORMAT_VERSION,
+                'org_dict_fingerprint': self.org_dict_fingerprint,
+                'entries': list(self._entries.items()),
+            }, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class TestParseCache(unittest.TestCase):
+    """
+    Tests that the parse cache returns the same results as parse_raw_name and that it gets
+    bounded, stored, and invalidated correctly
+    """
+
+    names = ['Dunn, WL', 'DUNN,WL', 'Hetsko-CF, American Brands Inc', 'TEAGUE CE JR',
+             'Henson, A (Chadbourne & Park)', 'HOLMAN RT, DEUEL CONFERENCE ON LIPIDS',
+             'US HOUSE COMM ON INTERSTATE AND FOREIGN COMMERCE', 'Dunn, WL']
+
+    def test_same_as_parse_raw_name(self):
+        """
+        Cached results are the same as the ones of parse_raw_name for any count
+        """
+        parse_cache = ParseCache()
+        for count in [1, 3, 1]:
+            for name in self.names:
+                self.assertEqual(parse_cache.parse(name, count),
+                                 Person.parse_raw_name(name, count))
+                self.assertEqual(parse_cache.looks_valid(name),
+                                 Person(name_raw=name).check_if_this_person_looks_valid())
+        unique_names = len(set(self.names))
+        self.assertEqual(parse_cache.misses, unique_names)
+        self.assertEqual(parse_cache.hits, 6 * len(self.names) - unique_names)
+
+    def test_max_size(self):
+        """
+        Only the max_size most recently used names stay in the cache
+        """
+        parse_cache = ParseCache(max_size=2)
+        for name in ['Dunn, WL', 'Teague, CE', 'Dunn, WL', 'Risi, S']:
+            parse_cache.parse(name)
+        self.assertEqual(len(parse_cache), 2)
+        self.assertIn('Dunn, WL', parse_cache)
+        self.assertNotIn('Teague, CE', parse_cache)
+
+    def test_store_and_invalidate(self):
+        """
+        A stored cache gets loaded again unless the org dictionary has changed
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = Path(tmp_dir, 'parse_cache.pickle')
+            org_dict_path = Path(tmp_dir, 'clean_org_names_to_raw_org_names.json')
+            org_dict_path.write_text('{"Brown & Williamson": ["B&W"]}')
+
+            parse_cache = ParseCache(file_path, org_dict_path=org_dict_path)
+            parse_cache.parse('Dunn, WL')
+            parse_cache.store()
+
+            loaded_cache = ParseCache(file_path, org_dict_path=org_dict_path)
+            self.assertEqual(loaded_cache.parse('Dunn, WL', 2),
+                             Person.parse_raw_name('Dunn, WL', 2))
+            self.assertEqual((loaded_cache.hits, loaded_cache.misses), (1, 0))
+
+            org_dict_path.write_text('{"Brown & Williamson": ["B&W", "BW"]}')
+            self.assertEqual(len(ParseCache(file_path, org_dict_path=org_dict_path)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
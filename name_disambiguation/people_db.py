@@ -1,23 +1,35 @@
 """
 The People Database provides a class to add and merge persons
 """
+# pylint: disable=C0302
 
 import copy
 import csv
+import heapq
 import itertools
+import os
 import pickle
+import tempfile
 import unittest
 from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from nameparser.config import CONSTANTS  # pylint: disable=C0411
 
+from name_disambiguation.alias_index import AliasIndex, alias_index_path, write_alias_index
 from name_disambiguation.clean_org_names import RAW_ORG_TO_CLEAN_ORG_DICT
 from name_disambiguation.config import COMPANY_ABBREVIATIONS_TO_SKIP, MANUALLY_MERGED_NAMES
+from name_disambiguation.people_db_format import (is_columnar_people_db_file,
+                                                  read_people_db_columns,
+                                                  write_people_db_columns)
 from name_disambiguation.person import Person
+from name_disambiguation.union_find import UnionFind
 
 CONSTANTS.titles.remove(*CONSTANTS.titles)
 
+MERGE_ENGINES = ('iterative', 'union_find')
+
 
 class PeopleDatabase:
     """
@@ -32,13 +44,35 @@ class PeopleDatabase:
         """
         self.people = set()
         self._alias_to_person_dict = {}
+        # last name -> list of people with that last name. These are the blocks that
+        # merge_duplicates works on. Kept up to date by add_person_raw and merge_two_persons
+        self._last_name_to_people = defaultdict(list)
         self.raw_org_to_clean_org_dict = RAW_ORG_TO_CLEAN_ORG_DICT.copy()
 
-    def add_person_raw(self, name_raw: str, count=1, position=None):
+    def __getstate__(self):
+        """
+        The last name index only holds references to self.people, so we don't pickle it
+        :return: dict
+        """
+        state = self.__dict__.copy()
+        state.pop('_last_name_to_people', None)
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled PeopleDatabase and rebuilds its last name index
+        :param state: dict
+        :return:
+        """
+        self.__dict__.update(state)
+        self.generate_last_name_index()
+
+    def add_person_raw(self, name_raw: str, count=1, position=None, parsed_name=None):
         """
         Adds Person object to the database from a raw name string & count
         :param name_raw: raw name (str)
         :param count: number of times name_raw appeared (int)
+        :param parsed_name: Person.parse_raw_name(name_raw, count) if name_raw was already parsed
         :return: None
         """
         try:
@@ -52,14 +86,13 @@ class PeopleDatabase:
             else:
                 positions = Counter()
 
-            new_p = Person(name_raw=name_raw, count=count, positions=positions)
+            new_p = Person(name_raw=name_raw, count=count, positions=positions,
+                           parsed_name=parsed_name)
 
             # if the raw name is already in the people_db, merge the entries
             existing_p = self.get_person_from_alias(name_raw)
             if existing_p:
-                # remove person temporarily as the hash value will change with the updates
-                # making it impossible to remove later
-                self.people.remove(existing_p)
+                # the hash of a person doesn't depend on its data -> update it in place
                 existing_p.positions += new_p.positions
                 existing_p.aliases += new_p.aliases
                 existing_p.count += new_p.count
@@ -67,7 +100,6 @@ class PeopleDatabase:
                 self.add_alias_to_alias_to_person_dict(name_raw, existing_p)
                 if not self.get_person_from_alias(existing_p.full_name):
                     self.add_alias_to_alias_to_person_dict(existing_p.full_name, existing_p)
-                self.people.add(existing_p)
 
                 # add any new organizations to the raw_org_to_clean_dict
                 for pos in existing_p.positions:
@@ -76,6 +108,7 @@ class PeopleDatabase:
 
             else:
                 self.people.add(new_p)
+                self._add_to_last_name_index(new_p)
                 self.add_alias_to_alias_to_person_dict(name_raw, new_p)
                 if not self.get_person_from_alias(new_p.full_name):
                     self.add_alias_to_alias_to_person_dict(new_p.full_name, new_p)
@@ -98,15 +131,9 @@ class PeopleDatabase:
         """
         Compares two PeopleDatabase objects
         :param other: another PeopleDatabase object
-        :return: bool (if the people sets are the same)
+        :return: bool (if the people sets are the same, i.e. contain the same person_ids)
         """
-        hash1 = []
-        hash2 = []
-        for person in sorted(list(self.people)):
-            hash1.append(hash(person))
-        for person in sorted(list(other.people)):
-            hash2.append(hash(person))
-        return sorted(hash1) == sorted(hash2)
+        return self.people == other.people
 
     def __repr__(self):
         """
@@ -123,6 +150,7 @@ class PeopleDatabase:
         """
         people_db_copy = PeopleDatabase()
         people_db_copy.people = copy.deepcopy(self.people)
+        people_db_copy.generate_last_name_index()
         return people_db_copy
 
     @property
@@ -155,30 +183,102 @@ class PeopleDatabase:
         #         alias_to_person[alias] = person
         # return alias_to_person
 
+    def generate_last_name_index(self):
+        """
+        Generates the _last_name_to_people index from scratch. Only necessary if self.people
+        was changed directly, add_person_raw and merge_two_persons keep the index up to date.
+        :return:
+        """
+        self._last_name_to_people = defaultdict(list)
+        for person in self.people:
+            self._last_name_to_people[person.last].append(person)
+
+    def _add_to_last_name_index(self, person: Person):
+        """
+        Adds a person to the block of its last name
+        :param person: Person
+        :return:
+        """
+        self._last_name_to_people[person.last].append(person)
+
+    def _remove_from_last_name_index(self, person: Person):
+        """
+        Removes a person from the block of its last name. Compares by identity because people
+        with the same names, positions, and aliases compare as equal.
+        :param person: Person
+        :return:
+        """
+        block = self._last_name_to_people[person.last]
+        for idx, block_person in enumerate(block):
+            if block_person is person:
+                del block[idx]
+                break
+        if not block:
+            del self._last_name_to_people[person.last]
+
     def store_to_disk(self, file_path: Path):
         """
-        Stores a people db to disk as a pickle file
-        :param file_path: Path for storing pickle file
+        Stores a people db to disk in the columnar format of people_db_format.py, including the
+        alias index. Also writes a memory-mapped alias index (see open_alias_index).
+        :param file_path: Path for storing the people db (.npz)
         :return:
         """
 
-        with open(str(file_path), 'wb') as outfile:
-            pickle.dump(self, outfile)
+        people = list(self.people)
+        write_people_db_columns(file_path, people, self._alias_to_person_dict)
+
+        person_to_row = {person: row for row, person in enumerate(people)}
+        write_alias_index(alias_index_path(file_path), {
+            alias: (person_to_row[person], person.person_id)
+            for alias, person in self._alias_to_person_dict.items()
+        })
 
     def load_from_disk(self, file_path: Path):
         """
-        Load a people db from a pickle file
-        :param file_path: Path of pickle file
+        Load a people db stored with store_to_disk.
+        Legacy pickle files also get loaded, but they need to be post-processed (see
+        load_from_pickle). Use convert_people_db_pickle to convert them.
+        :param file_path: Path of people db file
         :return:
         """
 
+        if not is_columnar_people_db_file(file_path):
+            self.load_from_pickle(file_path)
+            return
+
+        people, self._alias_to_person_dict = read_people_db_columns(file_path)
+        self.people = set(people)
+        self.raw_org_to_clean_org_dict = RAW_ORG_TO_CLEAN_ORG_DICT.copy()
+        self.generate_last_name_index()
+
+    @staticmethod
+    def open_alias_index(file_path: Path):
+        """
+        Opens the memory-mapped alias index of a people db stored with store_to_disk.
+        It looks up the person_ids (and rows in the people db file) of aliases without loading
+        the people db, e.g.
+        with PeopleDatabase.open_alias_index(file_path) as alias_index:
+            alias_index.get_person_id('Dunn, WL')
+
+        :param file_path: Path of the people db file
+        :return: AliasIndex
+        """
+        return AliasIndex(alias_index_path(file_path))
+
+    def load_from_pickle(self, file_path: Path):
+        """
+        Load a people db from a legacy pickle file.
+        Removes company accounts and applies the manually merged names.
+        :param file_path: Path of pickle file
+        :return:
+        """
 
         with open(str(file_path), 'rb') as infile:
-            loaded_db = pickle.load(infile)
+            loaded_db = _PeopleDatabaseUnpickler(infile).load()
 
             self.people = set()
             self._alias_to_person_dict = {}
-            self.raw_org_to_clean_org_dict = RAW_ORG_TO_CLEAN_ORG_DICT
+            self.raw_org_to_clean_org_dict = RAW_ORG_TO_CLEAN_ORG_DICT.copy()
             for person in loaded_db.people:
 
                 # our main person db has some company accounts in there -> delete
@@ -200,11 +300,11 @@ class PeopleDatabase:
                     self.people.add(person)
 
 
+            self.generate_last_name_index()
             self.generate_alias_to_person_dict()
             self.add_manually_merged_names()
             self.generate_alias_to_person_dict()
 
-
     def add_alias_to_alias_to_person_dict(self, alias: str, person: Person): # pylint: disable=C0103
         """
         Adds an alias to the _alias_to_person_dict, making the alias lower case and removing
@@ -265,9 +365,9 @@ class PeopleDatabase:
                     if person1 != person2:
                         self.merge_two_persons(person1, person2, person['authoritative_name'])
                     else:
-                        # temporarily remove person1 because we're messing with the hash key
-                        # and couldn't remove it later
-                        self.people.remove(person1)
+                        # people hash by their person_id, so person1 stays in self.people, but
+                        # the last name index has to move it to its new last name
+                        self._remove_from_last_name_index(person1)
                         person1.first = person['authoritative_name']['first']
                         person1.middle = person['authoritative_name']['middle']
                         person1.last = person['authoritative_name']['last']
@@ -276,7 +376,7 @@ class PeopleDatabase:
                         for alias in person1.aliases:
                             self.add_alias_to_alias_to_person_dict(alias, person1)
                         self.add_alias_to_alias_to_person_dict(person1.full_name, person1)
-                        self.people.add(person1)
+                        self._add_to_last_name_index(person1)
 
                 else:
                     # print(f'Could not find {alias1} or {alias2} in people db')
@@ -308,7 +408,8 @@ class PeopleDatabase:
                 writer.writerow({'Raw Name': organization, 'Count': positions_counter[
                     organization], 'Authoritative Name': authoritative_name})
 
-    def merge_duplicates(self, print_merge_results_for_name='Dunn', manual_merge=False):
+    def merge_duplicates(self, print_merge_results_for_name='Dunn', manual_merge=False,  # pylint: disable=R0913
+                         engine='iterative', parallel=False, max_workers=None):
         """
         Tries to merge all duplicates and only retain authoritative names.
         e.g. it will try to merge WL Dunn and William Dunn into Dunn, William L
@@ -318,37 +419,130 @@ class PeopleDatabase:
         if manual_merge = True, user will be prompted to decide for all last names if they should
         be merged manually. useful for small networks for display purposes.
 
+        engine selects how each last name gets merged:
+        'iterative' (merge_last_name) merges one pair at a time and rescans the last name after
+        every merge.
+        'union_find' (merge_last_name_union_find) evaluates every pair once, which is much
+        faster for common last names. Because it evaluates pairs in a different order, it can
+        occasionally merge differently.
+
+        if parallel = True, the last names get merged in a pool of max_workers processes (see
+        merge_last_names_in_parallel).
+
         :param print_merge_results_for_name: str
         :param manual_merge: bool
+        :param engine: str, 'iterative' or 'union_find'
+        :param parallel: bool
+        :param max_workers: int, number of processes for parallel merging (default: all cores)
         :return:
         """
 
-        last_names = set()
-        for person in self.people:
-            last_names.add(person.last)
+        if engine not in MERGE_ENGINES:
+            raise ValueError(f"engine has to be one of {MERGE_ENGINES}.")
 
-        for last_name in sorted(last_names):
-            while True:
-                last_names_dict = defaultdict(list)
-                for person in self.people:
-                    last_names_dict[person.last].append(person)
+        # people may have been added to self.people directly -> index them once
+        self.generate_last_name_index()
 
-                finished = self.merge_last_name(last_names_dict, last_name)
-                if finished:
-                    if (
-                            print_merge_results_for_name and
-                            len(last_names_dict[last_name]) > 5
-                            # last_name.lower().find(print_merge_results_for_name.lower()) > -1
-                    ):
-                        print("\nSUMMARY")
-                        for name in last_names_dict[last_name]:
-                            print("\n", name.count, name, name.aliases.most_common(100))
-                        print("\n")
-                    break
+        if parallel:
+            self.merge_last_names_in_parallel(print_merge_results_for_name, engine, max_workers)
+        else:
+            self.merge_last_names(print_merge_results_for_name, engine)
 
         if manual_merge:
             self.manually_merge_db()
 
+    def merge_last_names(self, print_merge_results_for_name='Dunn', engine='iterative',
+                         last_names=None):
+        """
+        Merges the people of every last name in self._last_name_to_people with the selected
+        merge engine, in alphabetical order of the last names.
+        If last_names is given, only those blocks get merged, e.g. the last names of people that
+        were added since the last merge.
+
+        :param print_merge_results_for_name: str
+        :param engine: str, 'iterative' or 'union_find'
+        :param last_names: iterable of str (upper case last names) or None for all last names
+        :return:
+        """
+
+        last_names_dict = self._last_name_to_people
+        if last_names is None:
+            last_names = last_names_dict
+        else:
+            last_names = [last_name for last_name in set(last_names)
+                          if last_name in last_names_dict]
+
+        # merges only ever join people within the same block and merge_two_persons updates
+        # the block in place, so we never have to go back to the whole db
+        for last_name in sorted(last_names):
+            if engine == 'union_find':
+                self.merge_last_name_union_find(last_names_dict, last_name)
+            else:
+                while not self.merge_last_name(last_names_dict, last_name):
+                    pass
+
+            if (
+                    print_merge_results_for_name and
+                    len(last_names_dict[last_name]) > 5
+                    # last_name.lower().find(print_merge_results_for_name.lower()) > -1
+            ):
+                print("\nSUMMARY")
+                for name in last_names_dict[last_name]:
+                    print("\n", name.count, name, name.aliases.most_common(100))
+                print("\n")
+
+    def merge_last_names_in_parallel(self, print_merge_results_for_name='Dunn',  # pylint: disable=R0914
+                                     engine='iterative', max_workers=None):
+        """
+        Merges all last names in a ProcessPoolExecutor.
+        Merges only ever join people with the same last name, so the last names are split into
+        shards that get merged independently. Afterwards, the merged people and their aliases
+        replace those of the shard in this db.
+
+        People in shards come back as new (unpickled) objects, so references to them from outside
+        the db will be outdated.
+
+        :param print_merge_results_for_name: str
+        :param engine: str, 'iterative' or 'union_find'
+        :param max_workers: int, number of processes (default: all cores)
+        :return:
+        """
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+
+        # last names with only one person don't need merging. the rest gets split into more
+        # shards than workers so a slow shard doesn't hold up everyone else
+        blocks = [block for block in self._last_name_to_people.values() if len(block) > 1]
+        shards = split_blocks_into_shards(blocks, n_shards=max_workers * 4)
+
+        # every shard gets the aliases of its people
+        person_to_shard = {id(person): shard_idx
+                           for shard_idx, shard in enumerate(shards)
+                           for block in shard for person in block}
+        shard_aliases = [{} for _ in shards]
+        for alias, person in self._alias_to_person_dict.items():
+            if id(person) in person_to_shard:
+                shard_aliases[person_to_shard[id(person)]][alias] = person
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(_merge_shard, shards, shard_aliases,
+                                   itertools.repeat(engine),
+                                   itertools.repeat(print_merge_results_for_name))
+
+            for shard, aliases, (merged_people, merged_aliases) in zip(shards, shard_aliases,
+                                                                      results):
+                for block in shard:
+                    for person in block:
+                        self.people.remove(person)
+                for alias in aliases:
+                    del self._alias_to_person_dict[alias]
+
+                self.people.update(merged_people)
+                self._alias_to_person_dict.update(merged_aliases)
+
+        self.generate_last_name_index()
+
     def manually_merge_db(self):
         """
         Manually merge the names in the database.
@@ -420,7 +614,8 @@ class PeopleDatabase:
         """
         Iteratively tries to merge last names from the most common to the least common
         Returns true if it is finished,
-        :param last_names_dict: dict mapping last_name strings to list of
+        :param last_names_dict: dict mapping last_name strings to list of people. Usually
+        self._last_name_to_people, which merge_two_persons keeps up to date.
         :param last_name:
         :return:
         """
@@ -436,73 +631,134 @@ class PeopleDatabase:
 
                 # p1/2_idx indicate the index of the person. If they are the same, we are dealing
                 # with the same person and should skip.
-                if person1_idx == person2_idx:                               # pylint: disable=R1724
+                if person1_idx == person2_idx:
                     continue
 
-                # If p1 and person2 share at least one alias, we can merge them
-                # the primary use of this is to merge cases where the same author was added
-                # multiple times
-                elif len(set(person1.aliases).intersection(set(person2.aliases))) > 0:
+                if self.should_merge(person1, person2):
                     self.merge_two_persons(person1, person2)
-                    return False
+                    return False    # we're not finished -> return False
+
+        # if no merges could be made return True to indicate that merge process is finished
+        return True
 
+    def merge_last_name_union_find(self, last_names_dict, last_name):  # pylint: disable=R0914
+        """
+        Merges everyone with last_name in one pass: every pair gets evaluated with should_merge
+        once (from the most common to the least common person, like merge_last_name), the
+        decisions get recorded in a UnionFind, and the merged people only get created at the end.
 
-                # if no first and middle name -> continue
-                elif person1.first == '' and person1.middle == '':
-                    continue
-                elif person2.first == '' and person2.middle == '':
-                    continue
+        Pairs are compared using the merged names and aliases of their groups so far, not the
+        original people. Otherwise, "Dunn, W" would chain "Dunn, William" and "Dunn, Walter"
+        into one person, which merge_last_name never does.
 
-                # if first and middle names match -> merge
-                elif person1.first == person2.first and person1.middle == person2.middle:
-                    self.merge_two_persons(person1, person2)
-                    return False
+        :param last_names_dict: dict mapping last_name strings to list of people
+        :param last_name: str
+        :return:
+        """
 
-                # if both have full first names and they don't match -> skip
-                elif (
-                        len(person1.first) > 2 and len(person2.first) > 2 and
-                        person1.first != person2.first
-                ):
-                    continue
+        block = sorted(last_names_dict[last_name], key=lambda x: x.count, reverse=True)
+        if len(block) < 2:
+            return
+
+        union_find = UnionFind(len(block))
+        # merged names and aliases of every group, stored at the index of the group's root
+        group_names = [_MergedNames(person.first, person.middle, set(person.aliases))
+                       for person in block]
+
+        for idx1 in range(len(block)):
+            for idx2 in range(idx1 + 1, len(block)):
+                root1 = union_find.find(idx1)
+                root2 = union_find.find(idx2)
+                if root1 != root2 and self.should_merge(group_names[root1], group_names[root2]):
+                    first, middle = self.merged_first_and_middle(group_names[root1],
+                                                                 group_names[root2])
+                    aliases = group_names[root1].aliases | group_names[root2].aliases
+                    group_names[union_find.union(root1, root2)] = _MergedNames(first, middle,
+                                                                               aliases)
+
+        for group in union_find.groups():
+            merged_person = block[group[0]]
+            for idx in group[1:]:
+                merged_person = self.merge_two_persons(merged_person, block[idx])
+
+    @staticmethod
+    def should_merge(person1, person2):                                 # pylint: disable=R0911
+        """
+        Returns True if person1 and person2 (with the same last name) should get merged.
+        These are the pairwise rules of both merge engines.
 
-                # if both have full middle names and they don't match -> skip
-                elif (
-                        len(person1.middle) > 2 and len(person2.middle) > 2 and
-                        person1.middle != person2.middle
-                ):
-                    continue
+        :param person1: Person (or any object with first, middle, and aliases)
+        :param person2: Person (or any object with first, middle, and aliases)
+        :return: bool
+        """
 
-                # if initial of the first name is not the same -> skip
-                elif person1.first and person2.first and person1.first[0] != person2.first[0]:
-                    continue
+        # If p1 and person2 share at least one alias, we can merge them
+        # the primary use of this is to merge cases where the same author was added
+        # multiple times
+        if len(set(person1.aliases).intersection(set(person2.aliases))) > 0:
+            return True
 
-                # if both have at least first and middle initials
-                elif person1.first and person1.middle and person2.first and person2.middle:
-                    if (
-                            person1.first[0] != person2.first[0] or
-                            person1.middle[0] != person2.middle[0]
-                    ):
-                        continue
+        # if no first and middle name -> continue
+        elif person1.first == '' and person1.middle == '':
+            return False
+        elif person2.first == '' and person2.middle == '':
+            return False
 
-                    # if first and middle initials match -> merge
-                    if (
-                            person1.first[0] == person2.first[0] and
-                            person1.middle[0] == person2.middle[0]
-                    ):
-                        self.merge_two_persons(person1, person2)
-                        return False    # we're not finished -> return False
+        # if first and middle names match -> merge
+        elif person1.first == person2.first and person1.middle == person2.middle:
+            return True
 
-                elif len(person1.first) == 1 and not person1.middle:
-                    # TODO
-                    continue
-                elif len(person2.first) == 1 and not person2.middle:
-                    # TODO
-                    continue
-                else:
-                    continue
+        # if both have full first names and they don't match -> skip
+        elif (
+                len(person1.first) > 2 and len(person2.first) > 2 and
+                person1.first != person2.first
+        ):
+            return False
+
+        # if both have full middle names and they don't match -> skip
+        elif (
+                len(person1.middle) > 2 and len(person2.middle) > 2 and
+                person1.middle != person2.middle
+        ):
+            return False
+
+        # if initial of the first name is not the same -> skip
+        elif person1.first and person2.first and person1.first[0] != person2.first[0]:
+            return False
+
+        # if both have at least first and middle initials
+        # if first and middle initials match -> merge
+        elif person1.first and person1.middle and person2.first and person2.middle:
+            return (
+                person1.first[0] == person2.first[0] and
+                person1.middle[0] == person2.middle[0]
+            )
+
+        # TODO: only one person has a first initial and no middle name
+        return False
+
+    @staticmethod
+    def merged_first_and_middle(person1, person2):
+        """
+        Returns the first and middle name of the merge of person1 and person2: for each, the
+        longer one of the two.
 
-        # if no merges could be made return True to indicate that merge process is finished
-        return True
+        :param person1: Person (or any object with first and middle)
+        :param person2: Person (or any object with first and middle)
+        :return: str, str (first name, middle name)
+        """
+        merged_names = []
+        for attr in ['first', 'middle']:
+            if (
+                    len(getattr(person2, attr)) > len(getattr(person1, attr)) or
+                    # no first or middle name should have a forward slash (e.g. "dk/shook")
+                    # in that case, take the other name
+                    getattr(person1, attr).find('/') > -1
+            ):
+                merged_names.append(getattr(person2, attr))
+            else:
+                merged_names.append(getattr(person1, attr))
+        return merged_names[0], merged_names[1]
 
     def merge_two_persons(self, person1, person2, authoritative_name=None):
         """
@@ -525,15 +781,7 @@ class PeopleDatabase:
             if 'affiliation' in authoritative_name:
                 new_p.positions[authoritative_name['affiliation']] = 9999
         else:
-
-            for attr in ['first', 'middle']:
-                if (
-                        len(getattr(person2, attr)) > len(getattr(person1, attr)) or
-                        # no first or middle name should have a forward slash (e.g. "dk/shook")
-                        # in that case, take the other name
-                        getattr(person1, attr).find('/') > -1
-                ):
-                    setattr(new_p, attr, getattr(person2, attr))
+            new_p.first, new_p.middle = self.merged_first_and_middle(person1, person2)
 
         self.remove_alias_to_alias_to_person_dict(person1.full_name)
         if person1.full_name.lower() != person2.full_name.lower():
@@ -559,9 +807,104 @@ class PeopleDatabase:
         self.people.remove(person2)
         self.people.add(new_p)
 
+        self._remove_from_last_name_index(person1)
+        self._remove_from_last_name_index(person2)
+        self._add_to_last_name_index(new_p)
+
         return new_p
 
 
+def convert_people_db_pickle(pickle_path: Path, out_path: Path = None):
+    """
+    Converts a pickled people db into the columnar format of store_to_disk.
+    The company accounts get removed and the manually merged names applied once during the
+    conversion, so loading the converted db doesn't need any post-processing.
+
+    :param pickle_path: Path of the pickle file
+    :param out_path: Path of the converted file (default: pickle_path with .npz suffix)
+    :return: Path of the converted file
+    """
+    if out_path is None:
+        out_path = Path(pickle_path).with_suffix('.npz')
+    people_db = PeopleDatabase()
+    people_db.load_from_pickle(pickle_path)
+    people_db.store_to_disk(out_path)
+    return out_path
+
+
+class _PeopleDatabaseUnpickler(pickle.Unpickler):
+    """
+    Unpickler for load_from_pickle. Some of our older people dbs (e.g. d_names_db.pickle) were
+    pickled from scripts and reference __main__.PeopleDatabase and __main__.Person.
+    """
+
+    def find_class(self, module, name):
+        if module == '__main__' and name == 'PeopleDatabase':
+            return PeopleDatabase
+        if module == '__main__' and name == 'Person':
+            return Person
+        return super().find_class(module, name)
+
+
+def split_blocks_into_shards(blocks, n_shards):
+    """
+    Splits last name blocks into at most n_shards shards of similar merge costs.
+    Merging a block takes roughly quadratic time, so the blocks get assigned from the largest to
+    the smallest to the shard with the lowest total cost so far.
+
+    >>> split_blocks_into_shards([['a'] * 3, ['b'], ['c'] * 2, ['d'] * 2], n_shards=2)
+    [[['a', 'a', 'a']], [['c', 'c'], ['d', 'd'], ['b']]]
+
+    :param blocks: list of lists of people
+    :param n_shards: int
+    :return: list of shards (lists of blocks)
+    """
+    n_shards = max(1, min(n_shards, len(blocks)))
+    shards = [[] for _ in range(n_shards)]
+    shard_costs = [(0, shard_idx) for shard_idx in range(n_shards)]
+    for block in sorted(blocks, key=len, reverse=True):
+        cost, shard_idx = heapq.heappop(shard_costs)
+        shards[shard_idx].append(block)
+        heapq.heappush(shard_costs, (cost + len(block) ** 2, shard_idx))
+    return [shard for shard in shards if shard]
+
+
+def _merge_shard(shard, alias_to_person_dict, engine, print_merge_results_for_name):
+    """
+    Merges the last name blocks of one shard in a worker process of
+    merge_last_names_in_parallel
+
+    :param shard: list of lists of people
+    :param alias_to_person_dict: dict, aliases of the people in the shard
+    :param engine: str
+    :param print_merge_results_for_name: str
+    :return: set of merged people, dict of their aliases
+    """
+    shard_db = PeopleDatabase()
+    shard_db.people = {person for block in shard for person in block}
+    shard_db._alias_to_person_dict = alias_to_person_dict      # pylint: disable=W0212
+    # keep the order of the blocks instead of regenerating the index from the set of people.
+    # string hashes differ between processes, so the set order would differ as well and
+    # merge_last_name could break ties between equally common people differently.
+    for block in shard:
+        shard_db._last_name_to_people[block[0].last] = block     # pylint: disable=W0212
+    shard_db.merge_last_names(print_merge_results_for_name, engine)
+    return shard_db.people, shard_db._alias_to_person_dict      # pylint: disable=W0212
+
+
+class _MergedNames:
+    """
+    First name, middle name, and aliases of a group of people that the union_find merge engine
+    has decided to merge. Has everything that should_merge looks at.
+    """
+    __slots__ = ('first', 'middle', 'aliases')
+
+    def __init__(self, first, middle, aliases):
+        self.first = first
+        self.middle = middle
+        self.aliases = aliases
+
+
 class TestPeopleDB(unittest.TestCase):
     """
     Test cases for the people db
@@ -572,16 +915,50 @@ class TestPeopleDB(unittest.TestCase):
                              'Dunn, William L', 'Garcia, Raquel']:
             self.people_db.add_person_raw(initial_name, 1)
 
-    def test_pickle(self):
+    def test_store_and_load(self):
         """
-        Test if pickling works
+        Test if storing and loading in the columnar format works
         """
-        self.people_db.store_to_disk(Path('..', 'data', 'name_disambiguation',
-                                          'test_peopledb.pickle'))
-        loaded_db = PeopleDatabase()
-        loaded_db.load_from_disk(Path('..', 'data', 'name_disambiguation',
-                                      'test_peopledb.pickle'))
+        self.people_db.merge_duplicates(print_merge_results_for_name=None)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = Path(tmp_dir, 'test_peopledb.npz')
+            self.people_db.store_to_disk(file_path)
+            loaded_db = PeopleDatabase()
+            loaded_db.load_from_disk(file_path)
+            with PeopleDatabase.open_alias_index(file_path) as alias_index:
+                self.assertEqual(len(alias_index), len(loaded_db._alias_to_person_dict)) # pylint: disable=W0212
+                for alias, person in self.people_db._alias_to_person_dict.items():  # pylint: disable=W0212
+                    self.assertEqual(alias_index.get_person_id(alias), person.person_id)
         self.assertEqual(self.people_db, loaded_db)
+        for person in self.people_db.people:
+            loaded_person = loaded_db.get_person_from_alias(person.full_name)
+            self.assertEqual(person, loaded_person)
+            self.assertEqual((person.stemmed(), person.positions, person.aliases, person.count),
+                             (loaded_person.stemmed(), loaded_person.positions,
+                              loaded_person.aliases, loaded_person.count))
+        self.assertEqual(
+            {alias: person.person_id for alias, person in
+             self.people_db._alias_to_person_dict.items()},          # pylint: disable=W0212
+            {alias: person.person_id for alias, person in
+             loaded_db._alias_to_person_dict.items()}                # pylint: disable=W0212
+        )
+
+    def test_convert_pickle(self):
+        """
+        Test that a legacy pickle gets converted into the same db as loading the pickle
+        """
+        pickle_path = Path('..', 'data', 'name_disambiguation', 'test_peopledb.pickle')
+        pickled_db = PeopleDatabase()
+        pickled_db.load_from_disk(pickle_path)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            converted_path = convert_people_db_pickle(pickle_path,
+                                                      Path(tmp_dir, 'test_peopledb.npz'))
+            converted_db = PeopleDatabase()
+            converted_db.load_from_disk(converted_path)
+        self.assertEqual(sorted(person.stemmed() for person in pickled_db.people),
+                         sorted(person.stemmed() for person in converted_db.people))
+        self.assertEqual(sorted(pickled_db._alias_to_person_dict),     # pylint: disable=W0212
+                         sorted(converted_db._alias_to_person_dict))   # pylint: disable=W0212
 
     def test_merge1(self):
         """
@@ -609,6 +986,74 @@ class TestPeopleDB(unittest.TestCase):
         alias_set = len(set(self.people_db._alias_to_person_dict.values()))  # pylint: disable=W0212
         self.assertEqual(len(people_db_test), alias_set)
 
+    def test_merge_union_find(self):
+        """
+        Test that the union_find engine merges the test names like the iterative engine
+        """
+        for names, expected_length in [
+                (['Dunn, WL', 'Garcia, Raquel', 'Risi, Stephan', 'Dunn, WL', 'Dunn, William L',
+                  'Garcia, Raquel'], 3),
+                (['DUNN,W', 'DUNN,WL', 'DUNN,WL JR', 'DUNN, W. L.', 'Dunn, FW', 'Dunn, William L',
+                  'Dunn,WL', 'DUNN,WL Jr', 'DUNN, WL', 'Dunn, Frank', 'Dunn, Frank W'], 4),
+                # "Dunn, W L" may only be merged with one of the two
+                (['Dunn, W L', 'Dunn, William L', 'Dunn, Walter L'], 2)
+        ]:
+            people_db_test = PeopleDatabase()
+            for name in names:
+                people_db_test.add_person_raw(name, 1)
+            people_db_test.merge_duplicates(print_merge_results_for_name=None,
+                                            engine='union_find')
+            self.assertEqual(len(people_db_test), expected_length)
+            alias_set = len(set(people_db_test._alias_to_person_dict.values())) # pylint: disable=W0212
+            self.assertEqual(len(people_db_test), alias_set)
+
+    def test_merge_parallel(self):
+        """
+        Test that merging in parallel gives the same people and aliases as merging in one process
+        """
+        names = ['DUNN,W', 'DUNN,WL', 'DUNN,WL JR', 'DUNN, W. L.', 'Dunn, FW', 'Dunn, William L',
+                 'Dunn,WL', 'DUNN,WL Jr', 'DUNN, WL', 'Dunn, Frank', 'Dunn, Frank W',
+                 'Garcia, Raquel', 'Garcia, R', 'Risi, Stephan', 'TEAGUE CE JR', 'Teague, C']
+        results = []
+        for parallel in [False, True]:
+            people_db_test = PeopleDatabase()
+            for name in names:
+                people_db_test.add_person_raw(name, 1)
+            people_db_test.merge_duplicates(print_merge_results_for_name=None, parallel=parallel,
+                                            max_workers=2)
+            results.append((
+                sorted((person.stemmed(), sorted(person.aliases)) for person in
+                       people_db_test.people),
+                sorted((alias, person.stemmed()) for alias, person in
+                       people_db_test._alias_to_person_dict.items())    # pylint: disable=W0212
+            ))
+        self.assertEqual(results[0], results[1])
+
+    def test_last_name_index(self):
+        """
+        Test that merging keeps the last name index in sync with the people in the db
+        """
+        self.people_db.merge_duplicates()
+        indexed_people = [person for block in self.people_db._last_name_to_people.values() # pylint: disable=W0212
+                          for person in block]
+        self.assertEqual(len(indexed_people), len(self.people_db))
+        self.assertEqual({id(person) for person in indexed_people},
+                         {id(person) for person in self.people_db.people})
+        for last_name, block in self.people_db._last_name_to_people.items(): # pylint: disable=W0212
+            self.assertTrue(all(person.last == last_name for person in block))
+
+    def test_merge_selected_last_names(self):
+        """
+        Test that merge_last_names with last_names only merges the people of those last names
+        """
+        people_db_test = PeopleDatabase()
+        for name in ['Dunn, WL', 'Dunn, William L', 'Teague, CE', 'Teague, C']:
+            people_db_test.add_person_raw(name, 1)
+        people_db_test.merge_last_names(print_merge_results_for_name=None,
+                                        last_names=['DUNN', 'RISI'])
+        self.assertEqual(sorted(person.last for person in people_db_test.people),
+                         ['DUNN', 'TEAGUE', 'TEAGUE'])
+
 
 if __name__ == '__main__':
     unittest.main()
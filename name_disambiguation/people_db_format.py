@@ -0,0 +1,187 @@
+"""
+Columnar on-disk format of the PeopleDatabase (see PeopleDatabase.store_to_disk).
+
+A people db gets stored as one uncompressed numpy .npz file:
+- strings: utf-8 encoded string table. Every name, alias, and position is stored once and
+  referenced by its index in the string table.
+- last, first, middle, count, person_id: one entry per person
+- positions_*, aliases_*, docs_authored_*, docs_received_*: the Counters and document sets of
+  all people, concatenated. The offsets of person i are offsets[i]:offsets[i + 1]
+- alias_index_strings, alias_index_people: the alias -> person index, sorted by alias
+
+Loading is a bulk read that doesn't need any post-processing.
+"""
+
+import sys
+import zipfile
+from collections import Counter
+
+import numpy as np
+
+from name_disambiguation.person import Person
+
+PEOPLE_DB_FORMAT_VERSION = 1
+
+# separates the strings in the string table. Can't appear in names, aliases, or positions.
+STRING_SEPARATOR = '\x1f'
+
+
+def is_columnar_people_db_file(file_path):
+    """
+    Returns True if file_path is stored in the columnar format (a zip file), False if it is a
+    legacy pickle
+    :param file_path: Path
+    :return: bool
+    """
+    return zipfile.is_zipfile(str(file_path))
+
+
+def write_people_db_columns(file_path, people, alias_to_person_dict):   # pylint: disable=R0914
+    """
+    Stores people and their alias index in the columnar format
+
+    :param file_path: Path
+    :param people: iterable of Person
+    :param alias_to_person_dict: dict, maps aliases to people
+    :return:
+    """
+    people = list(people)
+    person_to_idx = {person: idx for idx, person in enumerate(people)}
+
+    string_to_idx = {}
+
+    def string_idx(string):
+        if string not in string_to_idx:
+            if STRING_SEPARATOR in string:
+                raise ValueError(f"Can't store {string!r}, it contains a string separator.")
+            string_to_idx[string] = len(string_to_idx)
+        return string_to_idx[string]
+
+    columns = {
+        'format_version': np.array([PEOPLE_DB_FORMAT_VERSION], dtype=np.int64),
+        'last': np.array([string_idx(person.last) for person in people], dtype=np.int32),
+        'first': np.array([string_idx(person.first) for person in people], dtype=np.int32),
+        'middle': np.array([string_idx(person.middle) for person in people], dtype=np.int32),
+        'count': np.array([person.count for person in people], dtype=np.int64),
+        # person ids are 128 bit ints -> store them as two uint64
+        'person_id': np.array([divmod(person.person_id, 2 ** 64) for person in people],
+                              dtype=np.uint64).reshape(-1, 2),
+    }
+
+    for attr in ['positions', 'aliases']:
+        counters = [getattr(person, attr) for person in people]
+        columns[f'{attr}_offsets'] = _offsets(counters)
+        columns[f'{attr}_strings'] = np.array(
+            [string_idx(string) for counter in counters for string in counter], dtype=np.int32)
+        columns[f'{attr}_counts'] = np.array(
+            [count for counter in counters for count in counter.values()], dtype=np.int64)
+
+    for attr in ['docs_authored', 'docs_received']:
+        doc_sets = [sorted(getattr(person, attr) or ()) for person in people]
+        columns[f'{attr}_offsets'] = _offsets(doc_sets)
+        columns[attr] = np.array([doc_id for doc_set in doc_sets for doc_id in doc_set],
+                                 dtype=np.int64)
+
+    sorted_aliases = sorted(alias_to_person_dict)
+    columns['alias_index_strings'] = np.array([string_idx(alias) for alias in sorted_aliases],
+                                              dtype=np.int32)
+    columns['alias_index_people'] = np.array(
+        [person_to_idx[alias_to_person_dict[alias]] for alias in sorted_aliases], dtype=np.int32)
+
+    string_table = STRING_SEPARATOR.join(string_to_idx).encode('utf-8')
+    columns['strings'] = np.frombuffer(string_table, dtype=np.uint8)
+
+    with open(str(file_path), 'wb') as outfile:
+        np.savez(outfile, **columns)
+
+
+def read_people_db_columns(file_path):      # pylint: disable=R0914
+    """
+    Loads the people and the alias index of a people db stored with write_people_db_columns
+
+    :param file_path: Path
+    :return: list of Person, dict mapping aliases to people
+    """
+    with np.load(str(file_path), allow_pickle=False) as npz_file:
+        version = int(npz_file['format_version'][0])     # pylint: disable=E1136
+        if version != PEOPLE_DB_FORMAT_VERSION:
+            raise ValueError(f"{file_path} uses people db format version {version}, expected "
+                             f"version {PEOPLE_DB_FORMAT_VERSION}.")
+        columns = {name: npz_file[name] for name in npz_file.files}
+
+    strings = columns.pop('strings').tobytes().decode('utf-8').split(STRING_SEPARATOR)
+    for name in ['last', 'first', 'middle']:
+        for string_idx in set(columns[name].tolist()):
+            strings[string_idx] = sys.intern(strings[string_idx])
+
+    # tolist() once is much faster than indexing numpy arrays person by person
+    lasts, firsts, middles = (columns[name].tolist() for name in ['last', 'first', 'middle'])
+    counts = columns['count'].tolist()
+    id_high, id_low = columns['person_id'].T.tolist()
+    counters = {attr: _read_counters(columns, attr, strings) for attr in ['positions', 'aliases']}
+    doc_sets = {attr: _read_doc_sets(columns, attr) for attr in ['docs_authored',
+                                                                 'docs_received']}
+
+    people = []
+    for idx, last in enumerate(lasts):
+        person = Person.__new__(Person)
+        person.last = strings[last]
+        person.first = strings[firsts[idx]]
+        person.middle = strings[middles[idx]]
+        person.positions = counters['positions'][idx]
+        person.aliases = counters['aliases'][idx]
+        person.count = counts[idx]
+        person.docs_authored = doc_sets['docs_authored'][idx]
+        person.docs_received = doc_sets['docs_received'][idx]
+        person.person_id = (id_high[idx] << 64) | id_low[idx]
+        people.append(person)
+
+    alias_to_person_dict = {
+        strings[string_idx]: people[person_idx] for string_idx, person_idx in
+        zip(columns['alias_index_strings'].tolist(), columns['alias_index_people'].tolist())
+    }
+    return people, alias_to_person_dict
+
+
+def _offsets(collections):
+    """
+    Returns the offsets of concatenated collections
+    :param collections: list of collections
+    :return: np.array
+    """
+    offsets = np.zeros(len(collections) + 1, dtype=np.int64)
+    np.cumsum([len(collection) for collection in collections], out=offsets[1:])
+    return offsets
+
+
+def _read_counters(columns, attr, strings):
+    """
+    Returns a list of Counters (one per person) of the positions or aliases
+    :param columns: dict of np.arrays
+    :param attr: str, 'positions' or 'aliases'
+    :param strings: list of str, the string table
+    :return: list of Counter
+    """
+    offsets = columns[f'{attr}_offsets'].tolist()
+    keys = [strings[string_idx] for string_idx in columns[f'{attr}_strings'].tolist()]
+    counts = columns[f'{attr}_counts'].tolist()
+    counters = []
+    for start, end in zip(offsets, offsets[1:]):
+        # skips Counter.__init__ and Counter.update, which are slow for many small Counters
+        counter = Counter.__new__(Counter)
+        dict.update(counter, zip(keys[start:end], counts[start:end]))
+        counters.append(counter)
+    return counters
+
+
+def _read_doc_sets(columns, attr):
+    """
+    Returns a list of sets of doc ids (one per person, None if the person has no documents)
+    :param columns: dict of np.arrays
+    :param attr: str, 'docs_authored' or 'docs_received'
+    :return: list of (set of int or None)
+    """
+    offsets = columns[f'{attr}_offsets'].tolist()
+    doc_ids = columns[attr].tolist()
+    return [set(doc_ids[start:end]) if end > start else None
+            for start, end in zip(offsets, offsets[1:])]
@@ -0,0 +1,479 @@
+"""
+Sparse author/recipient network of a document collection.
+
+DocumentNetwork stores which people authored and received which documents as two sparse
+incidence matrices (people x documents) over integer network ids. The weight of the edge between
+two people (the number of documents that one of them sent to the other) is one sparse matrix
+product, so building the network doesn't need a python loop over all author/recipient pairs.
+
+Networks get stored as uncompressed numpy .npz files that reference their people by person_id,
+so they can only be loaded together with the people db they were built from.
+"""
+
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from name_disambiguation.doc_ingestion import IngestedDocuments
+from name_disambiguation.parse_cache import ParseCache
+from name_disambiguation.people_db import PeopleDatabase
+
+DOCUMENT_NETWORK_FORMAT_VERSION = 1
+
+
+class DocumentNetwork:
+    """
+    Network of the authors and recipients of a document collection
+    Attributes:
+        people (list of Person): network id -> person, sorted by Person.stemmed()
+        person_ids (dict): person -> network id
+        doc_ids (np.ndarray): doc id of every column of the incidence matrices
+        authored (scipy.sparse.csr_matrix): people x docs, number of times a person is listed as
+                                            an author of a document
+        received (scipy.sparse.csr_matrix): people x docs, same for recipients
+
+    The edges get indexed by their position in edges() (edge id). edge_index maps every person
+    to the ids of their edges, so ego networks only touch the edges of their people.
+    """
+
+    def __init__(self, people, doc_ids, authored, received):
+        """
+        :param people: list of Person
+        :param doc_ids: np.ndarray of int
+        :param authored: scipy.sparse matrix (len(people) x len(doc_ids))
+        :param received: scipy.sparse matrix (len(people) x len(doc_ids))
+        """
+        self.people = people
+        self.person_ids = {person: person_id for person_id, person in enumerate(people)}
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        self.authored = sparse.csr_matrix(authored, dtype=np.int64)
+        self.received = sparse.csr_matrix(received, dtype=np.int64)
+        self._edge_matrix = None
+        self._edges = None
+        self._edge_index = None
+        self._canonical_aliases = {}
+
+    def __len__(self):
+        return len(self.people)
+
+    @classmethod
+    def from_docs(cls, ingested_doc_chunks, people_db):       # pylint: disable=R0914
+        """
+        Builds the network of the authors and recipients of documents. People get looked up in
+        people_db by their raw names and get the doc ids added to their docs_authored and
+        docs_received.
+
+        :param ingested_doc_chunks: iterable of IngestedDocuments, e.g. ingest_docs_in_chunks()
+        :param people_db: PeopleDatabase
+        :return: DocumentNetwork
+        """
+        counters = {key: Counter() for key in ['valid', 'organization_from_person',
+                                               'organization_from_org', 'organization_invalid',
+                                               'invalid', 'error']}
+        people = []
+        person_ids = {}
+        doc_ids = []
+        # (network id, doc column) of every author and recipient
+        entries = {'authors': ([], []), 'recipients': ([], [])}
+
+        for ingested_docs in ingested_doc_chunks:
+            for doc_id in ingested_docs.doc_ids:
+                doc_column = len(doc_ids)
+                doc_ids.append(doc_id)
+                for side, (rows, columns) in entries.items():
+                    names, _ = ingested_docs.get_people_and_organizations(side, doc_id, counters,
+                                                                          people_db)
+                    for name in names:
+                        person = people_db.get_person_from_alias(name)
+                        if not person:
+                            print("Could not find", name)
+                            continue
+                        if side == 'authors':
+                            person.add_doc_authored(doc_id)
+                        else:
+                            person.add_doc_received(doc_id)
+                        if person not in person_ids:
+                            person_ids[person] = len(people)
+                            people.append(person)
+                        rows.append(person_ids[person])
+                        columns.append(doc_column)
+
+        # sort the people by name, so edges (id1 <= id2) are ordered like sorted([person1, person2])
+        order = sorted(range(len(people)), key=lambda person_id: people[person_id].stemmed())
+        new_ids = np.empty(len(people), dtype=np.int64)
+        new_ids[order] = np.arange(len(people))
+
+        shape = (len(people), len(doc_ids))
+        # duplicate entries get summed up
+        authored, received = (
+            sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (new_ids[rows], columns)),
+                              shape=shape)
+            for rows, columns in entries.values()
+        )
+        return cls([people[person_id] for person_id in order], doc_ids, authored, received)
+
+    def store_to_disk(self, file_path):
+        """
+        Stores the network as a .npz file. People are stored by their person_id.
+        :param file_path: Path
+        :return:
+        """
+        columns = {
+            'format_version': np.array([DOCUMENT_NETWORK_FORMAT_VERSION], dtype=np.int64),
+            # person ids are 128 bit ints -> store them as two uint64
+            'person_id': np.array([divmod(person.person_id, 2 ** 64) for person in self.people],
+                                  dtype=np.uint64).reshape(-1, 2),
+            'doc_ids': self.doc_ids,
+        }
+        for name, matrix in [('authored', self.authored), ('received', self.received)]:
+            columns[f'{name}_data'] = matrix.data
+            columns[f'{name}_indices'] = matrix.indices
+            columns[f'{name}_indptr'] = matrix.indptr
+        with open(str(file_path), 'wb') as outfile:
+            np.savez(outfile, **columns)
+
+    @classmethod
+    def load_from_disk(cls, file_path, people_db):     # pylint: disable=R0914
+        """
+        Loads a network stored with store_to_disk. Its people get looked up in people_db by
+        their person_id and get the doc ids of the network added to their docs_authored and
+        docs_received.
+
+        :param file_path: Path
+        :param people_db: PeopleDatabase, the people db that the network was built from
+        :return: DocumentNetwork
+        """
+        with np.load(str(file_path), allow_pickle=False) as npz_file:
+            version = int(npz_file['format_version'][0])     # pylint: disable=E1136
+            if version != DOCUMENT_NETWORK_FORMAT_VERSION:
+                raise ValueError(f"{file_path} uses network format version {version}, expected "
+                                 f"version {DOCUMENT_NETWORK_FORMAT_VERSION}.")
+            columns = {name: npz_file[name] for name in npz_file.files}
+
+        id_to_person = {person.person_id: person for person in people_db.people}
+        id_high, id_low = columns['person_id'].T.tolist()
+        try:
+            people = [id_to_person[(high << 64) | low] for high, low in zip(id_high, id_low)]
+        except KeyError:
+            raise ValueError(f"{file_path} was built from a different people db.") from None
+
+        shape = (len(people), len(columns['doc_ids']))
+        authored, received = (
+            sparse.csr_matrix((columns[f'{name}_data'], columns[f'{name}_indices'],
+                               columns[f'{name}_indptr']), shape=shape)
+            for name in ['authored', 'received']
+        )
+        network = cls(people, columns['doc_ids'], authored, received)
+        network._add_docs_to_people()       # pylint: disable=W0212
+        return network
+
+    def _add_docs_to_people(self):
+        """
+        Adds the doc ids of the incidence matrices to the docs_authored and docs_received of the
+        people of the network
+        :return:
+        """
+        doc_ids = self.doc_ids.tolist()
+        for matrix, attr in [(self.authored, 'docs_authored'), (self.received, 'docs_received')]:
+            indptr = matrix.indptr.tolist()
+            indices = matrix.indices.tolist()
+            for person, start, end in zip(self.people, indptr, indptr[1:]):
+                if end > start:
+                    docs = getattr(person, attr)
+                    if docs is None:
+                        docs = set()
+                        setattr(person, attr, docs)
+                    docs.update(doc_ids[idx] for idx in indices[start:end])
+
+    def with_new_docs(self, ingested_doc_chunks, people_db):    # pylint: disable=R0914
+        """
+        Returns the network with new documents added, without going through the old documents
+        again. The authors and recipients of the new documents have to be in people_db already.
+        people_db can have merged people of this network since it was built (merge_two_persons
+        replaces both with a new person that has all of their aliases). Their rows get looked up
+        by alias and added up.
+
+        :param ingested_doc_chunks: iterable of IngestedDocuments with doc ids that are not in
+                                    this network yet
+        :param people_db: PeopleDatabase
+        :return: DocumentNetwork
+        """
+        new_docs_network = DocumentNetwork.from_docs(ingested_doc_chunks, people_db)
+        if np.isin(new_docs_network.doc_ids, self.doc_ids).any():
+            raise ValueError("The new documents have doc ids that are already in the network.")
+
+        people = list(new_docs_network.people)
+        person_ids = dict(new_docs_network.person_ids)
+        old_to_current = []
+        for person in self.people:
+            current_person = person if person in people_db.people else None
+            for alias in person.aliases:
+                if current_person is not None:
+                    break
+                current_person = people_db.get_person_from_alias(alias)
+            if current_person is None:
+                raise ValueError(f"{person} is not in the people db anymore.")
+            if current_person not in person_ids:
+                person_ids[current_person] = len(people)
+                people.append(current_person)
+            old_to_current.append(person_ids[current_person])
+
+        # (current people x old people) matrix that adds up the rows of merged people
+        old_to_current = sparse.csr_matrix(
+            (np.ones(len(self.people), dtype=np.int64),
+             (old_to_current, np.arange(len(self.people)))),
+            shape=(len(people), len(self.people)))
+        # the people of the new docs are the first rows of the combined network
+        new_rows = sparse.eye(len(people), len(new_docs_network), dtype=np.int64, format='csr')
+
+        order = sorted(range(len(people)), key=lambda person_id: people[person_id].stemmed())
+        authored, received = (
+            sparse.hstack([old_to_current @ old_matrix, new_rows @ new_matrix],
+                          format='csr')[order]
+            for old_matrix, new_matrix in [(self.authored, new_docs_network.authored),
+                                           (self.received, new_docs_network.received)]
+        )
+        network = DocumentNetwork([people[person_id] for person_id in order],
+                                  np.concatenate([self.doc_ids, new_docs_network.doc_ids]),
+                                  authored, received)
+        network._add_docs_to_people()       # pylint: disable=W0212
+        return network
+
+    @property
+    def count_authored(self):
+        """
+        Number of documents authored by every person (by network id)
+        :return: np.ndarray of int
+        """
+        return np.asarray(self.authored.sum(axis=1)).ravel()
+
+    @property
+    def count_received(self):
+        """
+        Number of documents received by every person (by network id)
+        :return: np.ndarray of int
+        """
+        return np.asarray(self.received.sum(axis=1)).ravel()
+
+    @property
+    def edge_matrix(self):
+        """
+        Upper triangular (people x people) matrix of edge weights: entry (i, j) with i <= j is
+        the number of (document, author, recipient) combinations with one of the two people as
+        the author and the other one as the recipient. Entry (i, i) counts people who are both
+        author and recipient of a document.
+        :return: scipy.sparse.csr_matrix
+        """
+        if self._edge_matrix is None:
+            author_to_recipient = self.authored @ self.received.T
+            self._edge_matrix = (
+                sparse.triu(author_to_recipient + author_to_recipient.T, k=1) +
+                sparse.diags(author_to_recipient.diagonal(), dtype=np.int64)
+            ).tocsr()
+            self._edge_matrix.eliminate_zeros()
+        return self._edge_matrix
+
+    def edges(self):
+        """
+        Returns the edges as arrays, sorted by source and target network id. The position of an
+        edge in the arrays is its edge id.
+        :return: np.ndarray (source ids), np.ndarray (target ids), np.ndarray (weights)
+        """
+        if self._edges is None:
+            edge_matrix = self.edge_matrix.tocoo()
+            order = np.lexsort((edge_matrix.col, edge_matrix.row))
+            self._edges = (edge_matrix.row[order].astype(np.int64),
+                           edge_matrix.col[order].astype(np.int64), edge_matrix.data[order])
+        return self._edges
+
+    @property
+    def edge_index(self):
+        """
+        (people x edges) matrix with a 1 in row i for every edge id of an edge of person i (as
+        source or target)
+        :return: scipy.sparse.csr_matrix
+        """
+        if self._edge_index is None:
+            sources, targets, _ = self.edges()
+            edge_ids = np.arange(len(sources))
+            not_loop = sources != targets
+            rows = np.concatenate([sources, targets[not_loop]])
+            columns = np.concatenate([edge_ids, edge_ids[not_loop]])
+            self._edge_index = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.int8), (rows, columns)),
+                shape=(len(self.people), len(sources)))
+        return self._edge_index
+
+    def incident_edges(self, person_ids):
+        """
+        Returns the ids of the edges that have at least one of the people as source or target
+        :param person_ids: iterable of int (network ids)
+        :return: np.ndarray of int, sorted edge ids
+        """
+        person_ids = np.fromiter(person_ids, dtype=np.int64)
+        return np.unique(self.edge_index[person_ids].indices)
+
+    def canonical_alias(self, person_id):
+        """
+        Returns the most common alias of a person, which identifies the person in other people
+        dbs with the same (or merged) people. Cached per network id.
+        :param person_id: int (network id)
+        :return: str
+        """
+        if person_id not in self._canonical_aliases:
+            aliases = self.people[person_id].aliases
+            self._canonical_aliases[person_id] = max(aliases, key=aliases.__getitem__)
+        return self._canonical_aliases[person_id]
+
+    def to_nodes_and_edges(self):
+        """
+        Returns the network as the nodes and edges dicts of get_network_of_1970s_nodes_and_edges
+        nodes: person -> {'person', 'count_authored', 'count_received'}
+        edges: (person1, person2) -> {'edge': (person1, person2), 'count'}
+
+        :return: dict, dict
+        """
+        nodes = {}
+        for person, count_authored, count_received in zip(
+                self.people, self.count_authored.tolist(), self.count_received.tolist()):
+            nodes[person] = {'person': person, 'count_authored': count_authored,
+                             'count_received': count_received}
+
+        edges = {}
+        for source, target, count in zip(*(array.tolist() for array in self.edges())):
+            edge = (self.people[source], self.people[target])
+            edges[edge] = {'edge': edge, 'count': count}
+        return nodes, edges
+
+
+class TestDocumentNetwork(unittest.TestCase):
+    """
+    Tests that the sparse network has the same nodes and edges as a loop over all documents
+    """
+
+    def test_same_as_loop(self):       # pylint: disable=R0914
+        """
+        ibid.
+        """
+        df = pd.DataFrame([                             # pylint: disable=C0103
+            {'au': 'Dunn, WL', 'au_person': 'Dunn, WL', 'rc': 'Teague, CE; Risi, S',
+             'rc_person': 'Dunn, WL'},
+            {'au': 'Teague, CE', 'au_person': '', 'rc': 'Dunn, WL', 'rc_person': ''},
+            {'au': 'Risi, S; Adams, J', 'au_person': '', 'rc': 'Teague, CE', 'rc_person': ''},
+            {'au': '', 'au_person': 'Nobody, N', 'rc': '', 'rc_person': ''},
+        ], index=[10, 11, 12, 13]).assign(au_org='', rc_org='')
+        ingested_docs = IngestedDocuments(df, ParseCache())
+
+        people_db = PeopleDatabase()
+        for name in ['Dunn, WL', 'Teague, CE', 'Risi, S', 'Adams, J']:
+            people_db.add_person_raw(name)
+        person = {name: people_db.get_person_from_alias(name) for name in
+                  ['Dunn, WL', 'Teague, CE', 'Risi, S', 'Adams, J']}
+
+        network = DocumentNetwork.from_docs([ingested_docs], people_db)
+        self.assertEqual(network.people, sorted(person.values()))
+        self.assertEqual(network.doc_ids.tolist(), [10, 11, 12, 13])
+
+        nodes, edges = network.to_nodes_and_edges()
+        self.assertEqual({node['person'].last: (node['count_authored'], node['count_received'])
+                          for node in nodes.values()},
+                         {'DUNN': (2, 2), 'TEAGUE': (1, 2), 'RISI': (1, 1), 'ADAMS': (1, 0)})
+
+        expected_edges = Counter()
+        for authors, recipients in [
+                (['Dunn, WL', 'Dunn, WL'], ['Teague, CE', 'Risi, S', 'Dunn, WL']),
+                (['Teague, CE'], ['Dunn, WL']),
+                (['Risi, S', 'Adams, J'], ['Teague, CE'])]:
+            for author in authors:
+                for recipient in recipients:
+                    expected_edges[tuple(sorted([person[author], person[recipient]]))] += 1
+        self.assertEqual({edge: edge_dict['count'] for edge, edge_dict in edges.items()},
+                         dict(expected_edges))
+        self.assertEqual(person['Dunn, WL'].docs_authored, {10})
+        self.assertEqual(person['Dunn, WL'].docs_received, {10, 11})
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = Path(tmp_dir, 'network.npz')
+            network.store_to_disk(file_path)
+            for person_in_db in people_db.people:
+                person_in_db.docs_authored = person_in_db.docs_received = None
+
+            loaded_network = DocumentNetwork.load_from_disk(file_path, people_db)
+            self.assertEqual(loaded_network.to_nodes_and_edges(), (nodes, edges))
+            self.assertEqual(person['Dunn, WL'].docs_received, {10, 11})
+
+            with self.assertRaises(ValueError):
+                DocumentNetwork.load_from_disk(file_path, PeopleDatabase())
+
+    def test_edge_index(self):
+        """
+        incident_edges returns exactly the edges of the given people
+        """
+        df = pd.DataFrame([                             # pylint: disable=C0103
+            {'au': 'Dunn, WL', 'rc': 'Teague, CE; Dunn, WL'},
+            {'au': 'Teague, CE', 'rc': 'Risi, S'},
+            {'au': 'Risi, S', 'rc': 'Adams, J'},
+            {'au': 'DUNN,WL', 'rc': 'Adams, J'},
+        ]).assign(au_person='', au_org='', rc_person='', rc_org='')
+        people_db = PeopleDatabase()
+        for name in ['Dunn, WL', 'DUNN,WL', 'DUNN,WL', 'Teague, CE', 'Risi, S', 'Adams, J']:
+            people_db.add_person_raw(name)
+        people_db.merge_duplicates(print_merge_results_for_name=None)
+        network = DocumentNetwork.from_docs([IngestedDocuments(df, ParseCache())], people_db)
+        sources, targets, _ = network.edges()
+        for people in [['Dunn, WL'], ['Risi, S', 'Adams, J'], []]:
+            person_ids = {network.person_ids[people_db.get_person_from_alias(name)]
+                          for name in people}
+            self.assertEqual(network.incident_edges(person_ids).tolist(),
+                             [edge_id for edge_id, edge in enumerate(zip(sources, targets))
+                              if person_ids & set(edge)])
+        dunn_id = network.person_ids[people_db.get_person_from_alias('Dunn, WL')]
+        self.assertEqual(network.canonical_alias(dunn_id), 'DUNN,WL')
+
+    def test_with_new_docs(self):
+        """
+        Adding documents to a network gives the same network as building it from all documents,
+        also when people of the network got merged with the people of the new documents
+        """
+        old_df = pd.DataFrame([                         # pylint: disable=C0103
+            {'au': 'Dunn, WL', 'rc': 'Teague, CE'},
+            {'au': 'Teague, CE', 'rc': 'Dunn, WL; Risi, S'},
+        ], index=[0, 1]).assign(au_person='', au_org='', rc_person='', rc_org='')
+        new_df = pd.DataFrame([                         # pylint: disable=C0103
+            {'au': 'Dunn, William L', 'rc': 'Adams, J; Teague, CE'},
+        ], index=[2]).assign(au_person='', au_org='', rc_person='', rc_org='')
+        old_docs = IngestedDocuments(old_df, ParseCache())
+        new_docs = IngestedDocuments(new_df, ParseCache())
+
+        people_db = PeopleDatabase()
+        for name in ['Dunn, WL', 'Teague, CE', 'Risi, S']:
+            people_db.add_person_raw(name)
+        people_db.merge_duplicates(print_merge_results_for_name=None)
+        network = DocumentNetwork.from_docs([old_docs], people_db)
+
+        for name in ['Dunn, William L', 'Adams, J']:
+            people_db.add_person_raw(name)
+        people_db.merge_last_names(print_merge_results_for_name=None,
+                                   last_names=['DUNN', 'ADAMS'])
+        dunn = people_db.get_person_from_alias('Dunn, WL')
+        self.assertIs(dunn, people_db.get_person_from_alias('Dunn, William L'))
+        self.assertNotIn(dunn, network.people)
+
+        network = network.with_new_docs([new_docs], people_db)
+        full_network = DocumentNetwork.from_docs([old_docs, new_docs], people_db)
+        self.assertEqual(network.people, full_network.people)
+        self.assertEqual(network.doc_ids.tolist(), [0, 1, 2])
+        self.assertEqual(network.to_nodes_and_edges(), full_network.to_nodes_and_edges())
+        self.assertEqual((dunn.docs_authored, dunn.docs_received), ({0, 2}, {1}))
+
+        with self.assertRaises(ValueError):
+            network.with_new_docs([new_docs], people_db)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Disjoint-set (union-find) structure used by the union_find merge engine of the PeopleDatabase
+"""
+
+import unittest
+
+
+class UnionFind:
+    """
+    Keeps track of a partition of the elements 0..n-1 into disjoint groups.
+    Uses path halving and union by size, so find and union are close to O(1).
+    Attributes:
+        parents (list of int): parent of every element; roots are their own parent
+        sizes (list of int): size of the group of every root
+    """
+    def __init__(self, n_elements):
+        """
+        Initializes n_elements groups with one element each
+        :param n_elements: int
+        """
+        self.parents = list(range(n_elements))
+        self.sizes = [1] * n_elements
+
+    def find(self, element):
+        """
+        Returns the root of the group of element
+        :param element: int
+        :return: int
+        """
+        parents = self.parents
+        while parents[element] != element:
+            parents[element] = parents[parents[element]]
+            element = parents[element]
+        return element
+
+    def union(self, element1, element2):
+        """
+        Joins the groups of element1 and element2 and returns the root of the joined group
+        (the root of the larger group)
+        :param element1: int
+        :param element2: int
+        :return: int
+        """
+        root1 = self.find(element1)
+        root2 = self.find(element2)
+        if root1 == root2:
+            return root1
+        if self.sizes[root1] < self.sizes[root2]:
+            root1, root2 = root2, root1
+        self.parents[root2] = root1
+        self.sizes[root1] += self.sizes[root2]
+        return root1
+
+    def groups(self):
+        """
+        Returns all groups as lists of elements. Groups and the elements in them are sorted by
+        their smallest element.
+        :return: list of lists of int
+        """
+        groups = {}
+        for element in range(len(self.parents)):
+            groups.setdefault(self.find(element), []).append(element)
+        return sorted(groups.values())
+
+
+class TestUnionFind(unittest.TestCase):
+    """
+    Tests the UnionFind structure
+    """
+    def test_union_and_find(self):
+        """
+        Joined elements share their root, other elements don't
+        """
+        union_find = UnionFind(5)
+        union_find.union(0, 1)
+        union_find.union(3, 4)
+        union_find.union(1, 4)
+        self.assertEqual(union_find.find(0), union_find.find(3))
+        self.assertNotEqual(union_find.find(0), union_find.find(2))
+        self.assertEqual(union_find.groups(), [[0, 1, 3, 4], [2]])
+
+    def test_union_returns_root(self):
+        """
+        union returns the root of the joined group, also when both are already joined
+        """
+        union_find = UnionFind(3)
+        root = union_find.union(2, 1)
+        self.assertEqual(root, union_find.find(1))
+        self.assertEqual(union_find.union(1, 2), root)
+        self.assertEqual(union_find.sizes[root], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()